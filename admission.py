@@ -0,0 +1,169 @@
+"""
+Admission control for API requests
+Bounds how many requests compute at once and how long one may wait for
+a slot, refusing the rest at once instead of letting latency grow without
+bound. Expensive actions only get part of the slots and give way to
+waiting cheap ones, so they are shed first. An optional per-client token
+bucket caps each client's request rate.
+"""
+
+import contextlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Request costs
+CHEAP = 'cheap'
+EXPENSIVE = 'expensive'
+
+# Why a request was shed
+OVERLOADED = 'overloaded'        # no slot came free within the queue wait
+QUEUE_TIMEOUT = 'queue_timeout'  # already waited longer than the queue wait before admission
+RATE_LIMITED = 'rate_limited'    # the client's token bucket is empty
+
+class Shed(Exception):
+    """A request was refused; `retry_after` is the suggested wait in whole seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionControl:
+    """In-flight limit, queue wait bound and per-client rate limit for one process
+
+    A `max_in_flight` of 0 turns the concurrency limit off and a
+    `client_rate` (requests per second) of 0 the rate limit. Expensive
+    requests may hold `expensive_share` of the slots and never take one
+    while a cheap request is waiting.
+    """
+
+    def __init__(self, max_in_flight=0, max_queue_wait=0.5, expensive_share=0.5,
+                 client_rate=0.0, client_burst=None, max_clients=10000, retry_after=1):
+        self.max_in_flight = max_in_flight
+        self.max_queue_wait = max_queue_wait
+        self.expensive_share = expensive_share
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.waiting = {CHEAP: 0, EXPENSIVE: 0}
+        # (cost, reason) -> requests shed
+        self.shed = {}
+        self._condition = threading.Condition()
+        # client -> [tokens, last refill], least recently seen first
+        self._buckets = OrderedDict()
+        self._buckets_lock = threading.Lock()
+
+    def limit(self, cost):
+        """Slots requests of a cost may hold between them"""
+        if cost == EXPENSIVE:
+            return max(1, int(self.max_in_flight * self.expensive_share))
+        return self.max_in_flight
+
+    def check_rate(self, client, cost=CHEAP):
+        """Take a token from the client's bucket, or raise Shed if it's empty"""
+        if self.client_rate <= 0 or client is None:
+            return
+        burst = self.client_burst or max(1.0, self.client_rate)
+        now = time.monotonic()
+        with self._buckets_lock:
+            bucket = self._buckets.pop(client, None)
+            tokens = burst if bucket is None else min(
+                burst, bucket[0] + (now - bucket[1]) * self.client_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[client] = [tokens, now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        if not allowed:
+            raise self.refuse(cost, RATE_LIMITED,
+                              max(1, math.ceil((1 - tokens) / self.client_rate)))
+
+    @contextlib.contextmanager
+    def admitted(self, cost, waited=0.0):
+        """Hold a slot for the enclosed request, or raise Shed
+
+        `waited` is how long the request already queued (e.g. for a worker
+        thread) and counts against the queue wait.
+        """
+        release = self.admit(cost, waited)
+        try:
+            yield
+        finally:
+            release()
+
+    def admit(self, cost, waited=0.0):
+        """Take a slot, or raise Shed; returns the function that gives it back
+
+        For work that outlives the call that admitted it, such as a streamed
+        response. Releasing more than once is harmless.
+        """
+        if self.max_in_flight <= 0:
+            return lambda: None
+        self.acquire(cost, waited)
+        held = [True]
+
+        def release():
+            with self._condition:
+                if held:
+                    held.pop()
+                    self.in_flight -= 1
+                    self._condition.notify_all()
+        return release
+
+    def acquire(self, cost, waited):
+        """Wait for a slot until the queue wait runs out"""
+        if waited > self.max_queue_wait:
+            raise self.refuse(cost, QUEUE_TIMEOUT, self.retry_after)
+        limit = self.limit(cost)
+        deadline = time.monotonic() + self.max_queue_wait - waited
+        with self._condition:
+            self.waiting[cost] += 1
+            try:
+                # Cheap requests waiting for a slot go before any expensive one
+                while self.in_flight >= limit or (cost == EXPENSIVE and self.waiting[CHEAP]):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self.refuse(cost, OVERLOADED, self.retry_after)
+                    self._condition.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self.waiting[cost] -= 1
+                if cost == CHEAP and not self.waiting[CHEAP]:
+                    self._condition.notify_all()
+
+    def refuse(self, cost, reason, retry_after):
+        """Count a shed request and return the Shed to raise"""
+        with self._buckets_lock:
+            self.shed[(cost, reason)] = self.shed.get((cost, reason), 0) + 1
+        return Shed(reason, retry_after)
+
+    def render(self):
+        """Shed counters and slot gauges in Prometheus text format"""
+        with self._buckets_lock:
+            shed = dict(self.shed)
+        with self._condition:
+            in_flight = self.in_flight
+            waiting = dict(self.waiting)
+
+        lines = [
+            '# HELP nfl_admission_shed_total Requests refused by admission control, '
+            'by cost and reason.',
+            '# TYPE nfl_admission_shed_total counter',
+        ]
+        for (cost, reason), count in sorted(shed.items()):
+            lines.append(f'nfl_admission_shed_total{{cost="{cost}",reason="{reason}"}} {count}')
+        lines += [
+            '# HELP nfl_admission_in_flight Requests holding an admission slot.',
+            '# TYPE nfl_admission_in_flight gauge',
+            f'nfl_admission_in_flight {in_flight}',
+            '# HELP nfl_admission_waiting Requests waiting for an admission slot, by cost.',
+            '# TYPE nfl_admission_waiting gauge',
+        ]
+        for cost, count in sorted(waiting.items()):
+            lines.append(f'nfl_admission_waiting{{cost="{cost}"}} {count}')
+        return ('\n'.join(lines) + '\n').encode()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+NFL Dashboard asyncio server
+Single-threaded event loop alternative to the http.server stack, for
+deployments holding many idle keep-alive connections
+"""
+
+import asyncio
+import time
+import urllib.parse
+from email.utils import formatdate
+from http import HTTPStatus
+
+import events
+from server import (API_PATHS, EVENTS_PATH, EXPENSIVE_ACTIONS, MAX_REQUEST_BODY, METRICS_PATH,
+                    StaticAsset, access_log, admission_control, event_hub,
+                    event_stream_headers, event_stream_preamble, handle_api_query,
+                    league_registry, metrics_response, placeholder_images, request_label,
+                    request_metrics, static_assets, team_store)
+
+MAX_HEADER_LINES = 100
+
+def is_streamed(body):
+    """Whether a response body is an iterator of chunks rather than bytes or a file"""
+    return not isinstance(body, (bytes, memoryview, StaticAsset))
+
+class HTTPError(Exception):
+    """Request can't be served; answer with `status` and close"""
+
+    def __init__(self, status):
+        super().__init__(status.phrase)
+        self.status = status
+
+class AsyncHTTPServer:
+    """Minimal HTTP/1.1 server on asyncio streams with keep-alive and pipelining"""
+
+    def __init__(self, store=team_store, idle_timeout=15, header_timeout=10,
+                 body_timeout=10):
+        self.store = store
+        self.idle_timeout = idle_timeout
+        self.header_timeout = header_timeout
+        self.body_timeout = body_timeout
+        self.static = static_assets
+        self.placeholders = placeholder_images
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until it closes or times out"""
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await self.read_request(reader)
+                except HTTPError as e:
+                    await self.write_response(writer, e.status.value, [], b'', keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                method, target, version, headers, body = request
+                keep_alive = self.wants_keep_alive(version, headers)
+                keep_alive = await self.serve_request(writer, method, target, version, headers,
+                                                      body, keep_alive)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve_request(self, writer, method, target, version, headers, body, keep_alive):
+        """Dispatch one request and write the response, recording metrics
+
+        Returns whether the connection can stay open.
+        """
+        started = time.perf_counter()
+        request_metrics.started()
+        status, size = 0, 0
+        peer = writer.get_extra_info('peername')
+        client = peer[0] if peer else None
+        try:
+            if method == 'GET' and urllib.parse.urlsplit(target).path == EVENTS_PATH:
+                status = 200
+                size = await self.serve_events(writer, headers)
+                return False
+            if self.runs_blocking(method, target):
+                # Rendering, search and the like run on a worker thread so one
+                # slow request doesn't stall every other connection
+                status, response_headers, response_body = await asyncio.get_running_loop(
+                    ).run_in_executor(None, self.dispatch, method, target, headers, body, client)
+            else:
+                status, response_headers, response_body = self.dispatch(method, target,
+                                                                        headers, body, client)
+            if is_streamed(response_body) and version != 'HTTP/1.1':
+                # No chunked encoding before HTTP/1.1: close to end the body
+                keep_alive = False
+            if method == 'HEAD' and status != 304:
+                if is_streamed(response_body):
+                    response_headers.append(('Transfer-Encoding', 'chunked'))
+                elif not any(name == 'Content-Length' for name, _ in response_headers):
+                    response_headers.append(('Content-Length', str(len(response_body))))
+                response_body = b''
+            size = await self.write_response(writer, status, response_headers,
+                                             response_body, keep_alive)
+            return keep_alive
+        finally:
+            elapsed = time.perf_counter() - started
+            parsed_path = urllib.parse.urlsplit(target)
+            label = request_label(parsed_path.path, parsed_path.query)
+            request_metrics.finished(label, status, size, elapsed)
+            if access_log.enabled:
+                access_log.log_request(client, method, target, label,
+                                       status, size, elapsed, headers.get('user-agent'))
+
+    async def read_request(self, reader):
+        """Read one request; None means the client went away or idled out"""
+        # Pipelined requests are already sitting in the reader's buffer,
+        # so the idle timeout only bites between requests
+        try:
+            request_line = await asyncio.wait_for(
+                self.read_line(reader, HTTPStatus.REQUEST_URI_TOO_LONG), self.idle_timeout)
+        except asyncio.TimeoutError:
+            return None
+        if not request_line:
+            return None
+
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+            raise HTTPError(HTTPStatus.BAD_REQUEST)
+        method, target, version = parts
+
+        try:
+            headers = await asyncio.wait_for(self.read_headers(reader), self.header_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPError(HTTPStatus.REQUEST_TIMEOUT)
+
+        body = b''
+        length = headers.get('content-length')
+        if length:
+            if not length.isdigit():
+                raise HTTPError(HTTPStatus.BAD_REQUEST)
+            if int(length) > MAX_REQUEST_BODY:
+                raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            try:
+                body = await asyncio.wait_for(reader.readexactly(int(length)),
+                                              self.body_timeout)
+            except asyncio.TimeoutError:
+                raise HTTPError(HTTPStatus.REQUEST_TIMEOUT)
+        elif 'chunked' in headers.get('transfer-encoding', ''):
+            raise HTTPError(HTTPStatus.NOT_IMPLEMENTED)
+
+        return method, target, version, headers, body
+
+    async def read_line(self, reader, status):
+        """Read one line, answering `status` if it outgrows the reader's buffer limit
+
+        The limit (64 KiB) matches the line length http.server accepts.
+        """
+        try:
+            return await reader.readline()
+        except ValueError:
+            # readline reports LimitOverrunError as ValueError
+            raise HTTPError(status)
+
+    async def read_headers(self, reader):
+        """Read header lines up to the blank line"""
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await self.read_line(reader, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            if not line:
+                raise asyncio.IncompleteReadError(b'', None)
+            if line in (b'\r\n', b'\n'):
+                return headers
+            name, sep, value = line.decode('latin-1').partition(':')
+            if not sep:
+                raise HTTPError(HTTPStatus.BAD_REQUEST)
+            headers[name.strip().lower()] = value.strip()
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+    def wants_keep_alive(self, version, headers):
+        """Apply HTTP/1.0 and HTTP/1.1 persistent connection defaults"""
+        connection = headers.get('connection', '').lower()
+        if version == 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
+
+    def runs_blocking(self, method, target):
+        """Whether a request is an API call heavy enough to run off the event loop
+
+        Expensive actions, POSTs (batches, team updates, which write the
+        data file) and the first request to a league qualify; cheap lookups
+        are answered on the loop directly, unless an in-flight limit could
+        make them wait for a slot. Those only read the loaded dataset: the
+        stores rebuild changed files on a background thread.
+        """
+        parsed_path = urllib.parse.urlsplit(target)
+        if parsed_path.path not in API_PATHS:
+            return False
+        if admission_control.max_in_flight > 0:
+            return True
+        query_params = urllib.parse.parse_qs(parsed_path.query)
+        action = query_params.get('action', [''])[0]
+        league = query_params.get('league', [''])[0]
+        # A league that isn't loaded yet is loaded by this request
+        unloaded = bool(league) and league_registry.store(league, load=False) is None
+        return method == 'POST' or action in EXPENSIVE_ACTIONS or unloaded
+
+    def dispatch(self, method, target, headers, body, client=None):
+        """Route a request to the API or the static dashboard files
+
+        Called on the loop, or on a worker thread for requests that
+        `runs_blocking`; only those can ever wait for an admission slot.
+        """
+        parsed_path = urllib.parse.urlsplit(target)
+        if method == 'POST' and parsed_path.path in API_PATHS:
+            return handle_api_query(parsed_path.query, self.store, headers, body, client)
+        if method not in ('GET', 'HEAD'):
+            return self.plain_response(HTTPStatus.METHOD_NOT_ALLOWED)
+
+        if parsed_path.path in API_PATHS:
+            return handle_api_query(parsed_path.query, self.store, headers, client=client)
+        if parsed_path.path == METRICS_PATH:
+            return metrics_response()
+
+        placeholder = self.placeholders.respond(parsed_path.path, headers.get('if-none-match'))
+        if placeholder is not None:
+            return placeholder
+
+        asset = self.static.lookup(parsed_path.path)
+        if asset is None:
+            return self.plain_response(HTTPStatus.NOT_FOUND)
+
+        status, response_headers, content = self.static.respond(
+            asset,
+            headers.get('accept-encoding'),
+            headers.get('if-none-match'),
+            headers.get('if-modified-since'))
+        if content is None:
+            # Large asset kept on disk; write_response sends it with sendfile
+            content = asset
+        return status, response_headers, content
+
+    def plain_response(self, status):
+        """Short text/plain response for errors"""
+        return status.value, [('Content-type', 'text/plain')], status.phrase.encode()
+
+    async def write_response(self, writer, status, headers, body, keep_alive):
+        """Write status line, headers and body, then wait for the socket to drain
+
+        Returns the number of body bytes sent.
+        """
+        streamed = is_streamed(body)
+        lines = []
+        framed = any(name.lower() in ('content-length', 'transfer-encoding') for name, _ in headers)
+        if streamed and keep_alive:
+            lines.append("Transfer-Encoding: chunked")
+        elif status != 304 and not streamed and not framed:
+            lines.append(f"Content-Length: {len(body)}")
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        head = self.response_head(status, headers, lines)
+
+        if isinstance(body, bytes):
+            writer.write(head + body)
+            await writer.drain()
+            return len(body)
+        if isinstance(body, memoryview):
+            # Memory-mapped atlas: hand the mapping to the transport as-is
+            writer.write(head)
+            writer.write(body)
+            await writer.drain()
+            return len(body)
+
+        writer.write(head)
+        await writer.drain()
+        if streamed:
+            # Draining after every chunk keeps memory bounded by the chunk size
+            sent = 0
+            chunks = iter(body)
+            loop = asyncio.get_running_loop()
+            try:
+                while True:
+                    if getattr(body, 'blocking', False):
+                        # Waits on other processes: keep serving other connections meanwhile
+                        chunk = await loop.run_in_executor(None, next, chunks, None)
+                    else:
+                        chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    sent += len(chunk)
+                    writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk) if keep_alive else chunk)
+                    await writer.drain()
+                if keep_alive:
+                    writer.write(b'0\r\n\r\n')
+                    await writer.drain()
+            finally:
+                # Stops work still pending for the stream if the client went away
+                close = getattr(body, 'close', None)
+                if close is not None:
+                    close()
+            return sent
+
+        # Uncached static asset: zero-copy from the file
+        with open(body.path, 'rb') as f:
+            await asyncio.get_running_loop().sendfile(writer.transport, f)
+        return body.size
+
+    def response_head(self, status, headers, extra_lines=()):
+        """Encoded status line and headers, up to and including the blank line"""
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                 f"Date: {formatdate(usegmt=True)}",
+                 "Server: NFLDashboardAsync"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        lines.extend(extra_lines)
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def serve_events(self, writer, headers):
+        """Stream change events to one client until it disconnects
+
+        Returns the number of body bytes sent.
+        """
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        # Events can be published from the reload check of any thread
+        listener = lambda: loop.call_soon_threadsafe(wake.set)
+        event_hub.add_listener(listener)
+        try:
+            cursor, resumed = event_hub.cursor(headers.get('last-event-id'))
+            preamble = event_stream_preamble(self.store.current(), resumed,
+                                             headers.get('last-event-id'))
+            writer.write(self.response_head(200, event_stream_headers()) + preamble)
+            sent = len(preamble)
+            while True:
+                await writer.drain()
+                wake.clear()
+                pending, cursor = event_hub.events_after(cursor)
+                if pending is None:
+                    # Fell behind the history: closing makes the client reconnect and reload
+                    return sent
+                if pending:
+                    chunk = b''.join(pending)
+                    writer.write(chunk)
+                    sent += len(chunk)
+                    continue
+                try:
+                    await asyncio.wait_for(wake.wait(), event_hub.keepalive)
+                except asyncio.TimeoutError:
+                    writer.write(events.KEEPALIVE)
+                    sent += len(events.KEEPALIVE)
+                    # Same check the threaded servers' writer makes for idle streams
+                    self.store.current()
+        finally:
+            event_hub.remove_listener(listener)
+
+async def serve(port=8000, host='', backlog=1024):
+    """Run the asyncio server until cancelled"""
+    app = AsyncHTTPServer()
+    server = await asyncio.start_server(app.handle_connection, host or None, port,
+                                        backlog=backlog)
+    async with server:
+        await server.serve_forever()
+
+def serve_async(port=8000):
+    """Blocking entry point used by start_server"""
+    asyncio.run(serve(port))
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+NFL Dashboard benchmark
+Starts server.py on an ephemeral port against synthetic datasets, drives
+every API action and the static dashboard files at a fixed concurrency,
+and reports throughput and latency percentiles as JSON. Pass a previous
+report as --baseline to flag regressions.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DATA = os.path.join(ROOT, 'nfl_logos.json')
+
+DEFAULT_SIZES = (32, 1000, 100000)
+DEFAULT_MODES = ('threaded', 'prefork', 'asyncio')
+
+# (name, path template); {id} is replaced with a random team id per request
+TARGETS = (
+    ('getTeams', '/api?action=getTeams'),
+    ('getTeam', '/api?action=getTeam&id={id}'),
+    ('getTeamsByConference', '/api?action=getTeamsByConference&conference=AFC'),
+    ('getTeamsByDivision', '/api?action=getTeamsByDivision&division=North'),
+    ('generateLogoVariations', '/api?action=generateLogoVariations&teamId={id}'),
+    ('getDesignProfile', '/api?action=getDesignProfile'),
+    ('getLogoAnalysis', '/api?action=getLogoAnalysis&teamId={id}'),
+    ('search', '/api?action=search&q=new%20yo'),
+    ('search:typo', '/api?action=search&q=cheifs'),
+    ('static:index.html', '/index.html'),
+    ('static:script.js', '/script.js'),
+    ('static:styles.css', '/styles.css'),
+)
+
+def synthetic_dataset(count, seed=0):
+    """`count` teams cloned from the real league with varied names and colors"""
+    with open(SOURCE_DATA, encoding='utf-8') as f:
+        league = json.load(f)['teams']
+
+    rng = random.Random(seed)
+    teams = []
+    for i in range(count):
+        base = league[i % len(league)]
+        generation = i // len(league)
+        suffix = f' {generation + 1}' if generation else ''
+        colors = dict(base['colors'])
+        if generation:
+            colors = {role: '#%06X' % rng.randrange(0x1000000) for role in colors}
+        teams.append({
+            'id': i + 1,
+            'name': f"{base['name']}{suffix}",
+            'city': f"{base['city']}{suffix}",
+            'mascot': base['mascot'],
+            'conference': base['conference'],
+            'division': base['division'],
+            'colors': colors,
+            'logo': base['logo'] if not generation else '',
+            'founded': base['founded'] + generation % 50,
+        })
+    return {'teams': teams}
+
+def free_port():
+    """An ephemeral port nothing is listening on right now"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class ServerProcess:
+    """server.py running in a child process for the duration of a `with` block
+
+    Snapshots and rendered logos go under `workdir`, leaving the repo's own
+    .snapshot and .render_cache alone.
+    """
+
+    def __init__(self, data_file, mode, workdir, extra_args=(), startup_timeout=300):
+        self.data_file = data_file
+        self.mode = mode
+        self.workdir = workdir
+        self.extra_args = list(extra_args)
+        self.startup_timeout = startup_timeout
+        self.port = None
+        self.process = None
+
+    def __enter__(self):
+        self.port = free_port()
+        command = [sys.executable, os.path.join(ROOT, 'server.py'), '--port', str(self.port),
+                   '--mode', self.mode, '--data', self.data_file,
+                   '--snapshot-dir', os.path.join(self.workdir, 'snapshot'),
+                   '--render-cache-dir', os.path.join(self.workdir, 'render_cache')]
+        command += self.extra_args
+        self.process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'server exited with status {self.process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise RuntimeError('server did not start listening in time')
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def run_load(port, path_template, team_count, concurrency, duration, keep_alive,
+             timeout=60):
+    """Hammer one path from `concurrency` threads for `duration` seconds"""
+    latencies = []
+    errors = [0]
+    received = [0]
+    lock = threading.Lock()
+    headers = {} if keep_alive else {'Connection': 'close'}
+    deadline = time.monotonic() + duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local_latencies = []
+        local_errors = 0
+        local_bytes = 0
+        connection = None
+        while time.monotonic() < deadline:
+            path = path_template.format(id=rng.randint(1, team_count))
+            start = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                body = b''
+                if connection is not None:
+                    connection.close()
+                connection = None
+            elapsed = time.perf_counter() - start
+            if ok:
+                local_latencies.append(elapsed)
+                local_bytes += len(body)
+            else:
+                local_errors += 1
+            if not keep_alive and connection is not None:
+                connection.close()
+                connection = None
+        if connection is not None:
+            connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+            received[0] += local_bytes
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def to_ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'bytes': received[0],
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': to_ms(percentile(latencies, 0.50)),
+            'p95': to_ms(percentile(latencies, 0.95)),
+            'p99': to_ms(percentile(latencies, 0.99)),
+            'max': to_ms(latencies[-1] if latencies else None),
+        },
+    }
+
+def warm_up(port, team_count):
+    """Hit every target once so lazily built state isn't billed to the first samples"""
+    for _, template in TARGETS:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+        try:
+            connection.request('GET', template.format(id=team_count))
+            connection.getresponse().read()
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            connection.close()
+
+def result_key(result):
+    """Identity of a measurement, used to match it against the baseline"""
+    return (result['mode'], result['teams'], result['keep_alive'], result['target'])
+
+def compare(results, baseline, threshold):
+    """Measurements that got slower than the baseline by more than `threshold`"""
+    previous = {result_key(result): result for result in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result_key(result))
+        if before is None:
+            continue
+        reasons = []
+        old_rps = before['throughput_rps']
+        if old_rps and result['throughput_rps'] < old_rps * (1 - threshold):
+            reasons.append(f"throughput {before['throughput_rps']} -> {result['throughput_rps']} req/s")
+        old_p95 = before['latency_ms']['p95']
+        new_p95 = result['latency_ms']['p95']
+        if old_p95 and new_p95 and new_p95 > old_p95 * (1 + threshold):
+            reasons.append(f'p95 {old_p95} -> {new_p95} ms')
+        if result['errors'] > before['errors']:
+            reasons.append(f"errors {before['errors']} -> {result['errors']}")
+        if reasons:
+            regressions.append({'mode': result['mode'], 'teams': result['teams'],
+                                'keep_alive': result['keep_alive'],
+                                'target': result['target'], 'reasons': reasons})
+    return regressions
+
+def parse_csv(value, convert=str):
+    """Comma separated option value"""
+    return [convert(item) for item in value.split(',') if item]
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='NFL Dashboard benchmark')
+    parser.add_argument('--modes', type=parse_csv, default=list(DEFAULT_MODES),
+                        help='server modes to measure (default: threaded,prefork,asyncio)')
+    parser.add_argument('--sizes', type=lambda v: parse_csv(v, int), default=list(DEFAULT_SIZES),
+                        help='synthetic dataset sizes in teams (default: 32,1000,100000)')
+    parser.add_argument('--targets', type=parse_csv,
+                        help='subset of targets to run (default: every action and static file)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='simultaneous client connections')
+    parser.add_argument('--duration', type=float, default=3.0,
+                        help='seconds to drive each target')
+    parser.add_argument('--keep-alive', choices=['on', 'off', 'both'], default='both')
+    parser.add_argument('--server-arg', action='append', default=[],
+                        help='extra argument passed to server.py (repeatable)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='previous report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown that counts as a regression (default: 0.2)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the benchmark matrix and print or save the report"""
+    args = parse_args(argv)
+    targets = TARGETS
+    if args.targets:
+        targets = [target for target in TARGETS if target[0] in args.targets]
+    keep_alive_options = {'on': [True], 'off': [False], 'both': [True, False]}[args.keep_alive]
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix='nfl-bench-')
+    try:
+        for size in args.sizes:
+            data_file = os.path.join(workdir, f'teams-{size}.json')
+            with open(data_file, 'w', encoding='utf-8') as f:
+                json.dump(synthetic_dataset(size), f)
+
+            for mode in args.modes:
+                print(f'{mode}: {size} teams', file=sys.stderr)
+                with ServerProcess(data_file, mode, workdir, args.server_arg) as server:
+                    warm_up(server.port, size)
+                    for keep_alive in keep_alive_options:
+                        for name, template in targets:
+                            measurement = run_load(server.port, template, size, args.concurrency,
+                                                   args.duration, keep_alive)
+                            results.append({'mode': mode, 'teams': size,
+                                            'keep_alive': keep_alive, 'target': name,
+                                            **measurement})
+                            print(f"  {name} keep-alive={'on' if keep_alive else 'off'}: "
+                                  f"{measurement['throughput_rps']} req/s, "
+                                  f"p95 {measurement['latency_ms']['p95']} ms", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'settings': {
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'server_args': args.server_arg,
+        },
+        'results': results,
+    }
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['regressions'] = compare(results, baseline, args.threshold)
+
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(encoded + '\n')
+    else:
+        print(encoded)
+
+    regressions = report.get('regressions')
+    if regressions:
+        for regression in regressions:
+            print(f"REGRESSION {regression['mode']} {regression['teams']} teams "
+                  f"{regression['target']}: {'; '.join(regression['reasons'])}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
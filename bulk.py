@@ -0,0 +1,115 @@
+"""
+Bulk work on a process pool
+League-wide exports run their per-team work in worker processes, so they
+scale with cores instead of sharing one interpreter with the request
+threads. Results are yielded as they complete, with a bounded number of
+tasks in flight, so a slow reader or a large league can't pile results
+up in memory.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# Tasks queued or running per worker process; enough to keep every worker
+# busy while finished results wait to be written
+PENDING_PER_WORKER = 2
+
+class ResultStream:
+    """Iterator over a BulkRunner's results; `blocking` because each step may wait on another process
+
+    `on_close` is called once the stream is exhausted, closed or dropped,
+    e.g. to give back the admission slot the whole export runs under.
+    """
+    blocking = True
+
+    def __init__(self, results, on_close=None):
+        self._results = results
+        self.on_close = on_close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._results)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        """Stop early, cancelling tasks that haven't started"""
+        on_close, self.on_close = self.on_close, None
+        try:
+            self._results.close()
+        finally:
+            if on_close is not None:
+                on_close()
+
+    def __del__(self):
+        # A server that drops the stream without closing it (client gone)
+        self.close()
+
+class BulkRunner:
+    """Process pool for one server process, started on first use
+
+    A `workers` of 0 runs every task in the calling thread instead.
+    Workers are started with `spawn`: forking a process that is serving
+    requests on other threads could copy a lock some thread is holding.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = os.cpu_count() or 1 if workers is None else workers
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def pool(self, initializer=None, initargs=()):
+        """The running pool, started (again, after a fork) with `initializer` if needed"""
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.workers,
+                                                 multiprocessing.get_context('spawn'),
+                                                 initializer, initargs)
+                self._pid = os.getpid()
+            return self._pool
+
+    def run(self, function, tasks, initializer=None, initargs=()):
+        """Yield function(*args) for each args in `tasks`, in the order they finish"""
+        if self.workers <= 0:
+            for args in tasks:
+                yield function(*args)
+            return
+
+        pool = self.pool(initializer, initargs)
+        tasks = iter(tasks)
+        pending = set()
+        try:
+            while True:
+                for args in tasks:
+                    pending.add(pool.submit(function, *args))
+                    if len(pending) >= self.workers * PENDING_PER_WORKER:
+                        break
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        except BrokenProcessPool:
+            # A worker died; the next run starts a fresh pool
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        """Stop this process's workers"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None and self._pid == os.getpid():
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,279 @@
+"""
+League-wide team color table
+Every team's primary/secondary/accent colors in one array, classified and
+compared in bulk. Uses NumPy when it is installed and falls back to plain
+Python otherwise, with identical results.
+"""
+
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+COLOR_ROLES = ('primary', 'secondary', 'accent')
+
+DOMINANCE_LABELS = (
+    'Dark-dominant (Strong, Authoritative)',
+    'Light-dominant (Clean, Modern)',
+    'Balanced (Versatile, Dynamic)',
+)
+
+PSYCHOLOGY_LABELS = (
+    'Red conveys power, aggression, and passion',
+    'Blue represents trust, stability, and professionalism',
+    'Green symbolizes growth, nature, and freshness',
+    'Yellow/Gold represents excellence, energy, and optimism',
+    'Unique color choice for distinctive brand identity',
+)
+
+# Precomputed lighten() amount used for modern gradients
+GRADIENT_PERCENT = 20
+
+# Weight of each role in the palette distance
+ROLE_WEIGHTS = (0.5, 0.3, 0.2)
+
+# sRGB (D65) to XYZ, and the D65 reference white
+SRGB_TO_XYZ = (
+    (0.4124564, 0.3575761, 0.1804375),
+    (0.2126729, 0.7151522, 0.0721750),
+    (0.0193339, 0.1191920, 0.9503041),
+)
+WHITE_POINT = (0.95047, 1.0, 1.08883)
+LAB_EPSILON = (6 / 29) ** 3
+LAB_KAPPA = 3 * (6 / 29) ** 2
+
+def parse_hex(hex_color):
+    """Parse '#RRGGBB' into an (r, g, b) tuple"""
+    hex_color = hex_color.lstrip('#')
+    return (int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16))
+
+def format_hex(rgb):
+    """Format an (r, g, b) tuple as '#rrggbb'"""
+    return f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"
+
+def format_packed(packed):
+    """Format a 0xRRGGBB int like format_hex"""
+    return f"#{packed:06x}"
+
+def pack_rgb(rgb):
+    """(r, g, b) as one 0xRRGGBB int"""
+    return (rgb[0] << 16) | (rgb[1] << 8) | rgb[2]
+
+def normalize_hex(hex_color):
+    """Canonical lookup key for a hex color"""
+    return hex_color.lstrip('#').upper()
+
+def dominance_class(r, g, b):
+    """Index into DOMINANCE_LABELS for one color"""
+    lightness = (r + g + b) / (3 * 255)
+    if lightness < 0.3:
+        return 0
+    if lightness > 0.7:
+        return 1
+    return 2
+
+def psychology_class(r, g, b):
+    """Index into PSYCHOLOGY_LABELS for one color"""
+    if r > g and r > b and r > 150:
+        return 0
+    if b > r and b > g and b > 150:
+        return 1
+    if g > r and g > b and g > 150:
+        return 2
+    if r > 200 and g > 200 and b < 100:
+        return 3
+    return 4
+
+def lighten(rgb, percent):
+    """Lighten one color by a percentage of full scale"""
+    amount = percent * 255 / 100
+    return tuple(min(255, int(channel + amount)) for channel in rgb)
+
+def rgb_to_lab(rgb):
+    """Convert one sRGB color to CIELAB"""
+    linear = []
+    for channel in rgb:
+        c = channel / 255
+        linear.append(c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4)
+
+    f = []
+    for row, white in zip(SRGB_TO_XYZ, WHITE_POINT):
+        t = sum(m * c for m, c in zip(row, linear)) / white
+        f.append(t ** (1 / 3) if t > LAB_EPSILON else t / LAB_KAPPA + 4 / 29)
+
+    return (116 * f[1] - 16, 500 * (f[0] - f[1]), 200 * (f[1] - f[2]))
+
+class ColorTable:
+    """Colors for every team, indexed by team id and by primary color
+
+    Classifications are kept as label codes and the gradient end as packed
+    ints, so the per-team columns are plain arrays.
+    """
+
+    def __init__(self, teams):
+        self.ids = []
+        # Parsed channels are only needed while building; keeping them would cost
+        # four tuples per team for the life of the dataset
+        rgb = []
+        self.row_by_primary = {}
+        for row, team in enumerate(teams):
+            colors = team['colors']
+            self.ids.append(team['id'])
+            rgb.append(tuple(parse_hex(colors[role]) for role in COLOR_ROLES))
+            self.row_by_primary.setdefault(normalize_hex(colors['primary']), row)
+        self.row_by_id = {team_id: row for row, team_id in enumerate(self.ids)}
+
+        if np is not None and rgb:
+            self._build_vectorized(rgb)
+        else:
+            self._build_scalar(rgb)
+
+    @classmethod
+    def from_columns(cls, ids, row_by_id, row_by_primary, dominance, psychology, gradient_end,
+                     lab):
+        """Table over already computed columns, e.g. ones mapped from a snapshot
+
+        `lab` is a flat sequence of floats, nine per team.
+        """
+        table = cls.__new__(cls)
+        table.ids = ids
+        table.row_by_id = row_by_id
+        table.row_by_primary = row_by_primary
+        table.dominance = dominance
+        table.psychology = psychology
+        table.gradient_end = gradient_end
+        if np is not None and len(ids):
+            table.lab = np.frombuffer(lab, dtype=np.float64).reshape(-1, len(COLOR_ROLES), 3)
+        else:
+            table.lab = [tuple(tuple(lab[i + j:i + j + 3]) for j in range(0, 9, 3))
+                         for i in range(0, len(lab), 9)]
+        return table
+
+    def with_rows(self, previous, teams, rows):
+        """Copy for an updated team list, recomputing only `rows` (team ids must not change)
+
+        `previous` is the team list this table was built from.
+        """
+        table = ColorTable.__new__(ColorTable)
+        table.ids = self.ids
+        table.row_by_id = self.row_by_id
+        table.row_by_primary = dict(self.row_by_primary.items())
+        table.dominance = array('B', self.dominance)
+        table.psychology = array('B', self.psychology)
+        table.gradient_end = array('L', self.gradient_end)
+        table.lab = self.lab.copy() if np is not None and not isinstance(self.lab, list) \
+            else list(self.lab)
+        for row in rows:
+            colors = teams[row]['colors']
+            rgb = tuple(parse_hex(colors[role]) for role in COLOR_ROLES)
+            # Labels are a function of the color alone, so a color missing here is
+            # just classified on lookup instead
+            old_key = normalize_hex(previous[row]['colors']['primary'])
+            if table.row_by_primary.get(old_key) == row:
+                del table.row_by_primary[old_key]
+            table.row_by_primary.setdefault(normalize_hex(colors['primary']), row)
+            table.dominance[row] = dominance_class(*rgb[0])
+            table.psychology[row] = psychology_class(*rgb[0])
+            table.gradient_end[row] = pack_rgb(lighten(rgb[0], GRADIENT_PERCENT))
+            if isinstance(table.lab, list):
+                table.lab[row] = tuple(rgb_to_lab(color) for color in rgb)
+            else:
+                table.lab[row] = self._lab_array(np.array(rgb, dtype=np.int64))
+        return table
+
+    def _build_vectorized(self, rgb):
+        """Classify and convert every color in one pass over (teams, roles, rgb) arrays"""
+        rgb = np.array(rgb, dtype=np.int64)
+        primary = rgb[:, 0, :]
+        r, g, b = primary[:, 0], primary[:, 1], primary[:, 2]
+
+        lightness = primary.sum(axis=1) / (3 * 255)
+        dominance = np.select([lightness < 0.3, lightness > 0.7], [0, 1], default=2)
+
+        psychology = np.select(
+            [(r > g) & (r > b) & (r > 150),
+             (b > r) & (b > g) & (b > 150),
+             (g > r) & (g > b) & (g > 150),
+             (r > 200) & (g > 200) & (b < 100)],
+            [0, 1, 2, 3], default=4)
+
+        amount = GRADIENT_PERCENT * 255 / 100
+        gradient = np.minimum(255, np.floor(primary + amount)).astype(np.int64)
+
+        self.dominance = array('B', dominance.tolist())
+        self.psychology = array('B', psychology.tolist())
+        self.gradient_end = array('L', ((gradient[:, 0] << 16) | (gradient[:, 1] << 8)
+                                        | gradient[:, 2]).tolist())
+        self.lab = self._lab_array(rgb)
+
+    def _lab_array(self, rgb):
+        """CIELAB for an (..., 3) integer RGB array"""
+        c = rgb / 255.0
+        linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+        xyz = linear @ np.array(SRGB_TO_XYZ).T / np.array(WHITE_POINT)
+        f = np.where(xyz > LAB_EPSILON, np.cbrt(xyz), xyz / LAB_KAPPA + 4 / 29)
+        return np.stack([116 * f[..., 1] - 16,
+                         500 * (f[..., 0] - f[..., 1]),
+                         200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+    def _build_scalar(self, rgb):
+        """Same results as _build_vectorized, one color at a time"""
+        self.dominance = array('B', (dominance_class(*colors[0]) for colors in rgb))
+        self.psychology = array('B', (psychology_class(*colors[0]) for colors in rgb))
+        self.gradient_end = array('L', (pack_rgb(lighten(colors[0], GRADIENT_PERCENT))
+                                        for colors in rgb))
+        self.lab = [tuple(rgb_to_lab(color) for color in colors) for colors in rgb]
+
+    def dominance_for(self, hex_color):
+        """Color dominance label for a primary color"""
+        row = self.row_by_primary.get(normalize_hex(hex_color))
+        if row is not None:
+            return DOMINANCE_LABELS[self.dominance[row]]
+        return DOMINANCE_LABELS[dominance_class(*parse_hex(hex_color))]
+
+    def psychology_for(self, hex_color):
+        """Color psychology label for a primary color"""
+        row = self.row_by_primary.get(normalize_hex(hex_color))
+        if row is not None:
+            return PSYCHOLOGY_LABELS[self.psychology[row]]
+        return PSYCHOLOGY_LABELS[psychology_class(*parse_hex(hex_color))]
+
+    def lighten_for(self, hex_color, percent):
+        """Lightened primary color, precomputed for the gradient amount"""
+        row = self.row_by_primary.get(normalize_hex(hex_color))
+        if row is not None and percent == GRADIENT_PERCENT:
+            return format_packed(self.gradient_end[row])
+        return format_hex(lighten(parse_hex(hex_color), percent))
+
+    def distances_from(self, team_id):
+        """Weighted CIE76 palette distance from one team to every team, by row"""
+        row = self.row_by_id[team_id]
+        if np is not None and not isinstance(self.lab, list):
+            delta = np.linalg.norm(self.lab - self.lab[row], axis=-1)
+            return delta @ np.array(ROLE_WEIGHTS)
+
+        origin = self.lab[row]
+        return [sum(weight * math.dist(a, b)
+                    for weight, a, b in zip(ROLE_WEIGHTS, origin, other))
+                for other in self.lab]
+
+    def most_similar(self, team_id, limit=5):
+        """Nearest other teams as (team_id, distance), closest first"""
+        distances = self.distances_from(team_id)
+        row = self.row_by_id[team_id]
+        limit = max(0, min(limit, len(self.ids) - 1))
+        if limit == 0:
+            return []
+
+        if np is not None and not isinstance(distances, list):
+            distances = distances.copy()
+            distances[row] = np.inf
+            nearest = np.argpartition(distances, limit - 1)[:limit]
+            nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+            return [(self.ids[i], float(distances[i])) for i in nearest.tolist()]
+
+        ranked = sorted((d, i) for i, d in enumerate(distances) if i != row)
+        return [(self.ids[i], d) for d, i in ranked[:limit]]
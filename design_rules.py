@@ -0,0 +1,196 @@
+"""
+Design classification rules
+Mascot shapes, mascot motifs and regional influences are data in
+design_rules.json. At load they are compiled into dict lookups plus an
+Aho-Corasick automaton over the region names, and every team of a
+dataset is classified once into small code columns.
+"""
+
+import json
+from array import array
+from collections import deque
+
+from team_table import copy_column
+
+RULES_FILE = 'design_rules.json'
+
+# Column code of a team that couldn't be classified at load (e.g. no mascot);
+# it is classified on request instead, failing there like any bad record
+UNCLASSIFIED = 0xFFFF
+
+class PatternMatcher:
+    """Aho-Corasick automaton finding which of several substrings occur in a text, in one pass"""
+
+    def __init__(self, patterns):
+        # Per node: transitions, failure link, and the lowest index of a
+        # pattern ending there (directly or through the failure links)
+        self.goto = [{}]
+        self.fail = [0]
+        self.match = [None]
+        for index, pattern in enumerate(patterns):
+            node = 0
+            for char in pattern:
+                child = self.goto[node].get(char)
+                if child is None:
+                    child = self.goto[node][char] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.match.append(None)
+                node = child
+            if self.match[node] is None:
+                self.match[node] = index
+
+        pending = deque(self.goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for char, child in self.goto[node].items():
+                pending.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                inherited = self.match[self.fail[child]]
+                if inherited is not None and (self.match[child] is None
+                                              or inherited < self.match[child]):
+                    self.match[child] = inherited
+
+    def first(self, text):
+        """Index of the earliest listed pattern occurring anywhere in `text`, or None"""
+        goto = self.goto
+        fail = self.fail
+        match = self.match
+        node = 0
+        best = match[0]
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            found = match[node]
+            if found is not None and (best is None or found < best):
+                best = found
+        return best
+
+class DesignRules:
+    """Classification rules compiled into constant-time lookups"""
+
+    def __init__(self, rules):
+        shapes = rules.get('shapes', {})
+        self.mascot_shapes = {mascot.lower(): shape
+                              for mascot, shape in shapes.get('mascots', {}).items()}
+        self.style_shapes = dict(shapes.get('styles', {}))
+        self.default_shape = shapes.get('default')
+
+        motifs = rules.get('motifs', {})
+        self.mascot_motifs = {}
+        for motif, mascots in motifs.get('mascots', {}).items():
+            for mascot in mascots:
+                # An earlier motif keeps a mascot listed twice
+                self.mascot_motifs.setdefault(mascot.lower(), motif)
+        self.default_motif = motifs.get('default')
+
+        regions = rules.get('regions', {})
+        cities = list(regions.get('cities', {}).items())
+        self.region_matcher = PatternMatcher([region.lower() for region, _ in cities])
+        self.influences = [influence for _, influence in cities]
+        self.default_influence = regions.get('default')
+
+    @classmethod
+    def load(cls, path=RULES_FILE):
+        """Read and compile a rules file"""
+        with open(path, 'rb') as f:
+            return cls(json.loads(f.read()))
+
+    def shape_for_mascot(self, mascot):
+        """Mascot-specific shape, or None"""
+        return self.mascot_shapes.get(mascot.lower())
+
+    def shape_for_style(self, style):
+        """Generic shape for a style, used when the mascot has none"""
+        return self.style_shapes.get(style, self.default_shape)
+
+    def motif_for(self, mascot):
+        """Primary motif of a mascot"""
+        return self.mascot_motifs.get(mascot.lower(), self.default_motif)
+
+    def influence_for(self, city):
+        """Regional influence of the first listed region named in the city"""
+        index = self.region_matcher.first(city.lower())
+        return self.default_influence if index is None else self.influences[index]
+
+    def classify(self, team):
+        """(mascot shape or None, motif, regional influence) for one team"""
+        return (self.shape_for_mascot(team['mascot']), self.motif_for(team['mascot']),
+                self.influence_for(team['city']))
+
+class TeamDesign:
+    """Every team's classification, computed once per dataset and stored as code columns"""
+
+    def __init__(self, rules, table):
+        self.rules = rules
+        self.table = table
+        self.values = []
+        self.shapes = array('H')
+        self.motifs = array('H')
+        self.influences = array('H')
+
+        codes = {}
+        # Mascots and cities repeat across a league; classify each once
+        by_mascot = {}
+        by_city = {}
+        for row in table.rows:
+            for column, code in zip((self.shapes, self.motifs, self.influences),
+                                    self._classify_row(row, codes, by_mascot, by_city)):
+                column.append(code)
+
+    def _classify_row(self, row, codes, by_mascot, by_city):
+        """Value codes of one row's (shape, motif, influence), adding new values as needed"""
+        try:
+            mascot = self.table.value(row, 'mascot')
+            city = self.table.value(row, 'city')
+            if mascot not in by_mascot:
+                by_mascot[mascot] = (self.rules.shape_for_mascot(mascot),
+                                     self.rules.motif_for(mascot))
+            if city not in by_city:
+                by_city[city] = self.rules.influence_for(city)
+        except (KeyError, TypeError, AttributeError):
+            return (UNCLASSIFIED,) * 3
+        result = []
+        for value in by_mascot[mascot] + (by_city[city],):
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(self.values)
+                self.values.append(value)
+            result.append(code)
+        return result
+
+    def with_rows(self, table, rows):
+        """Classifications for an updated copy of the table, reclassifying only `rows`"""
+        design = TeamDesign.from_columns(self.rules, table, list(self.values),
+                                         copy_column(self.shapes), copy_column(self.motifs),
+                                         copy_column(self.influences))
+        codes = {value: code for code, value in enumerate(design.values)}
+        for row in rows:
+            (design.shapes[row], design.motifs[row],
+             design.influences[row]) = design._classify_row(row, codes, {}, {})
+        return design
+
+    @classmethod
+    def from_columns(cls, rules, table, values, shapes, motifs, influences):
+        """Classifications computed earlier, e.g. mapped from a snapshot"""
+        design = cls.__new__(cls)
+        design.rules = rules
+        design.table = table
+        design.values = values
+        design.shapes = shapes
+        design.motifs = motifs
+        design.influences = influences
+        return design
+
+    def get(self, team):
+        """(mascot shape or None, motif, regional influence) for a team of this dataset"""
+        row = self.table.row_for_id(team['id'])
+        if row is None or self.shapes[row] == UNCLASSIFIED:
+            return self.rules.classify(team)
+        values = self.values
+        return (values[self.shapes[row]], values[self.motifs[row]],
+                values[self.influences[row]])
@@ -0,0 +1,176 @@
+"""
+Dataset change events
+Changes to the team data are published here and pushed to dashboards as
+server-sent events. A short history lets a reconnecting client resume
+from its Last-Event-ID. Streams handed over by the threaded server are
+written from one background thread, so an idle dashboard doesn't hold a
+worker thread.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+CONTENT_TYPE = 'text/event-stream'
+
+# Seconds between comment lines on an otherwise idle stream, so proxies
+# keep it open and dead clients are noticed
+KEEPALIVE_INTERVAL = 15
+KEEPALIVE = b': keepalive\n\n'
+
+# A client that can't take an event within this many seconds is dropped
+SEND_TIMEOUT = 2.0
+
+# How long a disconnected client waits before reconnecting, in milliseconds
+RETRY_MS = 3000
+
+# Seconds between `poll` calls while streams are open
+POLL_INTERVAL = 1.0
+
+def format_event(event_id, event_type, data):
+    """One event in the text/event-stream format; without an id it can't be resumed from"""
+    event = f'id: {event_id}\n' if event_id is not None else ''
+    return (f'{event}event: {event_type}\n'
+            f'data: {json.dumps(data, separators=(",", ":"))}\n\n').encode()
+
+class EventHub:
+    """Recent change events of one process and the streams waiting for them
+
+    Event ids are `<instance>:<n>`, the instance naming both the run and the
+    (forked) process; a Last-Event-ID from another process or an older run
+    can't be resumed, and the stream starts with a `reload`
+    event telling the client to fetch everything again.
+    """
+
+    def __init__(self, history=256, keepalive=KEEPALIVE_INTERVAL, poll=None):
+        self.run = uuid.uuid4().hex[:8]
+        self.keepalive = keepalive
+        # Called now and then while streams are open, e.g. to notice a data
+        # file another process changed in a process serving no requests
+        self.poll = poll
+        self.last_id = 0
+        # (number, encoded event), oldest first
+        self.history = deque(maxlen=history)
+        self.dropped = 0
+        self._listeners = []
+        self._streams = []
+        self._condition = threading.Condition()
+        self._pid = None
+
+    @property
+    def instance(self):
+        """Prefix of this process's event ids"""
+        return f'{self.run}.{os.getpid()}'
+
+    def publish(self, event_type, data):
+        """Record an event and wake every stream"""
+        with self._condition:
+            self.last_id += 1
+            self.history.append(
+                (self.last_id, format_event(f'{self.instance}:{self.last_id}', event_type, data)))
+            listeners = list(self._listeners)
+            self._condition.notify_all()
+        for listener in listeners:
+            listener()
+
+    def cursor(self, last_event_id=None):
+        """Where a stream starts: after the client's last event if it can be resumed, else now
+
+        Returns (cursor, resumed).
+        """
+        instance, _, number = (last_event_id or '').partition(':')
+        with self._condition:
+            if instance == self.instance and number.isdigit():
+                number = int(number)
+                oldest = self.history[0][0] if self.history else self.last_id + 1
+                if oldest <= number + 1 and number <= self.last_id:
+                    return number, True
+            return self.last_id, False
+
+    def events_after(self, cursor):
+        """(encoded events after `cursor`, new cursor); None instead of events once it fell out of history"""
+        with self._condition:
+            if cursor >= self.last_id:
+                return [], cursor
+            if not self.history or self.history[0][0] > cursor + 1:
+                return None, self.last_id
+            return [event for number, event in self.history if number > cursor], self.last_id
+
+    def add_listener(self, callback):
+        """Call `callback()` (from the publishing thread) after every event"""
+        with self._condition:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Stop calling a listener"""
+        with self._condition:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def hand_off(self, sock, cursor):
+        """Keep writing events after `cursor` to an answered connection, from the background thread"""
+        if self._pid != os.getpid():
+            self._start()
+        sock.settimeout(SEND_TIMEOUT)
+        with self._condition:
+            self._streams.append([sock, cursor, time.monotonic()])
+            self._condition.notify_all()
+
+    def _start(self):
+        """Start the writer thread (again, after a fork: threads don't survive it)"""
+        with self._condition:
+            if self._pid == os.getpid():
+                return
+            self._streams = []
+            threading.Thread(target=self._write_forever, name='event-streams',
+                             daemon=True).start()
+            self._pid = os.getpid()
+
+    def _write_forever(self):
+        """Send new events, and keepalives to idle streams, until the process exits"""
+        while True:
+            with self._condition:
+                # A publish while the last round was being sent has nothing left to wake
+                if all(stream[1] >= self.last_id for stream in self._streams):
+                    self._condition.wait(min(self.keepalive / 2, POLL_INTERVAL))
+                streams = list(self._streams)
+            if streams and self.poll is not None:
+                try:
+                    self.poll()
+                except Exception as e:
+                    print(f"Error checking for changes: {e}")
+            now = time.monotonic()
+            for stream in streams:
+                sock, cursor, last_sent = stream
+                events, stream[1] = self.events_after(cursor)
+                if events is None:
+                    # Fell behind the history: closing makes the client reconnect and reload
+                    self._close(stream)
+                    continue
+                if not events and now - last_sent < self.keepalive:
+                    continue
+                try:
+                    sock.sendall(b''.join(events) or KEEPALIVE)
+                except OSError:
+                    self.dropped += 1
+                    self._close(stream)
+                    continue
+                stream[2] = now
+
+    def _close(self, stream):
+        """Stop writing to a stream and close its connection"""
+        with self._condition:
+            if stream in self._streams:
+                self._streams.remove(stream)
+        try:
+            stream[0].close()
+        except OSError:
+            pass
+
+    @property
+    def streams(self):
+        """Streams currently handed over to the writer thread"""
+        return len(self._streams)
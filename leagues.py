@@ -0,0 +1,139 @@
+"""
+League registry
+Maps league names (other leagues, past seasons) to their data files. A
+league's store is created and loaded the first time a request names it,
+and the least recently used leagues are dropped once the loaded ones
+outgrow a memory budget. Preloaded leagues are loaded at start and never
+dropped, so the popular ones stay hot.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+DEFAULT_LEAGUE = 'nfl'
+
+# Names double as directory names for per-league snapshots and atlases
+LEAGUE_NAME = re.compile(r'[A-Za-z0-9][A-Za-z0-9_-]{0,63}')
+
+def load_registry(path):
+    """{league: {'data': path, 'rules': path or None}} from a registry file
+
+    The file maps each league to its data file, or to an object with
+    `data` and optionally `rules`; relative paths are relative to the
+    registry file. Raises ValueError for a malformed registry.
+    """
+    with open(path, 'rb') as f:
+        entries = json.loads(f.read())
+    if not isinstance(entries, dict):
+        raise ValueError(f'{path} must map league names to data files')
+    base = os.path.dirname(os.path.abspath(path))
+    files = {}
+    for name, entry in entries.items():
+        if not LEAGUE_NAME.fullmatch(name):
+            raise ValueError(f"Invalid league name '{name}'")
+        if isinstance(entry, str):
+            entry = {'data': entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get('data'), str):
+            raise ValueError(f"League '{name}' needs a data file")
+        rules = entry.get('rules')
+        files[name] = {'data': os.path.join(base, entry['data']),
+                       'rules': os.path.join(base, rules) if rules else None}
+    return files
+
+class LeagueRegistry:
+    """Stores of the registered leagues, loaded on first use and evicted least recently used
+
+    `factory(name, files)` creates a league's store, which must offer
+    `current()` and `memory_size()`. The default league's store is always
+    loaded; a `memory_budget` of 0 never evicts.
+    """
+
+    def __init__(self, factory, default_store, default=DEFAULT_LEAGUE, files=None,
+                 memory_budget=0):
+        self.factory = factory
+        self.default = default
+        self.default_store = default_store
+        self.files = dict(files or {})
+        self.memory_budget = memory_budget
+        self.loads = 0
+        self.evictions = 0
+        self.pinned = set()
+        # League -> store, least recently used first
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, league):
+        """Whether requests may name `league`"""
+        return not league or league == self.default or league in self.files
+
+    def store(self, league=None, load=True):
+        """Store of a league (the default one for None or '')
+
+        None if the league isn't registered, or with `load` false, if it
+        isn't loaded yet.
+        """
+        if not league or league == self.default:
+            return self.default_store
+        with self._lock:
+            store = self._stores.get(league)
+            if store is not None:
+                self._stores.move_to_end(league)
+                return store
+            files = self.files.get(league)
+            if files is None or not load:
+                return None
+            store = self._stores[league] = self.factory(league, files)
+            self.loads += 1
+        # Load outside the registry lock so other leagues aren't held up;
+        # the store's own lock makes concurrent first requests share one load
+        store.current()
+        self.evict(keep=league)
+        return store
+
+    def preload(self, leagues):
+        """Load leagues now and keep them loaded; raises KeyError for an unknown one"""
+        for league in leagues:
+            if self.store(league) is None:
+                raise KeyError(league)
+            self.pinned.add(league)
+
+    def evict(self, keep=None):
+        """Drop least recently used leagues until the loaded ones fit the memory budget"""
+        if self.memory_budget <= 0:
+            return
+        with self._lock:
+            sizes = {league: store.memory_size() for league, store in self._stores.items()}
+            total = self.default_store.memory_size() + sum(sizes.values())
+            for league in list(self._stores):
+                if total <= self.memory_budget:
+                    break
+                if league == keep or league in self.pinned:
+                    continue
+                # Requests still using its dataset keep it alive until they finish
+                del self._stores[league]
+                total -= sizes[league]
+                self.evictions += 1
+
+    def render(self):
+        """Loaded leagues, their estimated memory and load/eviction counts in Prometheus text format"""
+        with self._lock:
+            stores = [(self.default, self.default_store)] + list(self._stores.items())
+            loads, evictions = self.loads, self.evictions
+        lines = [
+            '# HELP nfl_league_memory_bytes Estimated memory of each loaded league.',
+            '# TYPE nfl_league_memory_bytes gauge',
+        ]
+        for league, store in stores:
+            lines.append(f'nfl_league_memory_bytes{{league="{league}"}} {store.memory_size()}')
+        lines += [
+            '# HELP nfl_league_loads_total Leagues loaded on first use since start.',
+            '# TYPE nfl_league_loads_total counter',
+            f'nfl_league_loads_total {loads}',
+            '# HELP nfl_league_evictions_total Leagues dropped to stay within the memory budget.',
+            '# TYPE nfl_league_evictions_total counter',
+            f'nfl_league_evictions_total {evictions}',
+        ]
+        return ('\n'.join(lines) + '\n').encode()
@@ -0,0 +1,578 @@
+"""
+Server-side logo rendering
+Draws the minimalist / retro / modern concepts (the same geometry script.js
+draws on canvas) to SVG or PNG, without any imaging dependencies, and keeps
+rendered files in a content-addressed disk cache.
+"""
+
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+RENDERER_VERSION = 1
+STYLES = ('minimalist', 'retro', 'modern')
+FORMATS = {'svg': 'image/svg+xml', 'png': 'image/png'}
+MIN_SIZE = 16
+MAX_SIZE = 1024
+# PNGs are rasterized in Python at SUPERSAMPLE x their size; a cold 1024
+# render takes seconds, so they stop at half the SVG limit
+MAX_PNG_SIZE = 512
+SUPERSAMPLE = 2
+ATLAS_MAX_TILE = 256
+ATLAS_SUBDIR = 'atlas'
+PLACEHOLDER_SIZE = 200
+
+# 5x7 bitmap glyphs for PNG text; SVG output uses real fonts instead
+FONT = {
+    'A': ('01110', '10001', '10001', '11111', '10001', '10001', '10001'),
+    'B': ('11110', '10001', '10001', '11110', '10001', '10001', '11110'),
+    'C': ('01110', '10001', '10000', '10000', '10000', '10001', '01110'),
+    'D': ('11110', '10001', '10001', '10001', '10001', '10001', '11110'),
+    'E': ('11111', '10000', '10000', '11110', '10000', '10000', '11111'),
+    'F': ('11111', '10000', '10000', '11110', '10000', '10000', '10000'),
+    'G': ('01110', '10001', '10000', '10111', '10001', '10001', '01111'),
+    'H': ('10001', '10001', '10001', '11111', '10001', '10001', '10001'),
+    'I': ('01110', '00100', '00100', '00100', '00100', '00100', '01110'),
+    'J': ('00111', '00010', '00010', '00010', '00010', '10010', '01100'),
+    'K': ('10001', '10010', '10100', '11000', '10100', '10010', '10001'),
+    'L': ('10000', '10000', '10000', '10000', '10000', '10000', '11111'),
+    'M': ('10001', '11011', '10101', '10101', '10001', '10001', '10001'),
+    'N': ('10001', '10001', '11001', '10101', '10011', '10001', '10001'),
+    'O': ('01110', '10001', '10001', '10001', '10001', '10001', '01110'),
+    'P': ('11110', '10001', '10001', '11110', '10000', '10000', '10000'),
+    'Q': ('01110', '10001', '10001', '10001', '10101', '10010', '01101'),
+    'R': ('11110', '10001', '10001', '11110', '10100', '10010', '10001'),
+    'S': ('01111', '10000', '10000', '01110', '00001', '00001', '11110'),
+    'T': ('11111', '00100', '00100', '00100', '00100', '00100', '00100'),
+    'U': ('10001', '10001', '10001', '10001', '10001', '10001', '01110'),
+    'V': ('10001', '10001', '10001', '10001', '10001', '01010', '00100'),
+    'W': ('10001', '10001', '10001', '10101', '10101', '10101', '01010'),
+    'X': ('10001', '10001', '01010', '00100', '01010', '10001', '10001'),
+    'Y': ('10001', '10001', '01010', '00100', '00100', '00100', '00100'),
+    'Z': ('11111', '00001', '00010', '00100', '01000', '10000', '11111'),
+    '0': ('01110', '10001', '10011', '10101', '11001', '10001', '01110'),
+    '1': ('00100', '01100', '00100', '00100', '00100', '00100', '01110'),
+    '2': ('01110', '10001', '00001', '00010', '00100', '01000', '11111'),
+    '3': ('11111', '00010', '00100', '00010', '00001', '10001', '01110'),
+    '4': ('00010', '00110', '01010', '10010', '11111', '00010', '00010'),
+    '5': ('11111', '10000', '11110', '00001', '00001', '10001', '01110'),
+    '6': ('00110', '01000', '10000', '11110', '10001', '10001', '01110'),
+    '7': ('11111', '00001', '00010', '00100', '01000', '01000', '01000'),
+    '8': ('01110', '10001', '10001', '01110', '10001', '10001', '01110'),
+    '9': ('01110', '10001', '10001', '01111', '00001', '00010', '01100'),
+    '.': ('00000', '00000', '00000', '00000', '00000', '01100', '01100'),
+    '-': ('00000', '00000', '00000', '11111', '00000', '00000', '00000'),
+    "'": ('00100', '00100', '01000', '00000', '00000', '00000', '00000'),
+    '&': ('01100', '10010', '10100', '01000', '10101', '10010', '01101'),
+    ' ': ('00000',) * 7,
+}
+
+def parse_color(hex_color):
+    """Parse '#RRGGBB' into an (r, g, b) tuple"""
+    hex_color = hex_color.lstrip('#')
+    return (int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16))
+
+def star_points(cx, cy, spikes, outer, inner):
+    """Vertices of a star, matching drawStar in script.js"""
+    points = []
+    rotation = math.pi / 2 * 3
+    step = math.pi / spikes
+    for _ in range(spikes):
+        points.append((cx + math.cos(rotation) * outer, cy + math.sin(rotation) * outer))
+        rotation += step
+        points.append((cx + math.cos(rotation) * inner, cy + math.sin(rotation) * inner))
+        rotation += step
+    return points
+
+def shield_points(cx, cy, half_width, half_height, waist):
+    """Vertices of the six-sided shield used by the retro concept"""
+    return [(cx, cy - half_height),
+            (cx - half_width, cy - half_height * waist),
+            (cx - half_width, cy + half_height * waist),
+            (cx, cy + half_height),
+            (cx + half_width, cy + half_height * waist),
+            (cx + half_width, cy - half_height * waist)]
+
+def emblem_points(primary_shape, cx, cy, radius):
+    """Simple geometric emblem for shapes that have an obvious one, else None"""
+    shape = primary_shape.lower()
+    if 'star' in shape:
+        return star_points(cx, cy, 5, radius, radius * 0.45)
+    if 'lightning' in shape:
+        r = radius
+        return [(cx + 0.15 * r, cy - r), (cx - 0.45 * r, cy + 0.1 * r), (cx - 0.05 * r, cy + 0.1 * r),
+                (cx - 0.2 * r, cy + r), (cx + 0.45 * r, cy - 0.15 * r), (cx + 0.05 * r, cy - 0.15 * r)]
+    if 'arrowhead' in shape:
+        return [(cx, cy - radius), (cx + radius * 0.75, cy + radius * 0.8),
+                (cx, cy + radius * 0.35), (cx - radius * 0.75, cy + radius * 0.8)]
+    return None
+
+def build_scene(spec):
+    """Lay out a concept as primitives in a size x size box
+
+    `spec` holds style, size, colors (primary/secondary/accent), gradient
+    (start, end), primary_shape, initial, city, mascot and founded.
+    """
+    size = spec['size']
+    colors = spec['colors']
+    cx = cy = size / 2
+    unit = size / 200
+    scene = []
+
+    if spec['style'] == 'minimalist':
+        radius = size * 0.35
+        scene.append(('circle', cx, cy, radius, colors['primary']))
+        scene.append(('circle', cx, cy, radius * 0.7, colors['secondary']))
+        scene.append(('text', spec['initial'], cx, cy, radius * 0.8, colors['accent'], 'sans-serif'))
+        scene.append(('ring', cx, cy, radius, 3 * unit, '#ffffff'))
+
+    elif spec['style'] == 'retro':
+        half_width, half_height = size * 0.35, size * 0.4
+        scene.append(('polygon', shield_points(cx, cy, half_width, half_height, 0.3), colors['primary']))
+        scene.append(('polygon', shield_points(cx, cy, half_width * 0.7, half_height * 0.7, 1 / 7),
+                      colors['secondary']))
+        scene.append(('text', spec['initial'], cx, cy, 32 * unit, colors['accent'], 'serif'))
+        scene.append(('text', spec['city'].upper(), cx, cy - size * 0.15, 16 * unit, colors['primary'], 'serif'))
+        scene.append(('text', spec['mascot'].upper(), cx, cy + size * 0.25, 14 * unit, colors['primary'], 'serif'))
+        for dx in (-0.3, 0.3):
+            scene.append(('polygon', star_points(cx + size * dx, cy - size * 0.3, 8, 5 * unit, 3 * unit),
+                          colors['secondary']))
+        scene.append(('text', f"EST. {spec['founded']}", cx, cy + size * 0.35, 10 * unit,
+                      colors['primary'], 'serif'))
+
+    else:
+        # Modern: angular hexagon filled with the primary gradient, emblem or initial on top
+        radius = size * 0.42
+        hexagon = [(cx + radius * math.cos(math.radians(60 * i - 30)),
+                    cy + radius * math.sin(math.radians(60 * i - 30))) for i in range(6)]
+        scene.append(('gradient_polygon', hexagon, spec['gradient'][0], spec['gradient'][1]))
+        slash = [(cx - radius * 0.9, cy + radius * 0.35), (cx + radius * 0.9, cy - radius * 0.25),
+                 (cx + radius * 0.9, cy - radius * 0.05), (cx - radius * 0.9, cy + radius * 0.55)]
+        scene.append(('polygon', slash, colors['secondary']))
+        emblem = emblem_points(spec['primary_shape'], cx, cy, radius * 0.45)
+        if emblem:
+            scene.append(('polygon', emblem, colors['accent']))
+        else:
+            scene.append(('text', spec['initial'], cx, cy, radius * 0.8, colors['accent'], 'sans-serif'))
+
+    return scene
+
+def render_svg(scene, size):
+    """Serialize a scene as an SVG document"""
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+             f'viewBox="0 0 {size} {size}">']
+    parts.extend(svg_elements(scene))
+    parts.append('</svg>')
+    return '\n'.join(parts).encode()
+
+def svg_elements(scene, id_prefix='g'):
+    """SVG elements for a scene; gradient ids get `id_prefix` so tiles can share a document"""
+    parts = []
+    gradients = 0
+
+    def points_attr(points):
+        return ' '.join(f'{x:.2f},{y:.2f}' for x, y in points)
+
+    for item in scene:
+        kind = item[0]
+        if kind == 'circle':
+            _, x, y, r, color = item
+            parts.append(f'<circle cx="{x:.2f}" cy="{y:.2f}" r="{r:.2f}" fill="{color}"/>')
+        elif kind == 'ring':
+            _, x, y, r, width, color = item
+            parts.append(f'<circle cx="{x:.2f}" cy="{y:.2f}" r="{r:.2f}" fill="none" '
+                         f'stroke="{color}" stroke-width="{width:.2f}"/>')
+        elif kind == 'polygon':
+            _, points, color = item
+            parts.append(f'<polygon points="{points_attr(points)}" fill="{color}"/>')
+        elif kind == 'gradient_polygon':
+            _, points, start, end = item
+            gradients += 1
+            gradient_id = f'{id_prefix}{gradients}'
+            parts.append(f'<defs><linearGradient id="{gradient_id}" x1="0" y1="0" x2="0" y2="1">'
+                         f'<stop offset="0" stop-color="{start}"/><stop offset="1" stop-color="{end}"/>'
+                         f'</linearGradient></defs>')
+            parts.append(f'<polygon points="{points_attr(points)}" fill="url(#{gradient_id})"/>')
+        elif kind == 'text':
+            _, text, x, y, height, color, family = item
+            text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            parts.append(f'<text x="{x:.2f}" y="{y:.2f}" font-family="{family}" font-weight="bold" '
+                         f'font-size="{height:.2f}" fill="{color}" text-anchor="middle" '
+                         f'dominant-baseline="central">{text}</text>')
+
+    return parts
+
+class Raster:
+    """RGBA canvas with scanline fills, at SUPERSAMPLE x the output size"""
+
+    def __init__(self, size):
+        self.size = size
+        self.scale = SUPERSAMPLE
+        self.width = size * self.scale
+        self.rows = [bytearray(self.width * 4) for _ in range(self.width)]
+
+    def fill_span(self, y, x0, x1, rgba):
+        """Fill pixels [x0, x1) on row y"""
+        x0 = max(0, x0)
+        x1 = min(self.width, x1)
+        if x1 > x0:
+            self.rows[y][x0 * 4:x1 * 4] = rgba * (x1 - x0)
+
+    def fill_circle(self, cx, cy, radius, color, inner_radius=0.0):
+        """Fill a disc, or an annulus when inner_radius is set"""
+        s = self.scale
+        cx, cy, radius, inner_radius = cx * s, cy * s, radius * s, inner_radius * s
+        rgba = bytes(parse_color(color)) + b'\xff'
+        for y in range(max(0, int(cy - radius)), min(self.width, int(cy + radius) + 1)):
+            dy = y + 0.5 - cy
+            if abs(dy) > radius:
+                continue
+            half = math.sqrt(radius * radius - dy * dy)
+            if abs(dy) < inner_radius:
+                inner = math.sqrt(inner_radius * inner_radius - dy * dy)
+                self.fill_span(y, round(cx - half), round(cx - inner), rgba)
+                self.fill_span(y, round(cx + inner), round(cx + half), rgba)
+            else:
+                self.fill_span(y, round(cx - half), round(cx + half), rgba)
+
+    def fill_polygon(self, points, color, end_color=None):
+        """Even-odd scanline fill; with end_color, a top-to-bottom gradient"""
+        s = self.scale
+        points = [(x * s, y * s) for x, y in points]
+        start = parse_color(color)
+        end = parse_color(end_color) if end_color else start
+        top = max(0, int(min(y for _, y in points)))
+        bottom = min(self.width - 1, int(max(y for _, y in points)) + 1)
+        span = max(1, bottom - top)
+        edges = list(zip(points, points[1:] + points[:1]))
+
+        for y in range(top, bottom + 1):
+            sample_y = y + 0.5
+            crossings = []
+            for (x0, y0), (x1, y1) in edges:
+                if (y0 <= sample_y < y1) or (y1 <= sample_y < y0):
+                    crossings.append(x0 + (sample_y - y0) * (x1 - x0) / (y1 - y0))
+            if not crossings:
+                continue
+            t = (y - top) / span
+            rgba = bytes(round(a + (b - a) * t) for a, b in zip(start, end)) + b'\xff'
+            crossings.sort()
+            for left, right in zip(crossings[0::2], crossings[1::2]):
+                self.fill_span(y, round(left), round(right), rgba)
+
+    def draw_text(self, text, cx, cy, height, color):
+        """Centered text in the 5x7 bitmap font, scaled to `height`"""
+        s = self.scale
+        pixel = max(1, round(height * s / 7))
+        advance = 6 * pixel
+        x = round(cx * s - (len(text) * advance - pixel) / 2)
+        y = round(cy * s - 3.5 * pixel)
+        rgba = bytes(parse_color(color)) + b'\xff'
+        for char in text:
+            glyph = FONT.get(char.upper(), FONT[' '])
+            for row, bits in enumerate(glyph):
+                for col, bit in enumerate(bits):
+                    if bit == '1':
+                        for py in range(y + row * pixel, y + (row + 1) * pixel):
+                            if 0 <= py < self.width:
+                                self.fill_span(py, x + col * pixel, x + (col + 1) * pixel, rgba)
+            x += advance
+
+    def downsample(self):
+        """Average SUPERSAMPLE x SUPERSAMPLE blocks into output-size RGBA rows"""
+        s = self.scale
+        if s == 1:
+            return [bytes(row) for row in self.rows]
+
+        count = s * s
+        out = []
+        for y in range(self.size):
+            block = self.rows[y * s:(y + 1) * s]
+            row = bytearray(self.size * 4)
+            for x in range(self.size):
+                r = g = b = a = 0
+                for source in block:
+                    for i in range(x * s * 4, (x + 1) * s * 4, 4):
+                        alpha = source[i + 3]
+                        if alpha:
+                            r += source[i]
+                            g += source[i + 1]
+                            b += source[i + 2]
+                            a += alpha
+                if a:
+                    # Fills are opaque, so average color over the covered samples only
+                    covered = a // 255
+                    row[x * 4:x * 4 + 4] = bytes((r // covered, g // covered, b // covered,
+                                                  a // count))
+            out.append(bytes(row))
+        return out
+
+def encode_png(rows, width, height):
+    """Encode RGBA rows as a PNG file"""
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    raw = b''.join(b'\x00' + row for row in rows)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) +
+            chunk(b'IDAT', zlib.compress(raw, 9)) + chunk(b'IEND', b''))
+
+def render_png(scene, size):
+    """Rasterize a scene to PNG bytes"""
+    return encode_png(rasterize(scene, size), size, size)
+
+def rasterize(scene, size):
+    """Rasterize a scene to output-size RGBA rows"""
+    raster = Raster(size)
+    for item in scene:
+        kind = item[0]
+        if kind == 'circle':
+            _, x, y, r, color = item
+            raster.fill_circle(x, y, r, color)
+        elif kind == 'ring':
+            _, x, y, r, width, color = item
+            raster.fill_circle(x, y, r + width / 2, color, inner_radius=r - width / 2)
+        elif kind == 'polygon':
+            _, points, color = item
+            raster.fill_polygon(points, color)
+        elif kind == 'gradient_polygon':
+            _, points, start, end = item
+            raster.fill_polygon(points, start, end)
+        elif kind == 'text':
+            _, text, x, y, height, color, _ = item
+            raster.draw_text(text, x, y, height, color)
+    return raster.downsample()
+
+def max_size(fmt):
+    """Largest size a format is rendered at"""
+    return MAX_PNG_SIZE if fmt == 'png' else MAX_SIZE
+
+def render(spec, fmt):
+    """Render a concept spec to SVG or PNG bytes"""
+    scene = build_scene(spec)
+    if fmt == 'svg':
+        return render_svg(scene, spec['size'])
+    return render_png(scene, spec['size'])
+
+def placeholder_scene(primary, accent, initial, size):
+    """Flat primary square with the initial in the accent color"""
+    square = [(0, 0), (size, 0), (size, size), (0, size)]
+    height = size * (0.5 if len(initial) == 1 else 0.7 / len(initial))
+    return [('polygon', square, primary),
+            ('text', initial, size / 2, size / 2, height, accent, 'sans-serif')]
+
+def render_placeholder(primary, accent, initial, fmt, size=PLACEHOLDER_SIZE):
+    """Placeholder logo bytes for teams without a real logo"""
+    scene = placeholder_scene(primary, accent, initial, size)
+    if fmt == 'svg':
+        return render_svg(scene, size)
+    return render_png(scene, size)
+
+def atlas_layout(count, tile_size):
+    """Grid for `count` tiles: (columns, width, height, [(x, y) per tile])"""
+    columns = max(1, math.ceil(math.sqrt(count)))
+    rows = max(1, math.ceil(count / columns))
+    offsets = [((i % columns) * tile_size, (i // columns) * tile_size) for i in range(count)]
+    return columns, columns * tile_size, rows * tile_size, offsets
+
+def render_atlas(specs, tile_size, fmt):
+    """Render every spec into one sprite sheet; returns (bytes, layout)"""
+    layout = atlas_layout(len(specs), tile_size)
+    _, width, height, offsets = layout
+
+    if fmt == 'svg':
+        parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                 f'viewBox="0 0 {width} {height}">']
+        for i, (spec, (x, y)) in enumerate(zip(specs, offsets)):
+            parts.append(f'<svg x="{x}" y="{y}" width="{tile_size}" height="{tile_size}">')
+            parts.extend(svg_elements(build_scene(spec), id_prefix=f't{i}g'))
+            parts.append('</svg>')
+        parts.append('</svg>')
+        return '\n'.join(parts).encode(), layout
+
+    canvas = [bytearray(width * 4) for _ in range(height)]
+    for spec, (x, y) in zip(specs, offsets):
+        for row_index, row in enumerate(rasterize(build_scene(spec), tile_size)):
+            canvas[y + row_index][x * 4:(x + tile_size) * 4] = row
+    return encode_png(canvas, width, height), layout
+
+def cache_key(spec, fmt):
+    """Content address for a render: hash of every input that affects the output"""
+    payload = json.dumps([RENDERER_VERSION, fmt, spec], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class RenderCache:
+    """Rendered files on disk, evicted least-recently-used past a byte budget"""
+
+    def __init__(self, directory='.render_cache', max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = None
+        self._total = 0
+
+    def _load_index(self):
+        """Rebuild the LRU index from files already on disk, oldest access first"""
+        entries = []
+        if os.path.isdir(self.directory):
+            for root, dirs, files in os.walk(self.directory):
+                # Atlases manage their own files
+                if ATLAS_SUBDIR in dirs:
+                    dirs.remove(ATLAS_SUBDIR)
+                for name in files:
+                    if name.endswith('.tmp'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, name, path, stat.st_size))
+        entries.sort()
+        self._entries = OrderedDict((name, (path, size)) for _, name, path, size in entries)
+        self._total = sum(size for _, _, _, size in entries)
+
+    def path_for(self, key, fmt):
+        """Where a key's file lives"""
+        return os.path.join(self.directory, key[:2], f"{key}.{fmt}")
+
+    def get(self, key, fmt):
+        """Cached bytes for a key, or None"""
+        name = f"{key}.{fmt}"
+        with self._lock:
+            if self._entries is None:
+                self._load_index()
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            self._entries.move_to_end(name)
+
+        try:
+            with open(entry[0], 'rb') as f:
+                data = f.read()
+            # mtime doubles as last-access time so recency survives restarts
+            os.utime(entry[0])
+        except OSError:
+            # Evicted by another process sharing the directory
+            with self._lock:
+                if self._entries.pop(name, None):
+                    self._total -= entry[1]
+            return None
+        return data
+
+    def put(self, key, fmt, data):
+        """Write a render atomically and evict old ones past the budget"""
+        path = self.path_for(key, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        name = f"{key}.{fmt}"
+        with self._lock:
+            if self._entries is None:
+                self._load_index()
+            previous = self._entries.pop(name, None)
+            if previous:
+                self._total -= previous[1]
+            self._entries[name] = (path, len(data))
+            self._total += len(data)
+
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                _, (old_path, old_size) = self._entries.popitem(last=False)
+                self._total -= old_size
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        """Entry count and bytes used"""
+        with self._lock:
+            if self._entries is None:
+                self._load_index()
+            return {'entries': len(self._entries), 'bytes': self._total,
+                    'max_bytes': self.max_bytes}
+
+class AtlasStore:
+    """Sprite sheets built once per dataset version, kept on disk and memory-mapped
+
+    Responses are memoryviews over the mapping, so serving an atlas never copies
+    it into Python memory; worker processes sharing the directory share the file.
+    """
+
+    def __init__(self, directory=os.path.join('.render_cache', ATLAS_SUBDIR)):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._maps = {}
+        # Key -> lock held while that atlas is opened or built
+        self._building = {}
+
+    def path_for(self, version, style, size, fmt):
+        """Where an atlas lives; the name changes whenever its inputs can"""
+        return os.path.join(self.directory,
+                            f"atlas-r{RENDERER_VERSION}-{version}-{style}-{size}.{fmt}")
+
+    def get(self, version, style, size, fmt, build):
+        """Memoryview of an atlas, calling `build()` for its bytes the first time"""
+        key = (version, style, size, fmt)
+        with self._lock:
+            view = self._maps.get(key)
+            if view is not None:
+                return view
+            building = self._building.setdefault(key, threading.Lock())
+
+        # Built outside the store lock so atlases already mapped are served
+        # meanwhile; concurrent requests for this one wait for a single build
+        with building:
+            with self._lock:
+                view = self._maps.get(key)
+            if view is not None:
+                return view
+            try:
+                view = self._open_or_build(self.path_for(*key), build)
+                with self._lock:
+                    # Mappings still being sent stay alive through their memoryviews
+                    self._maps = {k: v for k, v in self._maps.items() if k[0] == version}
+                    self._maps[key] = view
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+        self._remove_stale(version)
+        return view
+
+    def _open_or_build(self, path, build):
+        """Map an existing atlas file, writing it atomically first if needed"""
+        if not os.path.exists(path):
+            data = build()
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        with open(path, 'rb') as f:
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _remove_stale(self, version):
+        """Delete atlases built for other dataset versions or renderer versions"""
+        current = f"atlas-r{RENDERER_VERSION}-{version}-"
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            stale = name.startswith('atlas-') and not name.startswith(current)
+            if stale and not name.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
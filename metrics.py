@@ -0,0 +1,203 @@
+"""
+Request metrics and access logging
+Counters, an in-flight gauge and latency histograms rendered in the
+Prometheus text format, and a JSON-lines access log written from a
+background thread so request handlers never wait on the disk.
+"""
+
+import bisect
+import json
+import os
+import queue
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+
+# Upper bounds in seconds; the implicit last bucket is +Inf
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Query parameters whose values are secrets and stay out of the access log
+SECRET_PARAMS = re.compile(r'([?&]profile=)[^&]*')
+
+def escape_label(value):
+    """Escape a label value for the text exposition format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def with_labels(text, labels):
+    """Add constant labels to every sample of an encoded text exposition"""
+    if not labels:
+        return text
+    extra = ','.join(f'{name}="{escape_label(value)}"' for name, value in labels.items())
+    lines = []
+    for line in text.decode().split('\n'):
+        if line and not line.startswith('#'):
+            name_end = min(i for i in (line.find('{'), line.find(' ')) if i >= 0)
+            if line[name_end] == '{':
+                line = f'{line[:name_end + 1]}{extra},{line[name_end + 1:]}'
+            else:
+                line = f'{line[:name_end]}{{{extra}}}{line[name_end:]}'
+        lines.append(line)
+    return '\n'.join(lines).encode()
+
+class Metrics:
+    """Process-wide request counters and latency histograms
+
+    Recording a request is a bisect and a few integer updates under one
+    uncontended lock; all formatting is deferred to render().
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # (action, status) -> [count, seconds, bytes, per-bucket counts...]
+        self._series = {}
+        self._errors = {}
+        self.in_flight = 0
+        # Labels added to every series of this process's /metrics, e.g. the
+        # prefork worker, since each worker only counts its own requests
+        self.labels = {}
+
+    def started(self):
+        """A request began"""
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, action, status, size, seconds):
+        """A request finished with `status` after sending `size` body bytes"""
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        key = (action, status)
+        with self._lock:
+            self.in_flight -= 1
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0, 0.0, 0] + [0] * (len(self.buckets) + 1)
+            series[0] += 1
+            series[1] += seconds
+            series[2] += size
+            series[3 + bucket] += 1
+
+    def count_error(self, action):
+        """An API action answered with an error response"""
+        with self._lock:
+            self._errors[action] = self._errors.get(action, 0) + 1
+
+    def render(self):
+        """Everything collected so far, in Prometheus text format"""
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+            errors = dict(self._errors)
+            in_flight = self.in_flight
+
+        lines = [
+            '# HELP nfl_http_requests_total Requests served, by action and status.',
+            '# TYPE nfl_http_requests_total counter',
+        ]
+        for (action, status), values in sorted(series.items()):
+            lines.append(f'nfl_http_requests_total{{action="{escape_label(action)}",'
+                         f'status="{status}"}} {values[0]}')
+
+        lines += [
+            '# HELP nfl_http_response_bytes_total Response body bytes sent, by action and status.',
+            '# TYPE nfl_http_response_bytes_total counter',
+        ]
+        for (action, status), values in sorted(series.items()):
+            lines.append(f'nfl_http_response_bytes_total{{action="{escape_label(action)}",'
+                         f'status="{status}"}} {values[2]}')
+
+        lines += [
+            '# HELP nfl_api_errors_total API error responses, by action.',
+            '# TYPE nfl_api_errors_total counter',
+        ]
+        for action, count in sorted(errors.items()):
+            lines.append(f'nfl_api_errors_total{{action="{escape_label(action)}"}} {count}')
+
+        lines += [
+            '# HELP nfl_http_requests_in_flight Requests currently being handled.',
+            '# TYPE nfl_http_requests_in_flight gauge',
+            f'nfl_http_requests_in_flight {in_flight}',
+            '# HELP nfl_http_request_duration_seconds Request latency, by action and status.',
+            '# TYPE nfl_http_request_duration_seconds histogram',
+        ]
+        for (action, status), values in sorted(series.items()):
+            labels = f'action="{escape_label(action)}",status="{status}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values[3:]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'nfl_http_request_duration_seconds_bucket{{{labels},le="{le}"}} '
+                             f'{cumulative}')
+            lines.append(f'nfl_http_request_duration_seconds_sum{{{labels}}} {values[1]:.6f}')
+            lines.append(f'nfl_http_request_duration_seconds_count{{{labels}}} {values[0]}')
+
+        return ('\n'.join(lines) + '\n').encode()
+
+class AccessLog:
+    """JSON-lines access log; callers enqueue records and a daemon thread writes them
+
+    A full queue drops the record (counted in `dropped`) rather than stall a request.
+    """
+
+    def __init__(self, path=None, max_pending=10000):
+        self.path = path
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        """Whether a destination is configured"""
+        return bool(self.path)
+
+    def log_request(self, client, method, target, action, status, size, seconds,
+                    user_agent=None):
+        """Queue the record for one finished request"""
+        self.log({
+            'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'client': client,
+            'method': method,
+            'path': SECRET_PARAMS.sub(r'\1redacted', target) if 'profile=' in target else target,
+            'action': action,
+            'status': status,
+            'bytes': size,
+            'duration_ms': round(seconds * 1000, 3),
+            'user_agent': user_agent,
+        })
+
+    def log(self, record):
+        """Queue one record for writing"""
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        """Start the writer thread (again, after a fork: threads don't survive it)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.max_pending)
+            threading.Thread(target=self._write_forever, args=(self._queue,),
+                             name='access-log', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _write_forever(self, pending):
+        """Write queued records as they arrive"""
+        if self.path == '-':
+            stream = sys.stdout
+        else:
+            # Line-buffered appends keep each line intact when prefork workers share the file
+            stream = open(self.path, 'a', encoding='utf-8', buffering=1)
+        while True:
+            record = pending.get()
+            try:
+                stream.write(json.dumps(record, separators=(',', ':')) + '\n')
+            except (OSError, ValueError) as e:
+                print(f"Error writing access log: {e}")
@@ -0,0 +1,109 @@
+"""
+Opt-in request profiling
+Wraps sampled API requests in cProfile and tracemalloc and writes one
+pstats file plus a top-allocations report per profiled request. Only one
+request is profiled at a time; the rest run untouched.
+"""
+
+import contextlib
+import cProfile
+import hmac
+import os
+import random
+import threading
+import time
+import tracemalloc
+
+# Environment variables behind the server's --profile-* defaults
+ENV_DIR = 'NFL_PROFILE_DIR'
+ENV_RATE = 'NFL_PROFILE_RATE'
+ENV_TOKEN = 'NFL_PROFILE_TOKEN'
+
+class RequestProfiler:
+    """Sampled per-request CPU and allocation profiles
+
+    `sample_rate` is the fraction of requests profiled automatically. When
+    `admin_token` is set, a request carrying `profile=<token>` is profiled
+    regardless of the rate.
+    """
+
+    def __init__(self, directory='profiles', sample_rate=0.0, admin_token=None,
+                 top_allocations=25, frames=10):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.top_allocations = top_allocations
+        self.frames = frames
+        self.written = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def wanted(self, token=''):
+        """Whether this request should be profiled"""
+        if token and self.admin_token and hmac.compare_digest(token, self.admin_token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextlib.contextmanager
+    def profile(self, label, token=''):
+        """Profile the enclosed request if it's sampled and no other profile is running"""
+        if not self.wanted(token):
+            yield
+            return
+        # cProfile and tracemalloc are process-wide resources; never nest them
+        if not self._lock.acquire(blocking=False):
+            self.skipped += 1
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            tracemalloc.start(self.frames)
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler (e.g. a debugger) already owns the hook
+                tracemalloc.stop()
+                self.skipped += 1
+                yield
+                return
+
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - started
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.write(label, profiler, snapshot, elapsed, peak)
+        finally:
+            self._lock.release()
+
+    def write(self, label, profiler, snapshot, elapsed, peak):
+        """Save <label>-<time>-<pid>.pstats and the matching .alloc.txt report"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            stem = os.path.join(self.directory,
+                                f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-"
+                                f"{int(time.time() * 1000) % 1000:03d}-{os.getpid()}")
+            profiler.dump_stats(f"{stem}.pstats")
+
+            snapshot = snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            lines = [f"action: {label}",
+                     f"elapsed: {elapsed * 1000:.3f} ms",
+                     f"peak traced memory: {peak / 1024:.1f} KiB",
+                     "note: allocations from other threads running at the same time are included",
+                     "",
+                     f"top {self.top_allocations} allocation sites:"]
+            for stat in snapshot.statistics('lineno')[:self.top_allocations]:
+                lines.append(f"  {stat}")
+            with open(f"{stem}.alloc.txt", 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+            self.written += 1
+        except OSError as e:
+            print(f"Error writing profile: {e}")
@@ -60,6 +60,9 @@ class NFLLogoDashboard {
             this.setupEventListeners();
             this.populateFilters();
             this.renderTeams();
+            if (this.liveUpdates) {
+                this.subscribeToUpdates();
+            }
         } catch (error) {
             console.error('Error initializing dashboard:', error);
         }
@@ -76,6 +79,8 @@ class NFLLogoDashboard {
                 if (response.ok) {
                     data = await response.json();
                     this.teams = data.success ? data.data.teams : data.teams || data;
+                    // Only the Python server pushes data changes
+                    this.liveUpdates = true;
                 } else {
                     throw new Error('Python API not available');
                 }
@@ -105,6 +110,57 @@ class NFLLogoDashboard {
         }
     }
 
+    subscribeToUpdates() {
+        if (!window.EventSource || this.updates) {
+            return;
+        }
+        // EventSource reconnects by itself, resuming from the last event it saw
+        this.updates = new EventSource('/events');
+        // Changes to other leagues name them; the dashboard shows the default one
+        this.updates.addEventListener('teams', (e) => {
+            const data = JSON.parse(e.data);
+            if (!data.league) {
+                this.refreshTeams(data.ids);
+            }
+        });
+        this.updates.addEventListener('reload', async (e) => {
+            if (e.data && JSON.parse(e.data).league) {
+                return;
+            }
+            await this.loadTeams();
+            this.populateFilters();
+            this.applyFilters();
+        });
+    }
+
+    async refreshTeams(ids) {
+        try {
+            if (ids.length > 100) {
+                await this.loadTeams();
+            } else {
+                const response = await fetch(`/api?action=getTeam&ids=${ids.join(',')}`);
+                const data = await response.json();
+                if (!data.success) {
+                    throw new Error(data.error);
+                }
+                const updated = new Map(data.data.teams.map(team => [team.id, team]));
+                // Missing ids were removed from the data
+                this.teams = this.teams
+                    .filter(team => !ids.includes(team.id) || updated.has(team.id))
+                    .map(team => updated.get(team.id) || team);
+                const known = new Set(this.teams.map(team => team.id));
+                this.teams.push(...data.data.teams.filter(team => !known.has(team.id)));
+                if (this.selectedTeam && updated.has(this.selectedTeam.id)) {
+                    this.selectedTeam = updated.get(this.selectedTeam.id);
+                }
+            }
+            this.populateFilters();
+            this.applyFilters();
+        } catch (error) {
+            console.error('Error refreshing teams:', error);
+        }
+    }
+
     getFallbackTeams() {
         return [
             {
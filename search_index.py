@@ -0,0 +1,141 @@
+"""
+Team search index
+Prefix and typo-tolerant lookups over team names, cities and mascots,
+built once per dataset. Distinct words are kept in a sorted table for
+prefix matches and indexed by trigram for fuzzy ones; both lead to the
+rows of the teams containing the word.
+"""
+
+import bisect
+import heapq
+import re
+from array import array
+
+SEARCH_FIELDS = ('name', 'city', 'mascot')
+
+WORD = re.compile(r'[^\W_]+')
+
+# How well one query word matched one indexed word; a team's score is the
+# sum over the query words, and every query word has to match
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.9
+FUZZY_SCORE = 0.7
+
+# Trigram (Dice) similarity a misspelt word needs, and the shortest query
+# word that is looked up fuzzily at all
+MIN_SIMILARITY = 0.4
+MIN_FUZZY_LENGTH = 3
+
+def words(text):
+    """Lowercased alphanumeric words of a string"""
+    return WORD.findall(text.lower())
+
+def trigrams(word):
+    """Distinct trigrams of a word, padded so its start weighs more than its end"""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """Words of SEARCH_FIELDS for every team, looked up by prefix and by trigram"""
+
+    def __init__(self, teams):
+        rows_by_word = {}
+        for row, team in enumerate(teams):
+            for field in SEARCH_FIELDS:
+                value = team.get(field)
+                if not isinstance(value, str):
+                    continue
+                for word in words(value):
+                    rows = rows_by_word.get(word)
+                    if rows is None:
+                        rows_by_word[word] = array('L', (row,))
+                    elif rows[-1] != row:
+                        rows.append(row)
+
+        self.words = sorted(rows_by_word)
+        self.postings = [rows_by_word[word] for word in self.words]
+        self.trigram_counts = array('H')
+        self.by_trigram = {}
+        for index, word in enumerate(self.words):
+            grams = trigrams(word)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                entries = self.by_trigram.get(gram)
+                if entries is None:
+                    entries = self.by_trigram[gram] = array('L')
+                entries.append(index)
+
+    @classmethod
+    def from_columns(cls, words, postings, trigram_counts, by_trigram):
+        """Index over already built tables, e.g. ones mapped from a snapshot"""
+        index = cls.__new__(cls)
+        index.words = words
+        index.postings = postings
+        index.trigram_counts = trigram_counts
+        index.by_trigram = by_trigram
+        return index
+
+    def search(self, query, limit=10):
+        """Best `limit` (row, score) pairs for rows matching every query word, and the match count"""
+        scores = None
+        for word in dict.fromkeys(words(query)):
+            matches = self.match_word(word)
+            if scores is None:
+                scores = matches
+            else:
+                if len(matches) < len(scores):
+                    scores, matches = matches, scores
+                scores = {row: score + matches[row] for row, score in scores.items()
+                          if row in matches}
+            if not scores:
+                return [], 0
+
+        if scores is None:
+            return [], 0
+        best = heapq.nlargest(limit, scores, key=scores.__getitem__)
+        return [(row, scores[row]) for row in best], len(scores)
+
+    def match_word(self, word):
+        """Rows containing a word, its completions or a close misspelling, with the best score"""
+        word_scores = {}
+        start = bisect.bisect_left(self.words, word)
+        for index in range(start, len(self.words)):
+            candidate = self.words[index]
+            if not candidate.startswith(word):
+                break
+            if len(candidate) == len(word):
+                word_scores[index] = EXACT_SCORE
+            else:
+                # Prefer completions that are mostly typed out already
+                word_scores[index] = PREFIX_SCORE * (0.5 + 0.5 * len(word) / len(candidate))
+
+        if len(word) >= MIN_FUZZY_LENGTH:
+            for index, similarity in self.similar_words(word):
+                score = FUZZY_SCORE * similarity
+                if score > word_scores.get(index, 0):
+                    word_scores[index] = score
+
+        # Applying the best scores last leaves each row with its best one
+        rows = {}
+        for index in sorted(word_scores, key=word_scores.__getitem__):
+            rows.update(dict.fromkeys(self.postings[index], word_scores[index]))
+        return rows
+
+    def similar_words(self, word):
+        """(word index, similarity) for indexed words sharing enough trigrams with `word`"""
+        grams = trigrams(word)
+        shared = {}
+        for gram in grams:
+            for index in self.by_trigram.get(gram, ()):
+                shared[index] = shared.get(index, 0) + 1
+
+        # Dice coefficient can't reach the threshold below this many shared trigrams
+        total = len(grams)
+        minimum = MIN_SIMILARITY * total / (2 - MIN_SIMILARITY)
+        counts = self.trigram_counts
+        for index, count in shared.items():
+            if count < minimum:
+                continue
+            similarity = 2 * count / (total + counts[index])
+            if similarity >= MIN_SIMILARITY:
+                yield index, similarity
@@ -9,51 +9,638 @@ import http.server
 import socketserver
 import urllib.parse
 from datetime import datetime
+from collections import OrderedDict
 import os
 import re
+import sys
+import signal
+import argparse
+import hashlib
+import hmac
+import base64
+import threading
+import time
+import gzip
+import mimetypes
+import contextlib
+import functools
+import unicodedata
+from email.utils import formatdate, parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
 
-class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.nfl_data = self.load_nfl_data()
-        super().__init__(*args, **kwargs)
+import admission
+import bulk
+import events
+import leagues
+import logo_renderer
+import metrics
+import profiling
+import snapshot
+from color_table import ColorTable
+from design_rules import RULES_FILE, DesignRules, TeamDesign
+from logo_renderer import AtlasStore, RenderCache
+from search_index import SEARCH_FIELDS, SearchIndex
+from snapshot import SnapshotStore
+from team_table import COLOR_KEYS, FrozenDict, TeamIndex, TeamTable, freeze
+
+DATA_FILE = 'nfl_logos.json'
+
+class TeamDataset:
+    """Parsed team data plus lookup indexes for one version of the data file
+
+    With a `snapshot`, the columns, indexes and analyses are read in place
+    from the mapped file instead of being built from `data`.
+    """
     
-    def load_nfl_data(self):
-        """Load NFL team data from JSON file"""
+    def __init__(self, data, version, modified=None, rules=None, snapshot=None):
+        if rules is None:
+            rules = DesignRules.load()
+        if snapshot is not None:
+            data = snapshot.header['data']
+        # Teams live in columns; everything else in the file stays a plain frozen value
+        self.teams = snapshot.team_table() if snapshot else TeamTable(data.get('teams', ()))
+        self.data = FrozenDict((key, self.teams if key == 'teams' else freeze(value))
+                               for key, value in data.items())
+        self.version = version
+        self.modified = modified
+        self.snapshot = snapshot
+        # Derived per-team values, filled lazily per (name, team id)
+        self.derived = {}
+        # Pre-serialized team JSON, filled lazily per (kind, team id)
+        self.fragments = {}
+        self.by_id = TeamIndex(self.teams)
+        
+        if snapshot is not None:
+            self.by_conference = snapshot.groups('by_conference', self.teams)
+            self.by_division = snapshot.groups('by_division', self.teams)
+            self.by_conference_division = snapshot.groups('by_conference_division', self.teams)
+            self.search = snapshot.search_index()
+            self.design = snapshot.team_design(rules, self.teams)
+            self.colors = snapshot.color_table()
+            return
+        
+        # Indexes are row lists built by scanning the category code columns
+        self.by_conference = self.teams.group_rows('conference')
+        self.by_division = self.teams.group_rows('division')
+        self.by_conference_division = self.teams.group_rows('conference', 'division')
+        # Prefix and trigram lookups over name, city and mascot
+        self.search = SearchIndex(self.teams)
+        # Mascot shape, motif and regional influence of every team
+        self.design = TeamDesign(rules, self.teams)
+        # League-wide color classifications and distances
+        self.colors = ColorTable(self.teams)
+    
+    def prepared_response(self, key):
+        """(body, etag) encoded into the snapshot ahead of time, or None"""
+        return self.snapshot.response(key) if self.snapshot is not None else None
+    
+    def updated(self, teams_by_row, version, modified):
+        """The next version with some teams replaced, rebuilding only what those teams touch
+
+        Team ids must stay the same. Per-team caches of every other team carry over.
+        """
+        previous = self.teams
+        table = previous.with_rows(teams_by_row)
+        rows = sorted(teams_by_row)
+        changed_ids = {previous.value(row, 'id') for row in rows}
+        
+        dataset = TeamDataset.__new__(TeamDataset)
+        dataset.teams = table
+        dataset.data = FrozenDict((key, table if key == 'teams' else value)
+                                  for key, value in self.data.items())
+        dataset.version = version
+        dataset.modified = modified
+        # Responses prepared in a snapshot describe the old teams
+        dataset.snapshot = None
+        # copy() is atomic, so requests still filling these on the old version can't break it
+        dataset.derived = self.derived.copy()
+        dataset.fragments = self.fragments.copy()
+        for cache in (dataset.derived, dataset.fragments):
+            for key in [key for key in cache if key[1] in changed_ids]:
+                del cache[key]
+        dataset.by_id = TeamIndex(table)
+        dataset.by_conference = table.regroup(self.by_conference, previous, rows, 'conference')
+        dataset.by_division = table.regroup(self.by_division, previous, rows, 'division')
+        dataset.by_conference_division = table.regroup(self.by_conference_division, previous,
+                                                       rows, 'conference', 'division')
+        # Word positions are shared across the whole index, so only text edits rebuild it
+        retyped = any(previous[row].get(field) != table[row].get(field)
+                      for row in rows for field in SEARCH_FIELDS)
+        dataset.search = SearchIndex(table) if retyped else self.search
+        dataset.design = self.design.with_rows(table, rows)
+        dataset.colors = self.colors.with_rows(previous, table, rows)
+        return dataset
+
+class JSONFragment:
+    """A value serialized once and spliced into responses without re-encoding"""
+    __slots__ = ('pretty', 'compact', '_indented')
+    
+    def __init__(self, value):
+        self.pretty = json.dumps(value, indent=2)
+        self.compact = json.dumps(value, separators=(',', ':')).encode()
+        self._indented = {}
+    
+    def indented(self, indent):
+        """Pretty bytes with continuation lines shifted right by `indent` spaces"""
+        text = self._indented.get(indent)
+        if text is None:
+            # Encoded JSON strings can't hold raw newlines, so every '\n' is a line break
+            text = self.pretty.replace('\n', '\n' + ' ' * indent).encode()
+            self._indented[indent] = text
+        return text
+
+def fragment_value(obj):
+    """`default` for json.dumps that decodes JSONFragments back into plain values"""
+    if isinstance(obj, JSONFragment):
+        return json.loads(obj.compact)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def encode_json(value, compact=False):
+    """Encode a response, splicing in JSONFragment bytes instead of re-encoding them
+
+    Fragments are stood in for by a marker with a random part made for this
+    call, so strings from a request can't forge one.
+    """
+    fragments = []
+    marker = None
+    
+    def placeholder(obj):
+        nonlocal marker
+        if isinstance(obj, JSONFragment):
+            if marker is None:
+                marker = f'\x00fragment-{os.urandom(8).hex()}-'
+            fragments.append(obj)
+            return f"{marker}{len(fragments) - 1}"
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    
+    if compact:
+        skeleton = json.dumps(value, separators=(',', ':'), default=placeholder)
+    else:
+        skeleton = json.dumps(value, indent=2, default=placeholder)
+    if not fragments:
+        return skeleton.encode()
+    
+    chunks = skeleton.split(json.dumps(marker)[:-1])
+    if len(chunks) != len(fragments) + 1:
+        # Only possible if response data happened to hold the marker: encode it all
+        if compact:
+            return json.dumps(value, separators=(',', ':'), default=fragment_value).encode()
+        return json.dumps(value, indent=2, default=fragment_value).encode()
+    pieces = [chunks[0].encode()]
+    previous = chunks[0]
+    for chunk in chunks[1:]:
+        index, _, rest = chunk.partition('"')
+        fragment = fragments[int(index)]
+        if compact:
+            pieces.append(fragment.compact)
+        else:
+            # Continuation lines take the indent of the line the value starts on
+            line = previous[previous.rfind('\n') + 1:]
+            pieces.append(fragment.indented(len(line) - len(line.lstrip(' '))))
+        pieces.append(rest.encode())
+        previous = rest
+    return b''.join(pieces)
+
+class TeamStore:
+    """Process-wide team dataset, reloaded when the data or design rules file changes"""
+    
+    def __init__(self, path=DATA_FILE, check_interval=1.0, rules_path=RULES_FILE,
+                 snapshots=None, league=None):
+        self.path = path
+        self.rules_path = rules_path
+        self.check_interval = check_interval
+        # SnapshotStore to map prepared datasets from, or None to build each one in memory
+        self.snapshots = snapshots
+        # Registered league served from this store, or None for the default one
+        self.league = league
+        # AtlasStore of this league's sprite sheets; None uses the shared one
+        self.atlases = None
+        # Bearer token POST action=updateTeams must carry; None disables updates
+        self.update_token = None
+        # Run due reload checks on their own thread, serving the loaded dataset
+        # meanwhile (the asyncio server can't afford a rebuild on its loop)
+        self.background_reload = False
+        self._lock = threading.Lock()
+        self._dataset = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._checking = False
+    
+    def current(self):
+        """Get the current dataset, reloading it if the file has changed"""
+        dataset = self._dataset
+        if dataset is not None and time.monotonic() < self._next_check:
+            return dataset
+        if dataset is not None and self.background_reload:
+            self._check_in_background()
+            return dataset
+        
+        with self._lock:
+            now = time.monotonic()
+            if self._dataset is None or now >= self._next_check:
+                self._next_check = now + self.check_interval
+                self._reload_if_changed()
+            return self._dataset
+    
+    def _check_in_background(self):
+        """Start a reload check on a daemon thread unless one is already running"""
+        if self._checking:
+            return
+        self._checking = True
+        threading.Thread(target=self._background_check, name='team-store-reload',
+                         daemon=True).start()
+    
+    def _background_check(self):
+        """Reload check run by `_check_in_background`"""
+        try:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._next_check:
+                    self._next_check = now + self.check_interval
+                    self._reload_if_changed()
+        finally:
+            self._checking = False
+    
+    def _reload_if_changed(self):
+        """Swap in a freshly indexed dataset if either file's mtime moved"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            if self._dataset is None:
+                print(f"Error loading NFL data: {e}")
+                self._dataset = TeamDataset({"teams": []}, 'empty', rules=DesignRules({}))
+            return
+        
+        try:
+            rules_mtime = os.stat(self.rules_path).st_mtime_ns
+        except OSError:
+            # The teams are still served, classified without rules
+            rules_mtime = None
+        if self._dataset is not None and (mtime, rules_mtime) == self._mtime:
+            return
+        
         try:
-            with open('nfl_logos.json', 'r') as f:
-                return json.load(f)
+            dataset = self.load_nfl_data(mtime)
         except Exception as e:
+            # Keep serving the previous version (e.g. file caught mid-write)
             print(f"Error loading NFL data: {e}")
-            return {"teams": []}
+            if self._dataset is None:
+                self._dataset = TeamDataset({"teams": []}, 'empty', rules=DesignRules({}))
+            return
+        
+        previous = self._dataset
+        rules_changed = self._mtime is not None and self._mtime[1] != rules_mtime
+        self._dataset = dataset
+        self._mtime = (mtime, rules_mtime)
+        if previous is not None and previous.version != dataset.version:
+            # Every design analysis may differ under new rules
+            self.announce(previous, dataset, None if rules_changed
+                          else dataset.teams.changed_rows(previous.teams))
     
-    def do_GET(self):
-        """Handle GET requests"""
-        parsed_path = urllib.parse.urlparse(self.path)
+    def announce(self, previous, dataset, rows):
+        """Tell /events subscribers which teams changed, or to reload everything if `rows` is None"""
+        if rows is not None and len(rows) <= MAX_EVENT_IDS:
+            ids = dict.fromkeys(team.get('id') for table in (previous.teams, dataset.teams)
+                                for team in (table[row] for row in rows))
+            ids.pop(None, None)
+            if ids:
+                event_hub.publish('teams', self.event_data(dataset, ids=list(ids)))
+            return
+        event_hub.publish('reload', self.event_data(dataset))
+    
+    def event_data(self, dataset, **data):
+        """Event payload, naming the league unless it's the default one dashboards show"""
+        data = {'version': dataset.version, **data}
+        if self.league:
+            data['league'] = self.league
+        return data
+    
+    def memory_size(self):
+        """Rough bytes the loaded dataset takes: its mapped snapshot, or a multiple of its file"""
+        dataset = self._dataset
+        if dataset is None or self._mtime is None:
+            return 0
+        if dataset.snapshot is not None:
+            return dataset.snapshot.size
+        try:
+            return os.path.getsize(self.path) * BUILT_MEMORY_FACTOR
+        except OSError:
+            return 0
+    
+    def update_teams(self, patches):
+        """Apply team patches to the live dataset, persist them and swap in the new version
+
+        Only the patched teams are re-encoded, reclassified and evicted from the
+        per-team caches, and the data file is replaced atomically. Returns the
+        new dataset and the updated ids; raises ValueError for a bad patch.
+        """
+        with self._lock:
+            # Patch what's on disk, not a version about to be replaced by a reload
+            self._reload_if_changed()
+            previous = self._dataset
+            if self._mtime is None:
+                raise ValueError('No team data is loaded')
+            teams = previous.teams
+            teams_by_row = {}
+            for patch in patches:
+                team_id = patch.get('id')
+                row = teams.row_for_id(team_id) if isinstance(team_id, (int, str)) else None
+                if row is None:
+                    raise ValueError(f'Team {team_id!r} not found')
+                teams_by_row[row] = patched_team(teams_by_row.get(row) or dict(teams[row]), patch)
+            
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+            rules_mtime, rules_raw = self.read_rules()
+            if data_version(raw, rules_raw, self.league) != previous.version:
+                raise ValueError('The team data changed while updating; try again')
+            raw = splice_teams(raw, {row: dict(teams[row]) for row in teams_by_row}, teams_by_row)
+            if raw is None:
+                raw = json.dumps({key: [teams_by_row.get(row) or dict(teams[row])
+                                        for row in teams.rows]
+                                  if key == 'teams' else value
+                                  for key, value in previous.data.items()}, indent=2).encode()
+            write_atomically(self.path, raw)
+            mtime = os.stat(self.path).st_mtime_ns
+            
+            dataset = previous.updated(teams_by_row, data_version(raw, rules_raw, self.league),
+                                       datetime.fromtimestamp(mtime / 1e9))
+            self._dataset = dataset
+            self._mtime = (mtime, rules_mtime)
+            rows = sorted(teams_by_row)
+            self.announce(previous, dataset, rows)
+        return dataset, [teams.value(row, 'id') for row in rows]
+    
+    def load_nfl_data(self, mtime=None):
+        """Load NFL team data from JSON file"""
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        rules_mtime, rules_raw = self.read_rules()
+        if rules_mtime is None:
+            print(f"Design rules {self.rules_path} can't be read; classifying teams without them")
         
-        # Handle API requests
-        if parsed_path.path == '/api.php' or parsed_path.path == '/api':
-            self.handle_api_request(parsed_path)
-        else:
-            # Serve static files
-            super().do_GET()
+        version = data_version(raw, rules_raw, self.league)
+        modified = datetime.fromtimestamp(mtime / 1e9) if mtime else None
+        rules = DesignRules(json.loads(rules_raw))
+        if self.snapshots is None:
+            return TeamDataset(json.loads(raw), version, modified, rules)
+        return self.load_snapshot(raw, version, modified, rules)
     
-    def handle_api_request(self, parsed_path):
-        """Handle API requests"""
-        query_params = urllib.parse.parse_qs(parsed_path.query)
-        action = query_params.get('action', [''])[0]
+    def read_rules(self):
+        """(mtime, bytes) of the rules file, or (None, b'{}') if it can't be read"""
+        try:
+            with open(self.rules_path, 'rb') as f:
+                return os.fstat(f.fileno()).st_mtime_ns, f.read()
+        except OSError:
+            return None, b'{}'
+    
+    def load_snapshot(self, raw, version, modified, rules):
+        """Map this version's snapshot, building it first if no process has yet"""
+        # Servers on other data files may share the directory: only their own versions are replaced
+        source = snapshot.source_key(self.path)
+        name = f'{source}-{version}-{snapshot_fingerprint()}'
+        settings = response_settings(modified)
         
+        def usable(prepared):
+            return prepared is not None and (settings is None or prepared.has_responses(settings))
+        
+        prepared = self.snapshots.open(name)
+        if not usable(prepared):
+            try:
+                with self.snapshots.locked():
+                    # Another process may have built it while this one waited for the lock
+                    prepared = self.snapshots.open(name)
+                    if not usable(prepared):
+                        data = json.loads(raw)
+                        dataset = TeamDataset(data, version, modified, rules)
+                        responses = prepared_responses(dataset) if settings else ()
+                        snapshot.write_snapshot(self.snapshots.path(name), dataset, data,
+                                                responses, settings)
+                        self.snapshots.remove_others(name, f'{source}-')
+                        prepared = self.snapshots.open(name)
+            except OSError as e:
+                print(f"Error writing snapshot: {e}")
+                prepared = None
+            if prepared is None:
+                return TeamDataset(json.loads(raw), version, modified, rules)
+        return TeamDataset(None, version, modified, rules, snapshot=prepared)
+
+def data_version(raw, rules_raw, league=None):
+    """Version of a data file's contents under a rules file's contents"""
+    # Rules shape the responses too, so a rules edit is a new version
+    digest = hashlib.sha1(raw + b'\0' + rules_raw)
+    if league:
+        # Caches are keyed by version; leagues with identical files still differ in timestamps
+        digest.update(b'\0' + league.encode())
+    return digest.hexdigest()[:16]
+
+def team_json(team):
+    """A team as it appears in a data file written with indent=2"""
+    return json.dumps(team, indent=2).replace('\n', '\n    ').encode()
+
+def splice_teams(raw, old_teams, new_teams):
+    """Data file bytes with some teams' JSON swapped for their new versions, or None
+
+    Other teams keep their bytes, so a large file isn't re-encoded for a few
+    edits. None when an old team isn't found exactly as indent=2 would write
+    it (e.g. the file was formatted by hand), and the caller re-encodes it all.
+    """
+    spans = []
+    for row, team in old_teams.items():
+        chunk = team_json(team)
+        start = raw.find(b'\n    ' + chunk) + 5
+        if start < 5:
+            return None
+        spans.append((start, start + len(chunk), team_json(new_teams[row])))
+    
+    parts = []
+    end = 0
+    for start, stop, chunk in sorted(spans):
+        parts += [raw[end:start], chunk]
+        end = stop
+    parts.append(raw[end:])
+    return b''.join(parts)
+
+def write_atomically(path, data):
+    """Replace a file's contents so readers see either the old or the new bytes, never a mix"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+# Fields a team patch may set, with the JSON type each must have
+PATCH_FIELDS = {'name': (str, 'a string'), 'city': (str, 'a string'), 'mascot': (str, 'a string'),
+                'conference': (str, 'a string'), 'division': (str, 'a string'),
+                'colors': (dict, 'an object'), 'logo': (str, 'a string'),
+                'founded': (int, 'a number')}
+REQUIRED_TEXT = ('name', 'city', 'mascot', 'conference', 'division')
+HEX_COLOR = re.compile(r'#[0-9A-Fa-f]{6}')
+
+def patched_team(team, patch):
+    """A team dict with one patch applied (`colors` merges by role); ValueError if it's invalid"""
+    updated = dict(team)
+    for field, value in patch.items():
+        if field == 'id':
+            continue
+        if field not in PATCH_FIELDS:
+            raise ValueError(f"Field '{field}' can't be updated")
+        expected, description = PATCH_FIELDS[field]
+        # type() rather than isinstance(): JSON true is not a year
+        if type(value) is not expected:
+            raise ValueError(f"'{field}' must be {description}")
+        if field in REQUIRED_TEXT and not value.strip():
+            raise ValueError(f"'{field}' can't be empty")
+        if field == 'colors':
+            colors = dict(updated.get('colors') or {})
+            for role, color in value.items():
+                if role not in COLOR_KEYS:
+                    raise ValueError(f"Unknown color role '{role}'")
+                if not isinstance(color, str) or not HEX_COLOR.fullmatch(color):
+                    raise ValueError(f"Color '{role}' must look like #RRGGBB")
+                colors[role] = color.upper()
+            value = colors
+        updated[field] = value
+    return updated
+
+@functools.lru_cache(maxsize=None)
+def snapshot_fingerprint():
+    """Hash of the code that builds prepared state; snapshots from other code are rebuilt"""
+    modules = [sys.modules[cls.__module__]
+               for cls in (TeamTable, SearchIndex, DesignRules, ColorTable)]
+    return snapshot.fingerprint(__file__, snapshot.__file__,
+                                *(module.__file__ for module in modules))
+
+def response_settings(modified):
+    """What precomputed response bodies depend on, or None when responses aren't cacheable"""
+    if not TeamAPI.stable_timestamps:
+        return None
+    return {'compact_json': TeamAPI.compact_json,
+            'modified': modified.isoformat() if modified else None}
+
+team_store = TeamStore()
+
+# Memory a dataset built from JSON takes, as a multiple of the file's size
+BUILT_MEMORY_FACTOR = 10
+
+def league_store(league, files):
+    """Store of a registered league, with the default store's settings and its own directories"""
+    snapshots = None
+    if team_store.snapshots:
+        snapshots = SnapshotStore(os.path.join(team_store.snapshots.directory,
+                                               f'league-{league}'))
+    store = TeamStore(files['data'], team_store.check_interval,
+                      files['rules'] or team_store.rules_path, snapshots, league)
+    # Atlas and snapshot cleanup removes other versions, so every league gets its own directory
+    store.atlases = AtlasStore(os.path.join(atlas_store.directory, f'league-{league}'))
+    store.update_token = team_store.update_token
+    store.background_reload = team_store.background_reload
+    return store
+
+league_registry = leagues.LeagueRegistry(league_store, team_store)
+
+MAX_BATCH_REQUESTS = 100
+MAX_PAGE_SIZE = 1000
+MAX_SEARCH_RESULTS = 100
+MAX_SEARCH_QUERY = 200
+MAX_TEAM_PATCHES = 100
+# Past this many changed teams, /events tells dashboards to reload everything
+MAX_EVENT_IDS = 1000
+STREAM_CHUNK_SIZE = 16 * 1024
+# Most teams one generateAllVariations task covers; small leagues get smaller
+# tasks so every worker has some
+BULK_CHUNK_TEAMS = 16
+BULK_RENDER_SIZE = 128
+
+# Query parameters that turn a team listing into a paged/projected/streamed one
+LISTING_PARAMS = ('limit', 'cursor', 'fields', 'format')
+TEAM_FIELDS = ('id', 'name', 'city', 'mascot', 'conference', 'division', 'colors', 'logo',
+               'founded')
+
+render_cache = RenderCache()
+atlas_store = AtlasStore()
+request_metrics = metrics.Metrics()
+access_log = metrics.AccessLog()
+request_profiler = profiling.RequestProfiler()
+admission_control = admission.AdmissionControl()
+event_hub = events.EventHub()
+bulk_runner = bulk.BulkRunner()
+
+class BinaryResponse:
+    """Non-JSON API result, such as a rendered image"""
+    __slots__ = ('content_type', 'body', 'etag')
+    
+    def __init__(self, content_type, body, etag):
+        self.content_type = content_type
+        self.body = body
+        self.etag = etag
+
+class NDJSONResponse:
+    """Streamed API result: an iterator of newline-delimited JSON chunks"""
+    __slots__ = ('chunks', 'next_cursor')
+    
+    def __init__(self, chunks, next_cursor=None):
+        self.chunks = chunks
+        self.next_cursor = next_cursor
+
+class TeamAPI:
+    """API actions over one dataset snapshot, independent of the HTTP server"""
+    # When set, `timestamp` is the dataset's modification time instead of
+    # the wall clock, so identical requests produce identical (cacheable) bodies
+    stable_timestamps = False
+    # Encode responses without indentation
+    compact_json = False
+    # Valid `action` values; anything else is labeled 'invalid' in metrics
+    ACTIONS = ('getTeams', 'getTeam', 'getTeamsByConference', 'getTeamsByDivision',
+               'generateLogoVariations', 'getDesignProfile', 'getLogoAnalysis',
+               'colorSimilarity', 'renderLogo', 'logoAtlas', 'search', 'batch', 'updateTeams',
+               'generateAllVariations')
+    # Action being handled, for labeling error counts
+    action = 'unknown'
+    
+    def __init__(self, dataset, store=None):
+        self.dataset = dataset
+        self.nfl_data = dataset.data
+        # League the dataset belongs to (None for the default one) and where its atlases go
+        self.league = store.league if store else None
+        self.atlases = store.atlases if store and store.atlases else atlas_store
+    
+    def handle_action(self, action, query_params):
+        """Dispatch an API action and return the response dict"""
+        outer_action = self.action
+        self.action = action if action in self.ACTIONS else 'invalid'
+        try:
+            return self.dispatch_action(action, query_params)
+        finally:
+            # Batch sub-requests come back through here
+            self.action = outer_action
+    
+    def dispatch_action(self, action, query_params):
+        """Run one action; exceptions become error responses"""
         try:
             if action == 'getTeams':
-                response = self.get_teams()
+                response = self.get_teams(self.parse_listing(query_params))
+            elif action == 'getTeam' and 'ids' in query_params:
+                team_ids = self.parse_id_list(query_params['ids'][0])
+                response = self.get_teams_by_ids(team_ids)
             elif action == 'getTeam':
                 team_id = int(query_params.get('id', [0])[0])
                 response = self.get_team(team_id)
             elif action == 'getTeamsByConference':
                 conference = query_params.get('conference', [''])[0]
-                response = self.get_teams_by_conference(conference)
+                response = self.get_teams_by_conference(conference,
+                                                        self.parse_listing(query_params))
             elif action == 'getTeamsByDivision':
                 division = query_params.get('division', [''])[0]
-                response = self.get_teams_by_division(division)
+                conference = query_params.get('conference', [''])[0]
+                response = self.get_teams_by_division(division, conference,
+                                                      self.parse_listing(query_params))
             elif action == 'generateLogoVariations':
                 team_id = int(query_params.get('teamId', [0])[0])
                 response = self.generate_logo_variations(team_id)
@@ -62,54 +649,270 @@ class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
             elif action == 'getLogoAnalysis':
                 team_id = int(query_params.get('teamId', [0])[0])
                 response = self.get_logo_analysis(team_id)
+            elif action == 'colorSimilarity':
+                team_id = int(query_params.get('teamId', [0])[0])
+                limit = int(query_params.get('limit', [5])[0])
+                response = self.get_color_similarity(team_id, limit)
+            elif action == 'renderLogo':
+                team_id = int(query_params.get('teamId', [0])[0])
+                style = query_params.get('style', ['minimalist'])[0]
+                size = int(query_params.get('size', [200])[0])
+                fmt = query_params.get('format', ['svg'])[0]
+                response = self.render_logo(team_id, style, size, fmt)
+            elif action == 'logoAtlas':
+                style = query_params.get('style', ['minimalist'])[0]
+                size = int(query_params.get('size', [128])[0])
+                fmt = query_params.get('format', ['png'])[0]
+                response = self.logo_atlas(style, size, fmt)
+            elif action == 'search':
+                query = query_params.get('q', [''])[0]
+                limit = int(query_params.get('limit', [10])[0])
+                response = self.search_teams(query, limit)
+            elif action == 'batch':
+                response = self.batch(self.parse_batch_requests(query_params))
+            elif action == 'generateAllVariations':
+                conference = query_params.get('conference', [''])[0]
+                division = query_params.get('division', [''])[0]
+                render = query_params.get('render', [''])[0]
+                size = int(query_params.get('size', [BULK_RENDER_SIZE])[0])
+                response = self.generate_all_variations(conference, division, render, size)
             else:
                 response = self.error_response('Invalid action specified')
         except Exception as e:
             response = self.error_response(str(e))
         
-        self.send_json_response(response)
+        return response
     
-    def send_json_response(self, data):
-        """Send JSON response"""
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, indent=2).encode())
-    
-    def get_teams(self):
+    def get_teams(self, listing=None):
         """Get all teams"""
-        # Add placeholder logos for teams without logos
-        teams = self.nfl_data['teams'].copy()
-        for team in teams:
-            if 'logo' not in team or not team['logo']:
-                team['logo'] = self.generate_placeholder_logo(team)
-            team['logo_analysis'] = self.analyze_team_design_elements(team)
+        return self.list_teams(self.dataset.teams, True, listing)
+    
+    def parse_listing(self, query_params):
+        """Paging, projection and format options for a team listing; None if none were given"""
+        if not any(name in query_params for name in LISTING_PARAMS):
+            return None
+        
+        limit = query_params.get('limit', [''])[0]
+        limit = int(limit) if limit else None
+        if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+        cursor = query_params.get('cursor', [''])[0]
+        fmt = query_params.get('format', ['json'])[0]
+        if fmt not in ('json', 'ndjson'):
+            raise ValueError(f"Unknown format '{fmt}'")
+        
+        return {
+            'limit': limit,
+            'offset': self.decode_cursor(cursor) if cursor else 0,
+            'fields': [name for name in query_params.get('fields', [''])[0].split(',') if name],
+            'format': fmt
+        }
+    
+    def encode_cursor(self, offset):
+        """Opaque cursor for the page starting at `offset`"""
+        raw = f'{self.dataset.version}:{offset}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+    
+    def decode_cursor(self, cursor):
+        """Offset from a cursor issued for this dataset version"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            version, _, offset = raw.rpartition(':')
+            offset = int(offset)
+        except ValueError:
+            raise ValueError('Invalid cursor')
+        if version != self.dataset.version or offset < 0:
+            raise ValueError('Cursor is from another version of the data; start from the first page')
+        return offset
+    
+    def list_teams(self, teams, full, listing):
+        """A team listing, optionally paged, projected to some fields or streamed as NDJSON"""
+        if listing is None:
+            return self.success_response({'teams': [self.team_fragment(team, full) for team in teams]})
+        
+        fields = listing['fields']
+        allowed = (TEAM_FIELDS + ('logo_analysis',)) if full else TEAM_FIELDS
+        unknown = [name for name in fields if name not in allowed]
+        if unknown:
+            return self.error_response(f"Unknown fields: {', '.join(unknown)}")
+        
+        start = min(listing['offset'], len(teams))
+        end = len(teams) if listing['limit'] is None else min(len(teams), start + listing['limit'])
+        page = teams[start:end]
+        next_cursor = self.encode_cursor(end) if end < len(teams) else None
         
-        return self.success_response({'teams': teams})
+        if listing['format'] == 'ndjson':
+            return NDJSONResponse(self.stream_teams(page, full, fields), next_cursor)
+        
+        if fields:
+            items = [self.project_team(team, full, fields) for team in page]
+        else:
+            items = [self.team_fragment(team, full) for team in page]
+        return self.success_response({'teams': items, 'total': len(teams),
+                                      'next_cursor': next_cursor})
+    
+    def project_team(self, team, full, fields):
+        """Only the requested fields; derived ones are computed only when asked for"""
+        projected = {}
+        for name in fields:
+            if name == 'logo_analysis':
+                projected[name] = self.memoized('logo_analysis', team,
+                                                self.analyze_team_design_elements)
+            elif name == 'logo' and full and not team.get('logo'):
+                projected[name] = self.memoized('placeholder_logo', team,
+                                                self.generate_placeholder_logo)
+            elif name in team:
+                projected[name] = team[name]
+        return projected
+    
+    def stream_teams(self, teams, full, fields):
+        """Yield one JSON team per line, grouped into chunks of about STREAM_CHUNK_SIZE"""
+        lines = []
+        size = 0
+        for team in teams:
+            if fields:
+                line = json.dumps(self.project_team(team, full, fields),
+                                  separators=(',', ':')).encode()
+            else:
+                # Reuse a cached encoding, but don't grow the cache for a one-off stream
+                fragment = self.dataset.fragments.get(('full' if full else 'raw', team['id']))
+                if fragment is not None:
+                    line = fragment.compact
+                else:
+                    value = self.team_view(team) if full else dict(team)
+                    line = json.dumps(value, separators=(',', ':')).encode()
+            lines.append(line)
+            size += len(line) + 1
+            if size >= STREAM_CHUNK_SIZE:
+                yield b'\n'.join(lines) + b'\n'
+                lines = []
+                size = 0
+        if lines:
+            yield b'\n'.join(lines) + b'\n'
     
     def get_team(self, team_id):
         """Get specific team"""
-        for team in self.nfl_data['teams']:
-            if team['id'] == team_id:
-                if 'logo' not in team or not team['logo']:
-                    team['logo'] = self.generate_placeholder_logo(team)
-                team['logo_analysis'] = self.analyze_team_design_elements(team)
-                return self.success_response(team)
+        team = self.dataset.by_id.get(team_id)
+        if team is None:
+            return self.error_response('Team not found')
+        
+        return self.success_response(self.team_view(team))
+    
+    def get_teams_by_ids(self, team_ids):
+        """Get several teams at once; unknown ids are listed under `missing`"""
+        teams = []
+        missing = []
+        for team_id in team_ids:
+            team = self.dataset.by_id.get(team_id)
+            if team is None:
+                missing.append(team_id)
+            else:
+                teams.append(self.team_fragment(team))
+        return self.success_response({'teams': teams, 'missing': missing})
+    
+    def parse_id_list(self, value):
+        """Parse a comma separated id list like '1,2,3'"""
+        return [int(part) for part in value.split(',') if part.strip()]
+    
+    def parse_batch_requests(self, query_params):
+        """Read batch sub-requests from `requests` JSON or the `actions`/`ids` shorthand"""
+        if 'requests' in query_params:
+            requests = json.loads(query_params['requests'][0])
+            if not isinstance(requests, list):
+                raise ValueError('requests must be a JSON list')
+            return requests
+        
+        actions = [a for a in query_params.get('actions', [''])[0].split(',') if a]
+        team_ids = self.parse_id_list(query_params.get('ids', [''])[0])
+        requests = []
+        for team_id in team_ids:
+            for action in actions:
+                id_param = 'id' if action == 'getTeam' else 'teamId'
+                requests.append({'action': action, id_param: team_id})
+        return requests
+    
+    def batch(self, requests):
+        """Run several sub-requests against this one dataset snapshot"""
+        if len(requests) > MAX_BATCH_REQUESTS:
+            return self.error_response(f'Batch is limited to {MAX_BATCH_REQUESTS} requests')
         
-        return self.error_response('Team not found')
+        results = []
+        for request in requests:
+            if not isinstance(request, dict):
+                results.append(self.error_response('Each batch request must be an object'))
+                continue
+            action = request.get('action', '')
+            if action == 'batch':
+                results.append(self.error_response('Nested batch requests are not allowed'))
+                continue
+            sub_params = {name: [str(value)] for name, value in request.items()}
+            result = self.handle_action(action, sub_params)
+            if isinstance(result, (BinaryResponse, NDJSONResponse)):
+                result = self.error_response(f'{action} is not available in a batch')
+            results.append(result)
+        
+        return self.success_response({'results': results})
+    
+    def memoized(self, name, team, compute):
+        """Derived value for a team, computed once per dataset version"""
+        key = (name, team['id'])
+        value = self.dataset.derived.get(key)
+        if value is None:
+            # Two threads may race to compute the same pure value; either result is fine
+            value = freeze(compute(team))
+            self.dataset.derived[key] = value
+        return value
     
-    def get_teams_by_conference(self, conference):
+    def team_view(self, team):
+        """Team with its logo (or placeholder) and design analysis filled in"""
+        return self.memoized('view', team, self.build_team_view)
+    
+    def build_team_view(self, team):
+        """Build the team view from the immutable record"""
+        view = dict(team)
+        if 'logo' not in view or not view['logo']:
+            view['logo'] = self.memoized('placeholder_logo', team, self.generate_placeholder_logo)
+        view['logo_analysis'] = self.memoized('logo_analysis', team,
+                                              self.analyze_team_design_elements)
+        return view
+    
+    def team_fragment(self, team, full=True):
+        """Serialized team, encoded once per dataset version"""
+        key = ('full' if full else 'raw', team['id'])
+        fragment = self.dataset.fragments.get(key)
+        if fragment is None:
+            fragment = JSONFragment(self.team_view(team) if full else dict(team))
+            self.dataset.fragments[key] = fragment
+        return fragment
+    
+    def get_teams_by_conference(self, conference, listing=None):
         """Get teams by conference"""
-        teams = [team for team in self.nfl_data['teams'] 
-                if team['conference'].lower() == conference.lower()]
-        return self.success_response({'teams': teams})
+        teams = self.dataset.by_conference.get(conference.lower(), [])
+        return self.list_teams(teams, False, listing)
+    
+    def get_teams_by_division(self, division, conference='', listing=None):
+        """Get teams by division, optionally narrowed to one conference"""
+        if conference:
+            key = (conference.lower(), division.lower())
+            teams = self.dataset.by_conference_division.get(key, [])
+        else:
+            teams = self.dataset.by_division.get(division.lower(), [])
+        return self.list_teams(teams, False, listing)
     
-    def get_teams_by_division(self, division):
-        """Get teams by division"""
-        teams = [team for team in self.nfl_data['teams'] 
-                if team['division'].lower() == division.lower()]
-        return self.success_response({'teams': teams})
+    def search_teams(self, query, limit=10):
+        """Teams whose name, city or mascot match every word of the query, best first"""
+        if not query.strip():
+            return self.error_response('Search query is required')
+        if len(query) > MAX_SEARCH_QUERY:
+            return self.error_response(f'Search query must be at most {MAX_SEARCH_QUERY} characters')
+        if not 1 <= limit <= MAX_SEARCH_RESULTS:
+            return self.error_response(f'limit must be between 1 and {MAX_SEARCH_RESULTS}')
+        
+        matches, total = self.dataset.search.search(query, limit)
+        teams = self.dataset.teams
+        results = [{'score': round(score, 3), 'team': self.team_fragment(teams[row], False)}
+                   for row, score in matches]
+        return self.success_response({'query': query, 'total': total, 'results': results})
     
     def generate_logo_variations(self, team_id):
         """Generate logo variations for a team"""
@@ -128,7 +931,8 @@ class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
         return self.success_response({
             'team': team,
             'variations': variations,
-            'design_rationale': self.get_design_rationale(team)
+            'design_rationale': self.memoized('design_rationale', team,
+                                              self.get_design_rationale)
         })
     
     def generate_minimalist_concept(self, team):
@@ -181,56 +985,10 @@ class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
     
     def select_primary_shape(self, team, style):
         """Select primary shape based on team mascot and style"""
-        mascot = team['mascot'].lower()
-        
-        animal_shapes = {
-            'eagles': 'Stylized eagle head or spread wings',
-            'falcons': 'Falcon silhouette in flight',
-            'seahawks': 'Hawk head profile',
-            'ravens': 'Raven silhouette',
-            'cardinals': 'Cardinal head profile',
-            'panthers': 'Panther head or paw print',
-            'jaguars': 'Jaguar head profile',
-            'bengals': 'Tiger stripes pattern',
-            'bears': 'Bear head or paw',
-            'lions': 'Lion head mane',
-            'rams': 'Ram horns',
-            'colts': 'Horseshoe',
-            'broncos': 'Horse head profile',
-            'dolphins': 'Dolphin jumping'
-        }
-        
-        if mascot in animal_shapes:
-            return animal_shapes[mascot]
-        
-        concept_shapes = {
-            'patriots': 'Patriot head profile or star',
-            'cowboys': 'Star',
-            'steelers': 'Steel beam or hypocycloid',
-            'packers': 'Letter G in circle',
-            'giants': 'NY letters',
-            'jets': 'Jet silhouette',
-            'saints': 'Fleur-de-lis',
-            'browns': 'Helmet',
-            'titans': 'Flame or T logo',
-            'texans': 'Bull head',
-            'chiefs': 'Arrowhead',
-            'raiders': 'Shield with crossed swords',
-            'chargers': 'Lightning bolt',
-            'bills': 'Buffalo or charging bull',
-            'commanders': 'W logo or shield'
-        }
-        
-        if mascot in concept_shapes:
-            return concept_shapes[mascot]
-        
-        default_shapes = {
-            'minimalist': 'Clean geometric circle with team initial',
-            'retro': 'Classic shield shape',
-            'modern': 'Dynamic angular shape'
-        }
-        
-        return default_shapes.get(style, 'Team initial in geometric frame')
+        shape = self.dataset.design.get(team)[0]
+        if shape is not None:
+            return shape
+        return self.dataset.design.rules.shape_for_style(style)
     
     def simplify_color_scheme(self, colors):
         """Simplify color scheme for minimalist design"""
@@ -257,7 +1015,7 @@ class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
             'secondary': colors['secondary'],
             'accent': colors['accent'],
             'gradient_start': colors['primary'],
-            'gradient_end': self.lighten_color(colors['primary'], 20),
+            'gradient_end': self.dataset.colors.lighten_for(colors['primary'], 20),
             'usage': 'Dynamic gradients and modern color applications'
         }
     
@@ -389,6 +1147,64 @@ class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
         
         return self.success_response(design_profile)
     
+    def generate_all_variations(self, conference='', division='', render='',
+                                size=BULK_RENDER_SIZE):
+        """Variations and analysis (and renders) of every matching team, streamed as NDJSON
+
+        Teams are spread over the bulk worker processes and each line is
+        written as soon as its team is done, so lines arrive out of order.
+        """
+        if render and render not in logo_renderer.FORMATS:
+            return self.error_response(f"Unknown format '{render}'")
+        if render and not logo_renderer.MIN_SIZE <= size <= logo_renderer.max_size(render):
+            return self.error_response(
+                f'Size must be between {logo_renderer.MIN_SIZE} and '
+                f'{logo_renderer.max_size(render)}')
+        
+        if conference and division:
+            teams = self.dataset.by_conference_division.get((conference.lower(),
+                                                             division.lower()), [])
+        elif conference:
+            teams = self.dataset.by_conference.get(conference.lower(), [])
+        elif division:
+            teams = self.dataset.by_division.get(division.lower(), [])
+        else:
+            teams = self.dataset.teams
+        team_ids = [team['id'] for team in teams]
+        
+        workers = max(1, bulk_runner.workers)
+        chunk = max(1, min(BULK_CHUNK_TEAMS, -(-len(team_ids) // (workers * 4))))
+        tasks = ((self.dataset.version, team_ids[start:start + chunk], render, size)
+                 for start in range(0, len(team_ids), chunk))
+        return NDJSONResponse(bulk.ResultStream(self.stream_bulk_results(tasks)))
+    
+    def stream_bulk_results(self, tasks):
+        """Chunks of NDJSON lines from the bulk workers, ending with an error line if they fail"""
+        try:
+            tasks = ((self.league,) + task for task in tasks)
+            yield from bulk_runner.run(bulk_team_lines, tasks,
+                                       init_bulk_worker, (bulk_worker_settings(),))
+        except Exception as e:
+            # Headers are long gone; the client sees the stream end on this line
+            print(f"Error generating variations: {e}")
+            yield encode_json({'success': False, 'error': 'Generation stopped early'}, True) + b'\n'
+    
+    def bulk_team_result(self, team_id, render='', size=BULK_RENDER_SIZE):
+        """One team's line of generateAllVariations"""
+        variations = self.generate_logo_variations(team_id)
+        if not variations['success']:
+            return {'id': team_id, 'success': False, 'error': variations['error']}
+        
+        result = {'id': team_id, 'success': True, **variations['data'],
+                  'analysis': self.get_logo_analysis(team_id)['data']}
+        if render:
+            result['renders'] = {}
+            for style in logo_renderer.STYLES:
+                image = self.render_logo(team_id, style, size, render)
+                encoded = base64.b64encode(image.body).decode()
+                result['renders'][style] = f'data:{image.content_type};base64,{encoded}'
+        return result
+    
     def get_logo_analysis(self, team_id):
         """Get logo analysis for a team"""
         team_response = self.get_team(team_id)
@@ -398,7 +1214,8 @@ class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
         team = team_response['data']
         
         analysis = {
-            'current_logo_elements': self.analyze_current_logo(team),
+            'current_logo_elements': self.memoized('current_logo', team,
+                                                   self.analyze_current_logo),
             'color_psychology': self.analyze_color_psychology(team['colors']),
             'brand_positioning': self.analyze_brand_positioning(team),
             'design_opportunities': self.identify_design_opportunities(team)
@@ -406,6 +1223,104 @@ class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
         
         return self.success_response(analysis)
     
+    def render_logo(self, team_id, style, size, fmt):
+        """Render a logo concept to SVG or PNG, reusing the on-disk render cache"""
+        if style not in logo_renderer.STYLES:
+            return self.error_response(f"Unknown style '{style}'")
+        if fmt not in logo_renderer.FORMATS:
+            return self.error_response(f"Unknown format '{fmt}'")
+        if not logo_renderer.MIN_SIZE <= size <= logo_renderer.max_size(fmt):
+            return self.error_response(
+                f'Size must be between {logo_renderer.MIN_SIZE} and {logo_renderer.max_size(fmt)}')
+        
+        team = self.dataset.by_id.get(team_id)
+        if team is None:
+            return self.error_response('Team not found')
+        
+        spec = self.render_spec(team, style, size)
+        key = logo_renderer.cache_key(spec, fmt)
+        data = render_cache.get(key, fmt)
+        if data is None:
+            data = logo_renderer.render(spec, fmt)
+            render_cache.put(key, fmt, data)
+        
+        return BinaryResponse(logo_renderer.FORMATS[fmt], data, f'"{key[:32]}"')
+    
+    def render_spec(self, team, style, size):
+        """Renderer input built from the same shape and color-scheme data as the concepts"""
+        colors = team['colors']
+        scheme = self.modernize_color_scheme(colors)
+        return {
+            'style': style,
+            'size': size,
+            'colors': {role: colors[role] for role in ('primary', 'secondary', 'accent')},
+            'gradient': [scheme['gradient_start'], scheme['gradient_end']],
+            'primary_shape': self.select_primary_shape(team, style),
+            'initial': team['mascot'][0],
+            'city': team['city'],
+            'mascot': team['mascot'],
+            'founded': team['founded']
+        }
+    
+    def logo_atlas(self, style, size, fmt):
+        """Every team's concept for a style on one sprite sheet, or its JSON index"""
+        if style not in logo_renderer.STYLES:
+            return self.error_response(f"Unknown style '{style}'")
+        if fmt != 'json' and fmt not in logo_renderer.FORMATS:
+            return self.error_response(f"Unknown format '{fmt}'")
+        if not logo_renderer.MIN_SIZE <= size <= logo_renderer.ATLAS_MAX_TILE:
+            return self.error_response(
+                f'Size must be between {logo_renderer.MIN_SIZE} and {logo_renderer.ATLAS_MAX_TILE}')
+        
+        if fmt == 'json':
+            return self.success_response(self.atlas_index(style, size))
+        
+        def build():
+            specs = [self.render_spec(team, style, size) for team in self.dataset.teams]
+            return logo_renderer.render_atlas(specs, size, fmt)[0]
+        
+        version = self.dataset.version
+        body = self.atlases.get(version, style, size, fmt, build)
+        etag = f'"atlas-{logo_renderer.RENDERER_VERSION}-{version}-{style}-{size}-{fmt}"'
+        return BinaryResponse(logo_renderer.FORMATS[fmt], body, etag)
+    
+    def atlas_index(self, style, size):
+        """Where each team's tile sits on the atlas"""
+        columns, width, height, offsets = logo_renderer.atlas_layout(len(self.dataset.teams), size)
+        return {
+            'version': self.dataset.version,
+            'style': style,
+            'tile_size': size,
+            'columns': columns,
+            'width': width,
+            'height': height,
+            'teams': [{'id': team['id'], 'name': team['name'], 'x': x, 'y': y,
+                       'width': size, 'height': size}
+                      for team, (x, y) in zip(self.dataset.teams, offsets)]
+        }
+    
+    def get_color_similarity(self, team_id, limit=5):
+        """Teams with the closest color palettes to a team"""
+        team = self.dataset.by_id.get(team_id)
+        if team is None:
+            return self.error_response('Team not found')
+        
+        similar = []
+        for other_id, distance in self.dataset.colors.most_similar(team_id, limit):
+            other = self.dataset.by_id[other_id]
+            similar.append({
+                'id': other_id,
+                'name': other['name'],
+                'colors': other['colors'],
+                'distance': round(distance, 2)
+            })
+        
+        return self.success_response({
+            'team': {'id': team_id, 'name': team['name'], 'colors': team['colors']},
+            'metric': 'Weighted CIE76 delta E (primary 0.5, secondary 0.3, accent 0.2)',
+            'similar': similar
+        })
+    
     def analyze_team_design_elements(self, team):
         """Analyze team design elements"""
         return {
@@ -417,30 +1332,11 @@ class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
     
     def identify_primary_motif(self, team):
         """Identify primary motif of the team"""
-        mascot = team['mascot'].lower()
-        
-        if mascot in ['eagles', 'falcons', 'seahawks', 'ravens', 'cardinals']:
-            return 'Bird/Raptor'
-        elif mascot in ['panthers', 'jaguars', 'bengals', 'bears', 'lions']:
-            return 'Predator/Feline'
-        elif mascot in ['colts', 'broncos', 'rams']:
-            return 'Hoofed Animal'
-        elif mascot in ['dolphins']:
-            return 'Marine Animal'
-        else:
-            return 'Abstract/Conceptual'
+        return self.dataset.design.get(team)[1]
     
     def analyze_color_dominance(self, colors):
         """Analyze color dominance"""
-        primary_rgb = self.hex_to_rgb(colors['primary'])
-        lightness = (primary_rgb['r'] + primary_rgb['g'] + primary_rgb['b']) / (3 * 255)
-        
-        if lightness < 0.3:
-            return 'Dark-dominant (Strong, Authoritative)'
-        elif lightness > 0.7:
-            return 'Light-dominant (Clean, Modern)'
-        else:
-            return 'Balanced (Versatile, Dynamic)'
+        return self.dataset.colors.dominance_for(colors['primary'])
     
     def get_historical_context(self, team):
         """Get historical context"""
@@ -457,25 +1353,7 @@ class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
     
     def get_regional_influence(self, team):
         """Get regional influence"""
-        city = team['city'].lower()
-        
-        regional_influences = {
-            'new england': 'Colonial American heritage',
-            'new orleans': 'French Creole culture',
-            'green bay': 'Industrial Midwest tradition',
-            'san francisco': 'California innovation culture',
-            'seattle': 'Pacific Northwest nature themes',
-            'miami': 'Tropical, vibrant aesthetics',
-            'denver': 'Mountain West ruggedness',
-            'dallas': 'Texas pride and scale',
-            'las vegas': 'Entertainment and glamour'
-        }
-        
-        for region, influence in regional_influences.items():
-            if region in city:
-                return influence
-        
-        return 'General American sports culture'
+        return self.dataset.design.get(team)[2]
     
     def analyze_current_logo(self, team):
         """Analyze current logo elements"""
@@ -488,18 +1366,7 @@ class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
     
     def analyze_color_psychology(self, colors):
         """Analyze color psychology"""
-        primary_rgb = self.hex_to_rgb(colors['primary'])
-        
-        if self.is_red(primary_rgb):
-            return 'Red conveys power, aggression, and passion'
-        elif self.is_blue(primary_rgb):
-            return 'Blue represents trust, stability, and professionalism'
-        elif self.is_green(primary_rgb):
-            return 'Green symbolizes growth, nature, and freshness'
-        elif self.is_yellow(primary_rgb):
-            return 'Yellow/Gold represents excellence, energy, and optimism'
-        else:
-            return 'Unique color choice for distinctive brand identity'
+        return self.dataset.colors.psychology_for(colors['primary'])
     
     def analyze_brand_positioning(self, team):
         """Analyze brand positioning"""
@@ -529,84 +1396,1213 @@ class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
         }
     
     def generate_placeholder_logo(self, team):
-        """Generate placeholder logo URL"""
+        """Generate placeholder logo URL (served locally by /placeholder/)"""
         primary_color = team['colors']['primary'].lstrip('#')
         accent_color = team['colors']['accent'].lstrip('#')
-        initial = team['mascot'][0]
+        initial = placeholder_initial(team['mascot'])
         
-        return f"https://via.placeholder.com/200x200/{primary_color}/{accent_color}?text={initial}"
+        return f"/placeholder/{primary_color}/{accent_color}/{initial}.svg"
     
-    # Utility functions
-    def hex_to_rgb(self, hex_color):
-        """Convert hex to RGB"""
-        hex_color = hex_color.lstrip('#')
-        return {
-            'r': int(hex_color[0:2], 16),
-            'g': int(hex_color[2:4], 16),
-            'b': int(hex_color[4:6], 16)
-        }
-    
-    def lighten_color(self, hex_color, percent):
-        """Lighten a hex color by percentage"""
-        rgb = self.hex_to_rgb(hex_color)
-        
-        rgb['r'] = min(255, int(rgb['r'] + (percent * 255 / 100)))
-        rgb['g'] = min(255, int(rgb['g'] + (percent * 255 / 100)))
-        rgb['b'] = min(255, int(rgb['b'] + (percent * 255 / 100)))
-        
-        return f"#{rgb['r']:02x}{rgb['g']:02x}{rgb['b']:02x}"
-    
-    def is_red(self, rgb):
-        """Check if color is predominantly red"""
-        return rgb['r'] > rgb['g'] and rgb['r'] > rgb['b'] and rgb['r'] > 150
-    
-    def is_blue(self, rgb):
-        """Check if color is predominantly blue"""
-        return rgb['b'] > rgb['r'] and rgb['b'] > rgb['g'] and rgb['b'] > 150
-    
-    def is_green(self, rgb):
-        """Check if color is predominantly green"""
-        return rgb['g'] > rgb['r'] and rgb['g'] > rgb['b'] and rgb['g'] > 150
-    
-    def is_yellow(self, rgb):
-        """Check if color is predominantly yellow"""
-        return rgb['r'] > 200 and rgb['g'] > 200 and rgb['b'] < 100
+    def response_timestamp(self):
+        """Timestamp for response bodies"""
+        if self.stable_timestamps:
+            modified = self.dataset.modified or datetime.fromtimestamp(0)
+            return modified.isoformat()
+        return datetime.now().isoformat()
     
     def success_response(self, data):
         """Create success response"""
         return {
             'success': True,
             'data': data,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': self.response_timestamp()
         }
     
     def error_response(self, message):
         """Create error response"""
+        request_metrics.count_error(self.action)
         return {
             'success': False,
             'error': message,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': self.response_timestamp()
         }
 
-def start_server(port=8000):
-    """Start the NFL dashboard server"""
+# Longest query parameter value worth a cache entry
+MAX_CACHE_KEY_VALUE = 1024
+
+def uncacheable(value):
+    """Normalizer for a parameter whose requests aren't cached whenever it's given"""
+    raise ValueError(value)
+
+# Query parameters each cacheable action depends on, and how to normalize them
+LISTING_CACHE_PARAMS = {'limit': int, 'cursor': str, 'fields': str, 'format': str}
+
+CACHEABLE_ACTIONS = {
+    'getTeams': {**LISTING_CACHE_PARAMS},
+    'getTeam': {'id': int, 'ids': str},
+    'getTeamsByConference': {'conference': str.lower, **LISTING_CACHE_PARAMS},
+    'getTeamsByDivision': {'division': str.lower, 'conference': str.lower,
+                           **LISTING_CACHE_PARAMS},
+    'generateLogoVariations': {'teamId': int},
+    'getDesignProfile': {},
+    'getLogoAnalysis': {'teamId': int},
+    'colorSimilarity': {'teamId': int, 'limit': int},
+    # JSON sub-requests (up to a whole POST body) would make huge keys
+    'batch': {'requests': uncacheable, 'actions': str, 'ids': str},
+}
+
+def response_cache_key(action, query_params):
+    """Build a normalized cache key, or None if the request isn't cacheable"""
+    params = CACHEABLE_ACTIONS.get(action)
+    if params is None:
+        return None
+    
+    key = [action]
+    for name, normalize in params.items():
+        value = query_params.get(name, [''])[0]
+        if len(value) > MAX_CACHE_KEY_VALUE:
+            return None
+        try:
+            key.append(normalize(value) if value else '')
+        except ValueError:
+            return None
+    return tuple(key)
+
+def make_etag(body):
+    """Strong ETag derived from the response bytes"""
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header against an ETag"""
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+class ResponseCache:
+    """Encoded API responses for the current dataset version of each league, in one LRU"""
+    
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (version, key) -> (body, etag)
+        self._entries = OrderedDict()
+        # League (None for the default one) -> version its entries are for
+        self._versions = {}
+    
+    def get(self, version, key):
+        """Get (body, etag) for a key, or None"""
+        with self._lock:
+            entry = self._entries.get((version, key))
+            if entry is not None:
+                self._entries.move_to_end((version, key))
+            return entry
+    
+    def put(self, version, key, entry, current=None, league=None):
+        """Store (body, etag); a league's new dataset version drops its older entries
+
+        `current` is the live dataset version: a response that was computed
+        from a dataset replaced in the meantime is dropped instead.
+        """
+        with self._lock:
+            if current is not None and version != current:
+                return
+            previous = self._versions.get(league)
+            if previous != version:
+                if previous is not None:
+                    for stale in [k for k in self._entries if k[0] == previous]:
+                        del self._entries[stale]
+                self._versions[league] = version
+            self._entries[(version, key)] = entry
+            self._entries.move_to_end((version, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+response_cache = ResponseCache()
+
+def precomputed_queries(dataset):
+    """Query strings of every team-level response worth encoding ahead of time"""
+    queries = ['action=getTeams', 'action=getDesignProfile']
+    for conference in dataset.by_conference:
+        queries.append(f'action=getTeamsByConference&conference={conference}')
+    for division in dataset.by_division:
+        queries.append(f'action=getTeamsByDivision&division={division}')
+    for team_id in dataset.by_id:
+        queries.append(f'action=getTeam&id={team_id}')
+        queries.append(f'action=generateLogoVariations&teamId={team_id}')
+        queries.append(f'action=getLogoAnalysis&teamId={team_id}')
+    return queries
+
+def precompute_responses(store=team_store):
+    """Fill the response cache with every team-level response for the current dataset"""
+    queries = precomputed_queries(store.current())
+    for query in queries:
+        handle_api_query(query, store)
+    return len(queries)
+
+def prepared_responses(dataset):
+    """(cache key, body, etag) of every precomputed query that succeeds, for a snapshot"""
+    api = TeamAPI(dataset)
+    for query in precomputed_queries(dataset):
+        query_params = urllib.parse.parse_qs(query)
+        action = query_params['action'][0]
+        key = response_cache_key(action, query_params)
+        response = api.handle_action(action, query_params)
+        if key and isinstance(response, dict) and response['success']:
+            body = encode_json(response, TeamAPI.compact_json)
+            yield key, body, make_etag(body)
+
+def bulk_worker_settings(store=team_store):
+    """What a bulk worker process needs to load the same dataset as this one"""
+    return {'data_file': os.path.abspath(store.path),
+            'rules_file': os.path.abspath(store.rules_path),
+            'snapshot_dir': os.path.abspath(store.snapshots.directory) if store.snapshots else None,
+            'render_cache_dir': os.path.abspath(render_cache.directory),
+            'render_cache_bytes': render_cache.max_bytes,
+            'default_league': league_registry.default,
+            'leagues': league_registry.files,
+            'league_memory': league_registry.memory_budget}
+
+def init_bulk_worker(settings):
+    """Point a freshly started bulk worker at the server's files and load the dataset"""
+    # Ctrl+C is the server's to handle; it shuts the workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    team_store.path = settings['data_file']
+    team_store.rules_path = settings['rules_file']
+    if settings['snapshot_dir']:
+        team_store.snapshots = SnapshotStore(settings['snapshot_dir'])
+    render_cache.directory = settings['render_cache_dir']
+    render_cache.max_bytes = settings['render_cache_bytes']
+    atlas_store.directory = os.path.join(settings['render_cache_dir'], logo_renderer.ATLAS_SUBDIR)
+    league_registry.default = settings['default_league']
+    league_registry.files = settings['leagues']
+    league_registry.memory_budget = settings['league_memory']
+    team_store.current()
+
+def bulk_team_lines(league, version, team_ids, render, size):
+    """NDJSON lines of generateAllVariations for some teams, run in a bulk worker"""
+    store = league_registry.store(league)
+    dataset = store.current()
+    api = TeamAPI(dataset, store)
+    lines = []
+    for team_id in team_ids:
+        if dataset.version != version:
+            # The data changed since the export started; don't mix versions in one export
+            result = {'id': team_id, 'success': False,
+                      'error': 'The team data changed during the export; start it again'}
+        else:
+            result = api.bulk_team_result(team_id, render, size)
+        lines.append(encode_json(result, True))
+    return b'\n'.join(lines) + b'\n'
+
+API_PATHS = ('/api', '/api.php')
+METRICS_PATH = '/metrics'
+EVENTS_PATH = '/events'
+ACTION_PARAM = re.compile(r'(?:^|&)action=([^&]*)')
+MAX_REQUEST_BODY = 1024 * 1024
+
+JSON_HEADERS = [
+    ('Content-type', 'application/json'),
+    ('Access-Control-Allow-Origin', '*'),
+]
+
+# Actions computed per request rather than read from prepared indexes;
+# admission control sheds these before cheap ones
+EXPENSIVE_ACTIONS = {'generateLogoVariations', 'getLogoAnalysis', 'colorSimilarity',
+                     'renderLogo', 'logoAtlas', 'search', 'batch', 'generateAllVariations'}
+
+SHED_MESSAGES = {
+    admission.OVERLOADED: 'Server is busy, please retry shortly',
+    admission.QUEUE_TIMEOUT: 'Server is busy, please retry shortly',
+    admission.RATE_LIMITED: 'Too many requests from this client',
+}
+
+def shed_response(shed):
+    """(status, headers, body) for a request admission control refused"""
+    status = 429 if shed.reason == admission.RATE_LIMITED else 503
+    body = encode_json({
+        'success': False,
+        'error': SHED_MESSAGES[shed.reason],
+        'timestamp': datetime.now().isoformat()
+    }, TeamAPI.compact_json)
+    headers = JSON_HEADERS + [('Retry-After', str(shed.retry_after)),
+                              ('Cache-Control', 'no-store')]
+    return status, headers, body
+
+def update_teams_response(store, request_headers, body):
+    """(status, headers, body) for a POSTed action=updateTeams
+
+    The body is one team patch or a list of them; each names the team by
+    `id` and carries the fields to change.
+    """
+    api = TeamAPI(store.current(), store)
+    api.action = 'updateTeams'
+    status = 200
+    headers = JSON_HEADERS + [('Cache-Control', 'no-store')]
+    token = store.update_token
+    authorization = request_headers.get('authorization') or ''
+    if not token:
+        status, response = 403, api.error_response('Team updates are disabled')
+    elif not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+        status, response = 401, api.error_response('A valid update token is required')
+        headers.append(('WWW-Authenticate', 'Bearer'))
+    elif not body:
+        response = api.error_response('POST one team patch or a list of them')
+    else:
+        try:
+            patches = json.loads(body)
+            if isinstance(patches, dict):
+                patches = [patches]
+            if (not isinstance(patches, list) or not patches
+                    or not all(isinstance(patch, dict) for patch in patches)):
+                raise ValueError('POST one team patch or a list of them')
+            if len(patches) > MAX_TEAM_PATCHES:
+                raise ValueError(f'At most {MAX_TEAM_PATCHES} teams can be updated at once')
+            dataset, ids = store.update_teams(patches)
+            api = TeamAPI(dataset, store)
+            api.action = 'updateTeams'
+            response = api.success_response({'version': dataset.version, 'updated': ids})
+        except (ValueError, UnicodeDecodeError) as e:
+            # json.JSONDecodeError is a ValueError
+            response = api.error_response(str(e))
+        except OSError as e:
+            print(f"Error saving team updates: {e}")
+            response = api.error_response('Team updates could not be saved')
+    return status, headers, encode_json(response, TeamAPI.compact_json)
+
+def handle_api_query(query, store=team_store, request_headers=None, body=None, client=None,
+                     waited=0.0):
+    """Run an API query string and return (status, headers, body)
+
+    `request_headers` is any mapping answering lowercase `.get()` lookups.
+    `client` is the peer address the rate limit applies to, and `waited`
+    how long the request already queued before getting here.
+    """
+    query_params = urllib.parse.parse_qs(query)
+    action = query_params.get('action', [''])[0]
+    cost = admission.EXPENSIVE if action in EXPENSIVE_ACTIONS else admission.CHEAP
+    try:
+        admission_control.check_rate(client, cost)
+    except admission.Shed as shed:
+        return shed_response(shed)
+    league = query_params.get('league', [''])[0]
+    if league and league != league_registry.default:
+        registered = league_registry.store(league, load=False)
+        if registered is None and league in league_registry:
+            # A first load (or reload after eviction) may take seconds, maybe
+            # building a snapshot, so it waits for a slot like expensive actions
+            try:
+                with admission_control.admitted(admission.EXPENSIVE, waited):
+                    registered = league_registry.store(league)
+            except admission.Shed as shed:
+                return shed_response(shed)
+        if registered is None:
+            api = TeamAPI(store.current())
+            api.action = action if action in TeamAPI.ACTIONS else 'invalid'
+            return 200, JSON_HEADERS, encode_json(api.error_response(f"Unknown league '{league}'"),
+                                                  TeamAPI.compact_json)
+        store = registered
+    label = action if action in TeamAPI.ACTIONS else 'invalid'
+    with request_profiler.profile(label, query_params.get('profile', [''])[0]):
+        return answer_api_query(action, query_params, store, request_headers or {}, body,
+                                cost, waited)
+
+def answer_api_query(action, query_params, store, request_headers, body, cost=admission.CHEAP,
+                     waited=0.0):
+    """Body of handle_api_query, separated so profiling can wrap all of it"""
+    if action == 'updateTeams':
+        return update_teams_response(store, request_headers, body)
+    if_none_match = request_headers.get('if-none-match')
+    if body:
+        # POSTed batches carry their sub-requests as the JSON body
+        query_params['requests'] = [body.decode('utf-8', 'replace')]
+    
+    # One snapshot per request so a reload can't change data mid-response
+    dataset = store.current()
+    
+    # Bodies only repeat byte-for-byte when timestamps are stable
+    key = None
+    if TeamAPI.stable_timestamps:
+        key = response_cache_key(action, query_params)
+    
+    entry = response_cache.get(dataset.version, key) if key else None
+    if entry is None and key:
+        entry = dataset.prepared_response(key)
+    if entry is None:
+        # Only responses that have to be computed take an admission slot
+        try:
+            release = admission_control.admit(cost, waited)
+        except admission.Shed as shed:
+            return shed_response(shed)
+        try:
+            response = TeamAPI(dataset, store).handle_action(action, query_params)
+            if isinstance(response, NDJSONResponse) and isinstance(response.chunks,
+                                                                    bulk.ResultStream):
+                # Exports compute while they stream; the slot goes when the stream ends
+                response.chunks.on_close, release = release, None
+        finally:
+            if release is not None:
+                release()
+        if isinstance(response, BinaryResponse):
+            return binary_api_response(response, request_headers)
+        if isinstance(response, NDJSONResponse):
+            headers = [('Content-type', 'application/x-ndjson'),
+                       ('Access-Control-Allow-Origin', '*'),
+                       ('Cache-Control', 'no-cache')]
+            if response.next_cursor:
+                headers.append(('X-Next-Cursor', response.next_cursor))
+            return 200, headers, response.chunks
+        body = encode_json(response, TeamAPI.compact_json)
+        entry = (body, make_etag(body))
+        if key and response['success']:
+            response_cache.put(dataset.version, key, entry, store.current().version, store.league)
+    
+    body, etag = entry
+    headers = JSON_HEADERS + [('ETag', etag), ('Cache-Control', 'no-cache')]
+    if if_none_match and etag_matches(if_none_match, etag):
+        return 304, headers, b''
+    return 200, headers, body
+
+def request_label(url_path, query):
+    """Metrics label for a request: the API action, or the kind of resource"""
+    if url_path in API_PATHS:
+        match = ACTION_PARAM.search(query)
+        action = urllib.parse.unquote_plus(match.group(1)) if match else ''
+        return action if action in TeamAPI.ACTIONS else 'invalid'
+    if url_path == METRICS_PATH:
+        return 'metrics'
+    if url_path == EVENTS_PATH:
+        return 'events'
+    if url_path.startswith('/placeholder/'):
+        return 'placeholder'
+    return 'static'
+
+def event_stream_headers():
+    """Headers opening an /events stream"""
+    return [('Content-type', events.CONTENT_TYPE),
+            ('Cache-Control', 'no-cache'),
+            ('Access-Control-Allow-Origin', '*'),
+            # The stream ends only when the connection does
+            ('Connection', 'close')]
+
+def event_stream_preamble(dataset, resumed, last_event_id=None):
+    """First bytes of an /events stream: the retry delay and the version being served
+
+    A client whose Last-Event-ID can't be resumed missed events, so it is
+    told to reload instead.
+    """
+    preamble = f'retry: {events.RETRY_MS}\n\n'.encode()
+    if last_event_id and not resumed:
+        return preamble + events.format_event(None, 'reload', {'version': dataset.version})
+    return preamble + events.format_event(None, 'ready', {'version': dataset.version})
+
+def metrics_response():
+    """(status, headers, body) for /metrics"""
+    body = request_metrics.render() + admission_control.render() + league_registry.render()
+    return 200, [('Content-type', metrics.CONTENT_TYPE)], metrics.with_labels(
+        body, request_metrics.labels)
+
+def binary_api_response(response, request_headers):
+    """(status, headers, body) for a BinaryResponse, honoring a single byte Range"""
+    headers = [
+        ('Content-type', response.content_type),
+        ('Access-Control-Allow-Origin', '*'),
+        ('ETag', response.etag),
+        ('Cache-Control', 'no-cache'),
+        ('Accept-Ranges', 'bytes'),
+    ]
+    if_none_match = request_headers.get('if-none-match')
+    if if_none_match and etag_matches(if_none_match, response.etag):
+        return 304, headers, b''
+    
+    body = response.body
+    range_header = request_headers.get('range')
+    if_range = request_headers.get('if-range')
+    if range_header and (not if_range or if_range.strip() == response.etag):
+        try:
+            byte_range = parse_byte_range(range_header, len(body))
+        except ValueError:
+            return 416, headers + [('Content-Range', f'bytes */{len(body)}')], b''
+        if byte_range:
+            start, end = byte_range
+            headers.append(('Content-Range', f'bytes {start}-{end}/{len(body)}'))
+            # Slicing a memoryview-backed body stays zero-copy
+            return 206, headers, body[start:end + 1]
+    return 200, headers, body
+
+def parse_byte_range(value, length):
+    """Inclusive (start, end) for a single `bytes=` range, or None to ignore the header
+
+    Raises ValueError when the range can't be satisfied.
+    """
+    unit, _, spec = value.partition('=')
+    first, dash, last = spec.strip().partition('-')
+    if unit.strip().lower() != 'bytes' or not dash or ',' in spec:
+        return None
+    if not (first.isdigit() or first == '') or not (last.isdigit() or last == ''):
+        return None
+    
+    if first:
+        start = int(first)
+        end = min(int(last), length - 1) if last else length - 1
+        if last and int(last) < start:
+            return None
+    elif last:
+        # Suffix range: the final N bytes
+        if int(last) == 0:
+            raise ValueError('Empty suffix range')
+        start, end = max(0, length - int(last)), length - 1
+    else:
+        return None
+    
+    if start >= length:
+        raise ValueError('Range starts past the end')
+    return start, end
+
+# Characters a placeholder's initial may be made of
+INITIAL_CHAR = re.compile(r'[A-Za-z0-9]')
+FALLBACK_INITIAL = 'X'
+PLACEHOLDER_PATH = re.compile(
+    r'^/placeholder/([0-9a-fA-F]{6})/([0-9a-fA-F]{6})/'
+    rf'({INITIAL_CHAR.pattern}{{1,3}})\.(svg|png)$')
+
+def placeholder_initial(mascot):
+    """Initial of a mascot that PLACEHOLDER_PATH accepts: its first ASCII letter or digit
+
+    Accents are stripped first (É becomes E); a mascot without any usable
+    character gets FALLBACK_INITIAL.
+    """
+    for char in unicodedata.normalize('NFKD', mascot or ''):
+        if INITIAL_CHAR.fullmatch(char):
+            return char
+    return FALLBACK_INITIAL
+
+class PlaceholderImages:
+    """Generated placeholder logos, kept in memory in LRU order"""
+    # A placeholder URL fully determines its bytes, so browsers may keep it
+    cache_control = 'public, max-age=31536000, immutable'
+    
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+    
+    def respond(self, url_path, if_none_match=None):
+        """(status, headers, body) for a /placeholder/ path, or None if it isn't one"""
+        match = PLACEHOLDER_PATH.match(url_path)
+        if match is None:
+            return None
+        
+        primary, accent, initial, fmt = match.groups()
+        body, etag = self.get(primary.lower(), accent.lower(), initial, fmt)
+        headers = [
+            ('Content-type', logo_renderer.FORMATS[fmt]),
+            ('Access-Control-Allow-Origin', '*'),
+            ('ETag', etag),
+            ('Cache-Control', self.cache_control),
+        ]
+        if if_none_match and etag_matches(if_none_match, etag):
+            return 304, headers, b''
+        return 200, headers, body
+    
+    def get(self, primary, accent, initial, fmt):
+        """(body, etag) for one placeholder, rendering it on a miss"""
+        key = (primary, accent, initial, fmt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        
+        body = logo_renderer.render_placeholder(f'#{primary}', f'#{accent}', initial, fmt)
+        entry = (body, make_etag(body))
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+placeholder_images = PlaceholderImages()
+
+DASHBOARD_ASSETS = ('index.html', 'script.js', 'styles.css')
+# The dashboard's fallback copy of the team data, served from the store's data file
+DATA_ASSET = DATA_FILE
+
+class StaticAsset:
+    """One dashboard file held in memory with its gzip variant and validators"""
+    __slots__ = ('path', 'mtime', 'size', 'content_type', 'body', 'gzip_body',
+                 'etag', 'gzip_etag', 'last_modified')
+    
+    def __init__(self, path, max_cached_size):
+        stat = os.stat(path)
+        self.path = path
+        self.mtime = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.body = None
+        self.gzip_body = None
+        
+        if self.size > max_cached_size:
+            # Too big to pin in memory: validators come from the stat, bytes go out via sendfile
+            self.etag = f'"{self.mtime:x}-{self.size:x}"'
+            self.gzip_etag = None
+            return
+        
+        with open(path, 'rb') as f:
+            self.body = f.read()
+        self.etag = make_etag(self.body)
+        
+        compressed = gzip.compress(self.body, compresslevel=9, mtime=0)
+        if len(compressed) < self.size:
+            self.gzip_body = compressed
+            self.gzip_etag = self.etag[:-1] + '-gz"'
+        else:
+            self.gzip_etag = None
+
+def accepts_gzip(accept_encoding):
+    """Check whether an Accept-Encoding header allows gzip"""
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.partition(';')
+        name = name.strip().lower()
+        if name not in ('gzip', '*'):
+            continue
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+class StaticAssets:
+    """Dashboard files loaded and gzip-compressed once at startup
+
+    The team data file is the exception: it's read again for every new
+    version of `store`'s dataset, so it follows reloads and team updates.
+    """
+    
+    def __init__(self, names=DASHBOARD_ASSETS, dev_mode=False,
+                 max_cached_size=1024 * 1024, store=None):
+        self.names = names
+        self.dev_mode = dev_mode
+        self.max_cached_size = max_cached_size
+        self.store = store
+        self._lock = threading.Lock()
+        self._assets = None
+        # (dataset version, StaticAsset) of the data file
+        self._data = None
+    
+    def load(self):
+        """Read and compress every asset"""
+        assets = {}
+        for name in self.names:
+            try:
+                assets[name] = StaticAsset(name, self.max_cached_size)
+            except OSError as e:
+                print(f"Error loading static asset {name}: {e}")
+        self._assets = assets
+    
+    def lookup(self, url_path):
+        """Find the asset for a URL path, rebuilding it in dev mode if it changed"""
+        if self._assets is None:
+            with self._lock:
+                if self._assets is None:
+                    self.load()
+        
+        name = 'index.html' if url_path == '/' else url_path.lstrip('/')
+        if name == DATA_ASSET and self.store is not None:
+            return self.data_asset()
+        asset = self._assets.get(name)
+        if asset is None or not self.dev_mode:
+            return asset
+        
+        try:
+            mtime = os.stat(asset.path).st_mtime_ns
+        except OSError:
+            return asset
+        if mtime != asset.mtime:
+            with self._lock:
+                asset = StaticAsset(asset.path, self.max_cached_size)
+                self._assets[name] = asset
+        return asset
+    
+    def data_asset(self):
+        """The store's data file as of its current dataset version, or None if unreadable"""
+        version = self.store.current().version
+        data = self._data
+        if data is not None and data[0] == version:
+            return data[1]
+        with self._lock:
+            if self._data is None or self._data[0] != version:
+                try:
+                    self._data = (version, StaticAsset(self.store.path, self.max_cached_size))
+                except OSError as e:
+                    print(f"Error loading static asset {self.store.path}: {e}")
+                    return None
+            return self._data[1]
+    
+    def respond(self, asset, accept_encoding=None, if_none_match=None,
+                if_modified_since=None):
+        """Pick a representation; returns (status, headers, body or None for sendfile)"""
+        use_gzip = bool(asset.gzip_body and accept_encoding and accepts_gzip(accept_encoding))
+        etag = asset.gzip_etag if use_gzip else asset.etag
+        headers = [
+            ('Content-type', asset.content_type),
+            ('ETag', etag),
+            ('Last-Modified', asset.last_modified),
+            ('Cache-Control', 'no-cache'),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        
+        if if_none_match:
+            if etag_matches(if_none_match, etag):
+                return 304, headers, b''
+        elif if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                since = None
+            if since is not None and int(asset.mtime / 1e9) <= since:
+                return 304, headers, b''
+        
+        if use_gzip:
+            headers.append(('Content-Encoding', 'gzip'))
+            body = asset.gzip_body
+        else:
+            body = asset.body
+        headers.append(('Content-Length', str(len(body) if body is not None else asset.size)))
+        return 200, headers, body
+
+static_assets = StaticAssets(store=team_store)
+
+class NFLAPIHandler(http.server.SimpleHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests; idle ones are
+    # dropped after `timeout` seconds so they don't pin a worker forever
+    protocol_version = 'HTTP/1.1'
+    timeout = 15
+    # Headers and body go out as separate writes; without TCP_NODELAY the
+    # body waits on the client's delayed ACK on keep-alive connections
+    disable_nagle_algorithm = True
+    store = team_store
+    static_assets = static_assets
+    placeholder_images = placeholder_images
+    
+    def __init__(self, *args, queued_at=None, **kwargs):
+        # When the connection started waiting for a worker thread, if known
+        self.queued_at = queued_at
+        super().__init__(*args, **kwargs)
+    
+    def do_GET(self):
+        """Handle GET requests"""
+        parsed_path = urllib.parse.urlparse(self.path)
+        
+        with self.observe_request(parsed_path):
+            # Handle API requests
+            if parsed_path.path in API_PATHS:
+                self.handle_api_request(parsed_path)
+            elif parsed_path.path == METRICS_PATH:
+                self.send_api_response(*metrics_response())
+            elif parsed_path.path == EVENTS_PATH:
+                self.send_event_stream()
+            elif not (self.send_placeholder(parsed_path.path)
+                      or self.send_static_asset(parsed_path.path)):
+                # Serve other static files
+                super().do_GET()
+    
+    def do_HEAD(self):
+        """Handle HEAD requests"""
+        parsed_path = urllib.parse.urlparse(self.path)
+        with self.observe_request(parsed_path):
+            if not (self.send_placeholder(parsed_path.path, head=True)
+                    or self.send_static_asset(parsed_path.path, head=True)):
+                super().do_HEAD()
+    
+    @contextlib.contextmanager
+    def observe_request(self, parsed_path):
+        """Record metrics (and the access log entry) for the request handled inside"""
+        self.response_status = 0
+        self.response_bytes = 0
+        started = time.perf_counter()
+        request_metrics.started()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            label = request_label(parsed_path.path, parsed_path.query)
+            size = 0 if self.command == 'HEAD' else self.response_bytes
+            request_metrics.finished(label, self.response_status, size, elapsed)
+            if access_log.enabled:
+                access_log.log_request(self.client_address[0], self.command, self.path, label,
+                                       self.response_status, size, elapsed,
+                                       self.headers.get('User-Agent'))
+            # Only a connection's first request waited for the thread
+            self.queued_at = None
+    
+    def send_response(self, code, message=None):
+        """Send the status line, remembering the status for metrics"""
+        self.response_status = code
+        super().send_response(code, message)
+    
+    def send_header(self, keyword, value):
+        """Send a header, remembering the body length for metrics"""
+        if keyword.lower() == 'content-length':
+            self.response_bytes = int(value)
+        super().send_header(keyword, value)
+    
+    def log_request(self, code='-', size='-'):
+        """Plain stderr request line, unless the structured access log replaces it"""
+        if not access_log.enabled:
+            super().log_request(code, size)
+    
+    def send_placeholder(self, path, head=False):
+        """Serve a generated placeholder logo; False if the path isn't one"""
+        response = self.placeholder_images.respond(path, self.headers.get('If-None-Match'))
+        if response is None:
+            return False
+        self.send_api_response(*response, head=head)
+        return True
+    
+    def send_static_asset(self, path, head=False):
+        """Serve a preloaded dashboard asset; False if the path isn't one"""
+        asset = self.static_assets.lookup(path)
+        if asset is None:
+            return False
+        
+        status, headers, body = self.static_assets.respond(
+            asset,
+            self.headers.get('Accept-Encoding'),
+            self.headers.get('If-None-Match'),
+            self.headers.get('If-Modified-Since'))
+        
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        
+        if head or status == 304:
+            return True
+        if body is None:
+            with open(asset.path, 'rb') as f:
+                self.copyfile(f, self.wfile)
+        else:
+            self.wfile.write(body)
+        return True
+    
+    def copyfile(self, source, outputfile):
+        """Copy a file to the client, zero-copy via sendfile where possible"""
+        try:
+            source.fileno()
+        except (AttributeError, OSError):
+            return super().copyfile(source, outputfile)
+        # wfile is unbuffered, so the socket is in sync with what's been written;
+        # socket.sendfile falls back to plain sends where sendfile isn't usable
+        self.connection.sendfile(source)
+    
+    def do_POST(self):
+        """Handle POST requests (API batches)"""
+        parsed_path = urllib.parse.urlparse(self.path)
+        with self.observe_request(parsed_path):
+            if parsed_path.path not in API_PATHS:
+                self.send_error(405)
+                return
+            
+            length = self.headers.get('Content-Length', '')
+            if not length.isdigit():
+                self.send_error(411)
+                return
+            if int(length) > MAX_REQUEST_BODY:
+                self.send_error(413)
+                return
+            self.handle_api_request(parsed_path, self.rfile.read(int(length)))
+    
+    def handle_api_request(self, parsed_path, body=None):
+        """Handle API requests"""
+        waited = time.monotonic() - self.queued_at if self.queued_at is not None else 0.0
+        status, headers, body = handle_api_query(parsed_path.query, self.store,
+                                                 self.headers, body,
+                                                 self.client_address[0], waited)
+        self.send_api_response(status, headers, body)
+    
+    def send_api_response(self, status, headers, body, head=False):
+        """Send an encoded API response"""
+        if not isinstance(body, (bytes, memoryview)):
+            self.send_streamed_response(status, headers, body)
+            return
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+    
+    def send_event_stream(self):
+        """Answer /events and hand the connection to the server's event writer"""
+        cursor, resumed = event_hub.cursor(self.headers.get('Last-Event-ID'))
+        self.send_response(200)
+        for name, value in event_stream_headers():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(event_stream_preamble(self.store.current(), resumed,
+                                               self.headers.get('Last-Event-ID')))
+        self.close_connection = True
+        self.server.hand_off(self.connection, cursor)
+    
+    def send_streamed_response(self, status, headers, chunks):
+        """Send an iterator of byte chunks with chunked transfer encoding"""
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            # HTTP/1.0 has no chunking; the end of the body is the end of the connection
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        
+        try:
+            for chunk in chunks:
+                self.response_bytes += len(chunk)
+                if chunked:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                else:
+                    self.wfile.write(chunk)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        finally:
+            # Stops work still pending for the stream if the client went away
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+class ThreadPoolHTTPServer(socketserver.TCPServer):
+    """TCP server that hands each connection to a bounded pool of threads"""
+    allow_reuse_address = True
+    request_queue_size = 128
+    
+    def __init__(self, server_address, handler_class, threads=16):
+        super().__init__(server_address, handler_class)
+        # Worker threads start on first submit, so this is safe to fork
+        self.executor = ThreadPoolExecutor(max_workers=threads,
+                                           thread_name_prefix='nfl-worker')
+        # Connections given to the event hub, which closes them itself
+        self.handed_off = set()
+        # Set in prefork workers: the process that forked them
+        self.parent_pid = None
+    
+    def get_request(self):
+        """Accept a connection, tolerating races with sibling processes"""
+        request, client_address = self.socket.accept()
+        request.setblocking(True)
+        return request, client_address
+    
+    def process_request(self, request, client_address):
+        """Queue the connection for the next free worker thread"""
+        self.executor.submit(self.process_request_thread, request, client_address,
+                             time.monotonic())
+    
+    def process_request_thread(self, request, client_address, queued_at=None):
+        """Serve every request on one connection, then close it (unless it became an event stream)"""
+        try:
+            self.finish_request(request, client_address, queued_at)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if request in self.handed_off:
+                self.handed_off.discard(request)
+            else:
+                self.shutdown_request(request)
+    
+    def hand_off(self, request, cursor):
+        """Let the event hub keep a connection, freeing its worker thread"""
+        self.handed_off.add(request)
+        event_hub.hand_off(request, cursor)
+    
+    def finish_request(self, request, client_address, queued_at=None):
+        """Handle one connection, telling the handler how long it queued for a thread"""
+        self.RequestHandlerClass(request, client_address, self, queued_at=queued_at)
+    
+    def service_actions(self):
+        """Stop a prefork worker whose parent is gone rather than keep serving on its own"""
+        if self.parent_pid is not None and os.getppid() != self.parent_pid:
+            sys.exit(0)
+    
+    def server_close(self):
+        """Close the listening socket and stop the worker pool"""
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def serve_prefork(httpd, workers):
+    """Fork worker processes that all accept on the same listening socket"""
+    # Non-blocking accept: whichever worker loses the race just goes back to select()
+    httpd.socket.setblocking(False)
+    httpd.parent_pid = os.getpid()
+    children = []
+    # A plain kill or terminate() of the parent stops the workers too, through the finally below
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            # A scrape reaches any one worker; the label keeps their series apart
+            request_metrics.labels = {'worker': str(os.getpid())}
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            try:
+                httpd.serve_forever()
+            finally:
+                bulk_runner.shutdown()
+                os._exit(0)
+        children.append(pid)
+    
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+def print_banner(port, mode_description):
+    """Print the startup banner"""
+    print(f"🏈 NFL Dashboard Server running at http://localhost:{port}")
+    print(f"⚙️  Mode: {mode_description}")
+    print("📊 API endpoints available:")
+    print("  - /api?action=getTeams")
+    print("  - /api?action=getTeam&id={teamId}")
+    print("  - /api?action=generateLogoVariations&teamId={id}")
+    print("  - /api?action=getDesignProfile")
+    print("📈 Prometheus metrics: /metrics")
+    print(f"\n✨ Open http://localhost:{port} in your browser to view the dashboard")
+    print("🛑 Press Ctrl+C to stop the server\n")
+
+def start_server(port=8000, mode='threaded', *, workers=None, threads=None,
+                 stable_timestamps=False, dev_mode=False, compact_json=False,
+                 render_cache_dir=None, render_cache_mb=None, data_file=None,
+                 access_log_path=None, profile_dir=None, profile_rate=None,
+                 profile_token=None, rules_file=None, snapshot_dir=None, build_snapshot=False,
+                 max_in_flight=None, max_queue_wait=None, client_rate=None, client_burst=None,
+                 update_token=None, bulk_workers=None, leagues_file=None,
+                 default_league=leagues.DEFAULT_LEAGUE, league_memory_mb=None,
+                 preload_leagues=()):
+    """Start the NFL dashboard server (or, with `build_snapshot`, just prepare its snapshot)
+
+    Settings are keyword-only and named like the command line options' dests.
+    """
     handler = NFLAPIHandler
+    if data_file:
+        team_store.path = data_file
+    if rules_file:
+        team_store.rules_path = rules_file
+    if snapshot_dir:
+        team_store.snapshots = SnapshotStore(snapshot_dir)
+    access_log.path = access_log_path
+    if profile_dir:
+        request_profiler.directory = profile_dir
+    if profile_rate is not None:
+        request_profiler.sample_rate = profile_rate
+    if profile_token:
+        request_profiler.admin_token = profile_token
+    if max_in_flight:
+        admission_control.max_in_flight = max_in_flight
+    if max_queue_wait is not None:
+        admission_control.max_queue_wait = max_queue_wait
+    if client_rate:
+        admission_control.client_rate = client_rate
+    if client_burst:
+        admission_control.client_burst = client_burst
+    if update_token:
+        team_store.update_token = update_token
+    # The event loop serves the loaded dataset while a changed file is rebuilt
+    team_store.background_reload = mode == 'asyncio'
+    # Idle prefork workers still pass changes made through a sibling on to their streams
+    event_hub.poll = team_store.current
+    TeamAPI.stable_timestamps = stable_timestamps
+    TeamAPI.compact_json = compact_json
+    if render_cache_dir:
+        render_cache.directory = render_cache_dir
+        atlas_store.directory = os.path.join(render_cache_dir, logo_renderer.ATLAS_SUBDIR)
+    if render_cache_mb:
+        render_cache.max_bytes = render_cache_mb * 1024 * 1024
+    if leagues_file:
+        try:
+            league_registry.files = leagues.load_registry(leagues_file)
+        except (OSError, ValueError) as e:
+            print(f"Error loading league registry {leagues_file}: {e}")
+            sys.exit(1)
+    league_registry.default = default_league
+    if league_memory_mb is not None:
+        league_registry.memory_budget = league_memory_mb * 1024 * 1024
     
-    with socketserver.TCPServer(("", port), handler) as httpd:
-        print(f"🏈 NFL Dashboard Server running at http://localhost:{port}")
-        print("📊 API endpoints available:")
-        print("  - /api?action=getTeams")
-        print("  - /api?action=getTeam&id={teamId}")
-        print("  - /api?action=generateLogoVariations&teamId={id}")
-        print("  - /api?action=getDesignProfile")
-        print("\n✨ Open http://localhost:8000 in your browser to view the dashboard")
-        print("🛑 Press Ctrl+C to stop the server\n")
+    # Parse (or map) the dataset and assets up front, and before forking so workers share them
+    dataset = team_store.current()
+    if build_snapshot:
+        if dataset.snapshot is None:
+            print("No snapshot written (disabled, or its directory isn't writable)")
+            sys.exit(1)
+        print(f"Snapshot ready: {dataset.snapshot.path}")
+        for league in league_registry.files:
+            if league != default_league:
+                snapshot = league_registry.store(league).current().snapshot
+                print(f"Snapshot ready: {snapshot.path if snapshot else 'not written'} ({league})")
+        return
+    static_assets.dev_mode = dev_mode
+    static_assets.load()
+    if stable_timestamps and dataset.snapshot is None:
+        precompute_responses()
+    try:
+        league_registry.preload(preload_leagues)
+    except KeyError as e:
+        print(f"Unknown league {e} in --preload-leagues")
+        sys.exit(1)
+    for league in preload_leagues:
+        store = league_registry.store(league)
+        if stable_timestamps and store.current().snapshot is None:
+            precompute_responses(store)
+    
+    if bulk_workers is not None:
+        bulk_runner.workers = bulk_workers
+    elif mode == 'prefork':
+        # Every prefork worker starts its own pool; together they fill the cores once
+        bulk_runner.workers = max(1, (os.cpu_count() or 1) // (workers or os.cpu_count() or 1))
+    
+    if mode == 'asyncio':
+        from async_server import serve_async
+        print_banner(port, 'asyncio (single event loop)')
+        try:
+            serve_async(port)
+        except KeyboardInterrupt:
+            print("\n👋 Server stopped")
+        return
+    
+    if mode == 'prefork':
+        workers = workers or os.cpu_count() or 1
+        threads = threads or 8
+    else:
+        threads = threads or 16
+    
+    with ThreadPoolHTTPServer(("", port), handler, threads=threads) as httpd:
+        if mode == 'prefork':
+            print_banner(port, f"prefork ({workers} processes x {threads} threads)")
+        else:
+            print_banner(port, f"threaded ({threads} threads)")
         
         try:
-            httpd.serve_forever()
+            if mode == 'prefork':
+                serve_prefork(httpd, workers)
+            else:
+                httpd.serve_forever()
         except KeyboardInterrupt:
             print("\n👋 Server stopped")
-            httpd.shutdown()
+            if mode != 'prefork':
+                httpd.shutdown()
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='NFL Dashboard Python Server')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--mode', choices=['threaded', 'prefork', 'asyncio'], default='threaded',
+                        help='threaded: one process with a thread pool; '
+                             'prefork: several processes sharing the listening socket; '
+                             'asyncio: single event loop, cheap idle connections')
+    parser.add_argument('--workers', type=int,
+                        help='worker processes for prefork (default: CPU count)')
+    parser.add_argument('--threads', type=int,
+                        help='worker threads per process (default: 16 threaded, 8 prefork)')
+    parser.add_argument('--stable-timestamps', action='store_true',
+                        help='stamp responses with the dataset version time so they '
+                             'can be cached and revalidated with ETags')
+    parser.add_argument('--dev', dest='dev_mode', action='store_true',
+                        help='rebuild cached static assets when their files change')
+    parser.add_argument('--compact-json', action='store_true',
+                        help='encode API responses without indentation')
+    parser.add_argument('--render-cache-dir', default='.render_cache',
+                        help='directory for rendered logo files')
+    parser.add_argument('--render-cache-mb', type=int, default=64,
+                        help='disk budget for rendered logos before LRU eviction')
+    parser.add_argument('--data', dest='data_file', default=DATA_FILE,
+                        help='team dataset served by the API (default: nfl_logos.json)')
+    parser.add_argument('--rules', dest='rules_file', default=RULES_FILE,
+                        help='mascot shape/motif and regional influence rules '
+                             '(default: design_rules.json; reloaded when it changes)')
+    parser.add_argument('--snapshot-dir', default='.snapshot',
+                        help='where the prepared-state snapshot is kept and mapped from '
+                             '(default: .snapshot)')
+    parser.add_argument('--no-snapshot', dest='snapshot_dir', action='store_const', const=None,
+                        help='build the dataset in memory in every process instead')
+    parser.add_argument('--build-snapshot', action='store_true',
+                        help='write the snapshot for the current data and exit')
+    parser.add_argument('--max-in-flight', type=int, default=0,
+                        help='API requests computed at once per process before others wait '
+                             '(default: 0 = unlimited); expensive actions get half')
+    parser.add_argument('--max-queue-wait', type=float, default=0.5,
+                        help='with --max-in-flight, seconds a request may wait for a worker '
+                             'and a slot before a 503 with Retry-After (default: 0.5)')
+    parser.add_argument('--client-rate', type=float, default=0,
+                        help='API requests per second allowed per client address and process '
+                             '(default: 0 = unlimited); excess gets a 429 with Retry-After')
+    parser.add_argument('--client-burst', type=int,
+                        help='requests a client may send at once before --client-rate applies '
+                             '(default: one second of --client-rate)')
+    parser.add_argument('--update-token', default=os.environ.get('NFL_UPDATE_TOKEN'),
+                        help='bearer token that allows POST action=updateTeams '
+                             '(env NFL_UPDATE_TOKEN, default: updates disabled)')
+    parser.add_argument('--bulk-workers', type=int,
+                        help='worker processes for action=generateAllVariations, per server process '
+                             '(default: one per core, split between prefork workers; '
+                             '0 = compute in the request thread)')
+    parser.add_argument('--leagues', dest='leagues_file', metavar='PATH',
+                        help='JSON file mapping league names to their data (and rules) files; '
+                             'requests pick one with league=<name>')
+    parser.add_argument('--default-league', default=leagues.DEFAULT_LEAGUE,
+                        help='league served when a request names none, from --data '
+                             f'(default: {leagues.DEFAULT_LEAGUE})')
+    parser.add_argument('--league-memory-mb', type=int, default=512,
+                        help='estimated memory of loaded leagues before the least recently '
+                             'used are dropped (default: 512; 0 = unlimited)')
+    parser.add_argument('--preload-leagues', metavar='A,B', default='',
+                        type=lambda value: [name for name in value.split(',') if name],
+                        help='leagues loaded at start and never dropped')
+    parser.add_argument('--access-log', dest='access_log_path', metavar='PATH',
+                        help="write a JSON-lines access log here ('-' for stdout) "
+                             "instead of the plain stderr request lines")
+    parser.add_argument('--profile-dir', default=os.environ.get(profiling.ENV_DIR, 'profiles'),
+                        help='where request profiles are written '
+                             f'(env {profiling.ENV_DIR}, default: profiles)')
+    parser.add_argument('--profile-rate', type=float,
+                        default=float(os.environ.get(profiling.ENV_RATE) or 0),
+                        help='fraction of API requests to profile with cProfile and tracemalloc '
+                             f'(env {profiling.ENV_RATE}, default: 0 = off)')
+    parser.add_argument('--profile-token', default=os.environ.get(profiling.ENV_TOKEN),
+                        help='admin token; requests with profile=<token> are always profiled '
+                             f'(env {profiling.ENV_TOKEN})')
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    start_server()
\ No newline at end of file
+    # Companion modules import `server`; make that resolve to this module
+    # rather than a second copy with its own store and settings
+    sys.modules.setdefault('server', sys.modules['__main__'])
+    start_server(**vars(parse_args()))
@@ -0,0 +1,447 @@
+"""
+Prepared-state snapshots
+A dataset's team columns, indexes, classifications, color analytics and
+precomputed responses written to one versioned binary file. Processes
+map it read-only and read the columns in place, so workers share its
+pages through the page cache and start without parsing or analysing.
+
+Layout: a fixed prefix (magic, format version, header offset and length),
+8-byte aligned sections, then a JSON header listing each section's name,
+offset, length and array typecode. Sections are streamed as they are
+built, so the header comes last.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+
+from color_table import ColorTable
+from design_rules import TeamDesign
+from search_index import SearchIndex
+from team_table import COLUMNS, TeamList, TeamTable, freeze
+
+MAGIC = b'NFLSNAP\0'
+FORMAT_VERSION = 1
+# Magic, format version, then where the JSON header sits in the file
+PREFIX = struct.Struct('<8sIQQ')
+ALIGNMENT = 8
+SUFFIX = '.snap'
+
+# Group indexes of a TeamDataset stored as row lists
+GROUP_INDEXES = ('by_conference', 'by_division', 'by_conference_division')
+
+def fingerprint(*paths):
+    """Hash of the files whose code decides what a snapshot holds"""
+    digest = hashlib.sha1(str(FORMAT_VERSION).encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+def source_key(path):
+    """Hash of a data file's absolute path, so snapshots of different files can share a directory"""
+    return hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+
+def native_layout():
+    """Byte order and item sizes a snapshot's arrays were written with"""
+    return {'byteorder': sys.byteorder,
+            'itemsizes': {code: array(code).itemsize for code in 'BHLQqd'}}
+
+class StringColumn(Sequence):
+    """UTF-8 strings laid end to end, read through an offsets array"""
+    __slots__ = ('offsets', 'data')
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return str(self.data[self.offsets[index]:self.offsets[index + 1]], 'utf-8')
+
+    def __iter__(self):
+        # Sequence's default iterates through __getitem__'s bounds checks
+        data = self.data
+        offsets = self.offsets
+        for start, stop in zip(offsets, offsets[1:]):
+            yield str(data[start:stop], 'utf-8')
+
+class NestedColumn(Sequence):
+    """Variable-length runs of one flat array, read through an offsets array"""
+    __slots__ = ('offsets', 'values')
+
+    def __init__(self, offsets, values):
+        self.offsets = offsets
+        self.values = values
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+class SortedIndex:
+    """Read-only key -> row lookup by bisecting a sorted key column"""
+    __slots__ = ('keys', 'rows')
+
+    def __init__(self, keys, rows):
+        self.keys = keys
+        self.rows = rows
+
+    def get(self, key, default=None):
+        try:
+            index = bisect_left(self.keys, key)
+            if index < len(self.keys) and self.keys[index] == key:
+                return self.rows[index]
+        except TypeError:
+            pass
+        return default
+
+    def __getitem__(self, key):
+        row = self.get(key)
+        if row is None:
+            raise KeyError(key)
+        return row
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def items(self):
+        return zip(self.keys, self.rows)
+
+class SnapshotWriter:
+    """Streams sections to a temporary file; finish() adds the header and renames it into place"""
+
+    def __init__(self, path):
+        self.path = path
+        self.temporary = f'{path}.{os.getpid()}.tmp'
+        self.file = open(self.temporary, 'wb')
+        self.file.write(PREFIX.pack(MAGIC, FORMAT_VERSION, 0, 0))
+        self.sections = {}
+
+    def _start(self):
+        """Pad to the section alignment and return the offset"""
+        self.file.write(b'\0' * (-self.file.tell() % ALIGNMENT))
+        return self.file.tell()
+
+    def add(self, name, values, typecode='B'):
+        """One flat section: bytes, or values for an array of `typecode`"""
+        if not isinstance(values, (bytes, bytearray)):
+            if not (isinstance(values, array) and values.typecode == typecode):
+                values = array(typecode, values)
+            values = values.tobytes()
+        start = self._start()
+        self.file.write(values)
+        self.sections[name] = [start, len(values), typecode]
+
+    def add_chunks(self, name, chunks):
+        """A byte section written piece by piece; returns each piece's (start, end) in it"""
+        start = self._start()
+        spans = []
+        position = 0
+        for chunk in chunks:
+            self.file.write(chunk)
+            spans.append((position, position + len(chunk)))
+            position += len(chunk)
+        self.sections[name] = [start, position, 'B']
+        return spans
+
+    def add_strings(self, name, values):
+        """A StringColumn section pair"""
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = array('Q', [0])
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        self.add(f'{name}.offsets', offsets, 'Q')
+        self.add(f'{name}.data', b''.join(encoded))
+
+    def add_nested(self, name, runs, typecode='L'):
+        """A NestedColumn section pair"""
+        offsets = array('Q', [0])
+        values = array(typecode)
+        for run in runs:
+            values.extend(run)
+            offsets.append(len(values))
+        self.add(f'{name}.offsets', offsets, 'Q')
+        self.add(f'{name}.values', values, typecode)
+
+    def finish(self, header):
+        """Append the JSON header, point the prefix at it and move the file into place"""
+        header = dict(header, sections=self.sections, layout=native_layout())
+        encoded = json.dumps(header, separators=(',', ':')).encode()
+        start = self._start()
+        self.file.write(encoded)
+        self.file.seek(0)
+        self.file.write(PREFIX.pack(MAGIC, FORMAT_VERSION, start, len(encoded)))
+        self.file.close()
+        os.replace(self.temporary, self.path)
+
+    def abort(self):
+        """Drop the partial file"""
+        self.file.close()
+        with contextlib.suppress(OSError):
+            os.unlink(self.temporary)
+
+class Snapshot:
+    """A snapshot file mapped read-only; sections are memoryviews into the mapping"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, start, length = PREFIX.unpack_from(self._view)
+        if magic != MAGIC or version != FORMAT_VERSION or not start:
+            raise ValueError(f'{path} is not a complete version {FORMAT_VERSION} snapshot')
+        self.header = json.loads(bytes(self._view[start:start + length]))
+        if self.header['layout'] != native_layout():
+            raise ValueError(f'{path} was written on an incompatible platform')
+        self.path = path
+
+    @property
+    def size(self):
+        """Bytes mapped"""
+        return len(self._mmap)
+
+    def section(self, name):
+        """A section as a memoryview of its typecode"""
+        offset, length, typecode = self.header['sections'][name]
+        return self._view[offset:offset + length].cast(typecode)
+
+    def strings(self, name):
+        """A StringColumn section pair"""
+        return StringColumn(self.section(f'{name}.offsets'), self.section(f'{name}.data'))
+
+    def nested(self, name):
+        """A NestedColumn section pair"""
+        return NestedColumn(self.section(f'{name}.offsets'), self.section(f'{name}.values'))
+
+    def has_responses(self, settings):
+        """Whether precomputed responses were encoded with these response settings"""
+        return self.header.get('responses') == settings
+
+    def response(self, key):
+        """(body, etag) precomputed for a response cache key, or None"""
+        if not self.header.get('responses'):
+            return None
+        keys = self.strings('responses.keys')
+        encoded = json.dumps(key, separators=(',', ':'))
+        index = bisect_left(keys, encoded)
+        if index == len(keys) or keys[index] != encoded:
+            return None
+        start = self.section('responses.starts')[index]
+        end = self.section('responses.ends')[index]
+        return self.section('responses.bodies')[start:end], self.strings('responses.etags')[index]
+
+    def team_table(self):
+        """The TeamTable, reading every column in place"""
+        columns = {}
+        for name in COLUMNS:
+            if f'teams.{name}' in self.header['sections']:
+                columns[name] = self.section(f'teams.{name}')
+            else:
+                columns[name] = self.strings(f'teams.{name}')
+        irregular = {int(row): freeze(team) for row, team in self.header['irregular'].items()}
+        return TeamTable.from_columns(columns, self.header['categories'], irregular)
+
+    def groups(self, name, table):
+        """One of GROUP_INDEXES as {key: TeamList}"""
+        rows = self.nested(name)
+        return {tuple(key) if isinstance(key, list) else key: TeamList(table, rows[index])
+                for index, key in enumerate(self.header['groups'][name])}
+
+    def search_index(self):
+        """The SearchIndex over mapped word and posting tables"""
+        grams = self.strings('search.trigrams')
+        entries = self.nested('search.by_trigram')
+        return SearchIndex.from_columns(self.strings('search.words'),
+                                        self.nested('search.postings'),
+                                        self.section('search.trigram_counts'),
+                                        {grams[i]: entries[i] for i in range(len(grams))})
+
+    def team_design(self, rules, table):
+        """Mapped design classification columns"""
+        return TeamDesign.from_columns(rules, table, self.header['design_values'],
+                                       self.section('design.shapes'),
+                                       self.section('design.motifs'),
+                                       self.section('design.influences'))
+
+    def color_table(self):
+        """The ColorTable over mapped columns"""
+        colors = self.header['colors']
+        if colors['int_ids']:
+            ids = self.section('colors.ids')
+            row_by_id = SortedIndex(self.section('colors.id_keys'),
+                                    self.section('colors.id_rows'))
+        else:
+            ids = colors['ids']
+            row_by_id = {team_id: row for row, team_id in enumerate(ids)}
+        return ColorTable.from_columns(ids, row_by_id,
+                                       SortedIndex(self.strings('colors.primary_keys'),
+                                                   self.section('colors.primary_rows')),
+                                       self.section('colors.dominance'),
+                                       self.section('colors.psychology'),
+                                       self.section('colors.gradient_end'),
+                                       self.section('colors.lab'))
+
+def int64_column(values):
+    """`values` as an array('q'), or None if any isn't an int that fits"""
+    try:
+        if all(type(value) is int for value in values):
+            return array('q', values)
+    except OverflowError:
+        pass
+    return None
+
+def write_snapshot(path, dataset, data, responses=(), response_settings=None):
+    """Write everything prepared for `dataset` (built from the parsed `data`) to `path`
+
+    `responses` yields (cache key, body, etag); `response_settings` records
+    what they were encoded with so a reader can tell whether they apply.
+    """
+    writer = SnapshotWriter(path)
+    try:
+        header = write_sections(writer, dataset, responses)
+        header.update({
+            'version': dataset.version,
+            # The file's top-level values in order, with the team list left out
+            'data': {key: None if key == 'teams' else value for key, value in data.items()},
+            'responses': response_settings if header.pop('response_count') else None,
+        })
+        writer.finish(header)
+    except BaseException:
+        writer.abort()
+        raise
+
+def write_sections(writer, dataset, responses):
+    """Stream every section of a dataset; returns the header entries describing them"""
+    table = dataset.teams
+    for name in COLUMNS:
+        column = getattr(table, name)
+        if isinstance(column, array):
+            writer.add(f'teams.{name}', column, column.typecode)
+        else:
+            writer.add_strings(f'teams.{name}', column)
+
+    groups = {}
+    for name in GROUP_INDEXES:
+        index = getattr(dataset, name)
+        groups[name] = list(index)
+        writer.add_nested(name, (teams.rows for teams in index.values()))
+
+    search = dataset.search
+    writer.add_strings('search.words', search.words)
+    writer.add_nested('search.postings', search.postings)
+    writer.add('search.trigram_counts', search.trigram_counts, 'H')
+    writer.add_strings('search.trigrams', search.by_trigram)
+    writer.add_nested('search.by_trigram', search.by_trigram.values())
+
+    design = dataset.design
+    writer.add('design.shapes', design.shapes, 'H')
+    writer.add('design.motifs', design.motifs, 'H')
+    writer.add('design.influences', design.influences, 'H')
+
+    colors = dataset.colors
+    ids = int64_column(colors.ids)
+    id_keys = int64_column(list(colors.row_by_id)) if ids is not None else None
+    color_header = {'int_ids': id_keys is not None}
+    if id_keys is not None:
+        writer.add('colors.ids', ids, 'q')
+        by_id = sorted(colors.row_by_id.items())
+        writer.add('colors.id_keys', [team_id for team_id, _ in by_id], 'q')
+        writer.add('colors.id_rows', [row for _, row in by_id], 'L')
+    else:
+        color_header['ids'] = list(colors.ids)
+    by_primary = sorted(colors.row_by_primary.items())
+    writer.add_strings('colors.primary_keys', [key for key, _ in by_primary])
+    writer.add('colors.primary_rows', [row for _, row in by_primary], 'L')
+    writer.add('colors.dominance', colors.dominance, 'B')
+    writer.add('colors.psychology', colors.psychology, 'B')
+    writer.add('colors.gradient_end', colors.gradient_end, 'L')
+    lab = colors.lab
+    writer.add('colors.lab', lab.ravel().tolist() if hasattr(lab, 'ravel')
+               else [value for roles in lab for color in roles for value in color], 'd')
+
+    # Bodies go out as they are encoded; only the small index is sorted for bisecting
+    index = []
+    def bodies():
+        for key, body, etag in responses:
+            index.append((json.dumps(key, separators=(',', ':')), etag))
+            yield body
+    spans = writer.add_chunks('responses.bodies', bodies())
+    entries = sorted((key, etag, start, end) for (key, etag), (start, end) in zip(index, spans))
+    writer.add_strings('responses.keys', [entry[0] for entry in entries])
+    writer.add_strings('responses.etags', [entry[1] for entry in entries])
+    writer.add('responses.starts', [entry[2] for entry in entries], 'Q')
+    writer.add('responses.ends', [entry[3] for entry in entries], 'Q')
+
+    return {
+        'categories': table.categories,
+        'irregular': {str(row): team for row, team in table.irregular.items()},
+        'groups': groups,
+        'design_values': design.values,
+        'colors': color_header,
+        'response_count': len(entries),
+    }
+
+class SnapshotStore:
+    """Snapshot files in one directory, named after the prepared version they hold"""
+
+    def __init__(self, directory='.snapshot'):
+        self.directory = directory
+
+    def path(self, name):
+        """File for a snapshot name"""
+        return os.path.join(self.directory, name + SUFFIX)
+
+    def open(self, name):
+        """Map an existing snapshot, or None if there is no usable one"""
+        path = self.path(name)
+        try:
+            return Snapshot(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            print(f"Ignoring snapshot {path}: {e}")
+            return None
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Hold the directory's build lock, so one process builds while the others wait"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def remove_others(self, name, prefix=''):
+        """Delete snapshots of other versions whose names start with `prefix`
+
+        Processes still mapping them keep their pages.
+        """
+        keep = name + SUFFIX
+        for entry in os.listdir(self.directory):
+            if entry.endswith(SUFFIX) and entry.startswith(prefix) and entry != keep:
+                with contextlib.suppress(OSError):
+                    os.unlink(os.path.join(self.directory, entry))
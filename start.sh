@@ -29,4 +29,4 @@ echo ""
 echo "Press Ctrl+C to stop the server"
 echo "=================================="
 
-python3 server.py
\ No newline at end of file
+python3 server.py "$@"
\ No newline at end of file
@@ -0,0 +1,389 @@
+"""
+Compact team storage
+Teams are held column-wise: ids and founded years in arrays, colors packed
+as 24-bit integers, conference/division as small category codes and
+repeated strings interned. Records are read-only views built on access, so
+a team costs a few dozen bytes of columns instead of two dicts and a dozen
+boxed values.
+"""
+
+import bisect
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+
+# Key order of a regular team record, as it appears in the data file
+TEAM_KEYS = ('id', 'name', 'city', 'mascot', 'conference', 'division', 'colors', 'logo',
+             'founded')
+COLOR_KEYS = ('primary', 'secondary', 'accent')
+TEXT_KEYS = ('name', 'city', 'mascot', 'conference', 'division', 'logo')
+
+# Per-row columns of a TeamTable
+COLUMNS = ('ids', 'names', 'cities', 'mascots', 'conferences', 'divisions', 'primary',
+           'secondary', 'accent', 'logos', 'founded')
+
+# Category code of a row kept whole in TeamTable.irregular
+IRREGULAR = 0xFFFF
+INT64_RANGE = range(-2**63, 2**63)
+
+class FrozenDict(dict):
+    """Read-only dict, so records shared between requests and threads can't be mutated"""
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('shared team records are read-only')
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+def freeze(value):
+    """Recursively convert dicts and lists to FrozenDicts and tuples"""
+    if isinstance(value, (dict, TeamRecord)):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def pack_color(value):
+    """'#RRGGBB' as a 24-bit int, or None if it wouldn't format back identically"""
+    if not isinstance(value, str) or len(value) != 7 or value[0] != '#':
+        return None
+    try:
+        packed = int(value[1:], 16)
+    except ValueError:
+        return None
+    return packed if f'#{packed:06X}' == value else None
+
+def copy_column(column):
+    """Writable copy of a column, which may be a read-only mapped one"""
+    typecode = getattr(column, 'typecode', None) or getattr(column, 'format', None)
+    if typecode is None:
+        return list(column)
+    copied = array(typecode)
+    copied.frombytes(memoryview(column).cast('B'))
+    return copied
+
+class TeamRecord(Mapping):
+    """Read-only mapping view of one team row; equal to the dict it was loaded from"""
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key):
+        return self.table.value(self.row, key)
+
+    def __iter__(self):
+        return iter(self.table.keys(self.row))
+
+    def __len__(self):
+        return len(self.table.keys(self.row))
+
+    def __repr__(self):
+        return f'TeamRecord({dict(self)!r})'
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+class TeamList(Sequence):
+    """Teams at some rows of a table, in row order"""
+    __slots__ = ('table', 'rows')
+
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TeamList(self.table, self.rows[index])
+        return TeamRecord(self.table, self.rows[index])
+
+    def __iter__(self):
+        table = self.table
+        for row in self.rows:
+            yield TeamRecord(table, row)
+
+class TeamTable(TeamList):
+    """Every team of a dataset, stored as columns
+
+    Rows that don't fit the regular schema (missing or extra keys, odd types,
+    colors that wouldn't format back identically) are kept whole in
+    `irregular`, so records always read back exactly as loaded.
+    """
+    __slots__ = ('ids', 'names', 'cities', 'mascots', 'conferences', 'divisions',
+                 'categories', 'primary', 'secondary', 'accent', 'logos', 'founded',
+                 'irregular', '_getters', '_row_by_id', '_first_id')
+
+    def __init__(self, teams):
+        super().__init__(self, range(len(teams)))
+        self.ids = array('q')
+        self.names = []
+        self.cities = []
+        self.mascots = []
+        # Codes into `categories`, shared by the conference and division columns
+        self.conferences = array('H')
+        self.divisions = array('H')
+        self.categories = []
+        self.primary = array('L')
+        self.secondary = array('L')
+        self.accent = array('L')
+        self.logos = []
+        self.founded = array('q')
+        self.irregular = {}
+
+        codes = {}
+        for row, team in enumerate(teams):
+            colors = self._packed_colors(team)
+            if colors is None or len(codes) >= IRREGULAR - 1:
+                self.irregular[row] = freeze(team)
+                self._append_placeholder()
+                continue
+            for value in (team['conference'], team['division']):
+                if value not in codes:
+                    codes[value] = len(self.categories)
+                    self.categories.append(value)
+            self.ids.append(team['id'])
+            self.names.append(team['name'])
+            self.cities.append(sys.intern(team['city']))
+            self.mascots.append(sys.intern(team['mascot']))
+            self.conferences.append(codes[team['conference']])
+            self.divisions.append(codes[team['division']])
+            self.primary.append(colors[0])
+            self.secondary.append(colors[1])
+            self.accent.append(colors[2])
+            self.logos.append(team['logo'])
+            self.founded.append(team['founded'])
+        self._prepare()
+
+    @classmethod
+    def from_columns(cls, columns, categories, irregular):
+        """Table over existing columns (a dict keyed by COLUMNS), e.g. ones mapped from a snapshot"""
+        table = cls.__new__(cls)
+        TeamList.__init__(table, table, range(len(columns['ids'])))
+        for name in COLUMNS:
+            setattr(table, name, columns[name])
+        table.categories = categories
+        table.irregular = irregular
+        table._prepare()
+        return table
+
+    def with_rows(self, teams_by_row):
+        """Copy of the table with some rows replaced by new team dicts; other rows are untouched"""
+        table = TeamTable.__new__(TeamTable)
+        TeamList.__init__(table, table, self.rows)
+        for name in COLUMNS:
+            setattr(table, name, copy_column(getattr(self, name)))
+        table.categories = list(self.categories)
+        table.irregular = dict(self.irregular)
+        codes = {category: code for code, category in enumerate(table.categories)}
+        for row, team in teams_by_row.items():
+            table._write_row(row, team, codes)
+        table._prepare()
+        return table
+
+    def _write_row(self, row, team, codes):
+        """Store a team over an existing row, like __init__ does when appending"""
+        colors = self._packed_colors(team)
+        new_categories = {team['conference'], team['division']} - codes.keys() if colors else ()
+        if colors is None or len(codes) + len(new_categories) >= IRREGULAR:
+            self.irregular[row] = freeze(team)
+            for column in (self.ids, self.primary, self.secondary, self.accent, self.founded):
+                column[row] = 0
+            for column in (self.names, self.cities, self.mascots, self.logos):
+                column[row] = ''
+            self.conferences[row] = IRREGULAR
+            self.divisions[row] = IRREGULAR
+            return
+        self.irregular.pop(row, None)
+        for value in (team['conference'], team['division']):
+            if value not in codes:
+                codes[value] = len(self.categories)
+                self.categories.append(value)
+        self.ids[row] = team['id']
+        self.names[row] = team['name']
+        self.cities[row] = sys.intern(team['city'])
+        self.mascots[row] = sys.intern(team['mascot'])
+        self.conferences[row] = codes[team['conference']]
+        self.divisions[row] = codes[team['division']]
+        self.primary[row], self.secondary[row], self.accent[row] = colors
+        self.logos[row] = team['logo']
+        self.founded[row] = team['founded']
+
+    def _prepare(self):
+        """Field getters and the id lookup, once the columns are filled"""
+        categories = self.categories
+        conferences = self.conferences
+        divisions = self.divisions
+        self._getters = {
+            'id': self.ids.__getitem__,
+            'name': self.names.__getitem__,
+            'city': self.cities.__getitem__,
+            'mascot': self.mascots.__getitem__,
+            'conference': lambda row: categories[conferences[row]],
+            'division': lambda row: categories[divisions[row]],
+            'colors': self.colors,
+            'logo': self.logos.__getitem__,
+            'founded': self.founded.__getitem__,
+        }
+        self._index_ids()
+
+    def _packed_colors(self, team):
+        """Packed colors if the team fits the columns exactly, else None"""
+        if not isinstance(team, dict) or tuple(team) != TEAM_KEYS:
+            return None
+        if type(team['id']) is not int or team['id'] not in INT64_RANGE:
+            return None
+        if type(team['founded']) is not int or team['founded'] not in INT64_RANGE:
+            return None
+        if not all(isinstance(team[key], str) for key in TEXT_KEYS):
+            return None
+        colors = team['colors']
+        if not isinstance(colors, dict) or tuple(colors) != COLOR_KEYS:
+            return None
+        packed = [pack_color(colors[key]) for key in COLOR_KEYS]
+        return None if None in packed else packed
+
+    def _append_placeholder(self):
+        """Keep the columns aligned for a row stored in `irregular`"""
+        for column in (self.ids, self.primary, self.secondary, self.accent, self.founded):
+            column.append(0)
+        for column in (self.names, self.cities, self.mascots, self.logos):
+            column.append('')
+        self.conferences.append(IRREGULAR)
+        self.divisions.append(IRREGULAR)
+
+    def _index_ids(self):
+        """Row lookup by id: arithmetic when ids are consecutive, else a dict"""
+        self._row_by_id = None
+        self._first_id = self.ids[0] if self.ids else 0
+        consecutive = not self.irregular and all(
+            team_id == self._first_id + row for row, team_id in enumerate(self.ids))
+        if not consecutive:
+            # Later rows win on duplicate ids, like assigning into a dict in order
+            self._row_by_id = {}
+            for row in self.rows:
+                self._row_by_id[self.value(row, 'id')] = row
+
+    def keys(self, row):
+        """Keys of one row, in source order"""
+        irregular = self.irregular.get(row) if self.irregular else None
+        return TEAM_KEYS if irregular is None else tuple(irregular)
+
+    def value(self, row, key):
+        """One field of one row"""
+        if self.irregular and row in self.irregular:
+            return self.irregular[row][key]
+        getter = self._getters.get(key)
+        if getter is None:
+            raise KeyError(key)
+        return getter(row)
+
+    def colors(self, row):
+        """The colors mapping of a regular row"""
+        return FrozenDict((('primary', f'#{self.primary[row]:06X}'),
+                           ('secondary', f'#{self.secondary[row]:06X}'),
+                           ('accent', f'#{self.accent[row]:06X}')))
+
+    def row_for_id(self, team_id):
+        """Row holding a team id, or None"""
+        if self._row_by_id is not None:
+            return self._row_by_id.get(team_id)
+        if type(team_id) is not int:
+            return None
+        row = team_id - self._first_id
+        return row if 0 <= row < len(self.ids) else None
+
+    def team_ids(self):
+        """Distinct team ids in first-seen order"""
+        if self._row_by_id is not None:
+            return iter(self._row_by_id)
+        return iter(self.ids)
+
+    def group_rows(self, *keys):
+        """Rows grouped by the lowercased value of category fields, scanning their columns
+
+        With several keys ('conference', 'division') the group key is a tuple.
+        """
+        columns = [self.conferences if key == 'conference' else self.divisions for key in keys]
+        lowered = [category.lower() for category in self.categories]
+        groups = {}
+        for row, codes in enumerate(zip(*columns)):
+            if IRREGULAR in codes:
+                values = tuple(self.irregular[row][key].lower() for key in keys)
+            else:
+                values = tuple(lowered[code] for code in codes)
+            group_key = values[0] if len(keys) == 1 else values
+            rows = groups.get(group_key)
+            if rows is None:
+                rows = groups[group_key] = array('L')
+            rows.append(row)
+        return {group_key: TeamList(self, rows) for group_key, rows in groups.items()}
+
+    def changed_rows(self, other):
+        """Rows whose team differs from the same row of `other`, or None if the row counts differ"""
+        if len(self.rows) != len(other.rows):
+            return None
+        changed = {row for row in self.irregular.keys() | other.irregular.keys()
+                   if self[row] != other[row]}
+        for name in ('ids', 'names', 'cities', 'mascots', 'primary', 'secondary', 'accent',
+                     'logos', 'founded'):
+            changed.update(row for row, (mine, theirs)
+                           in enumerate(zip(getattr(self, name), getattr(other, name)))
+                           if mine != theirs)
+        # Category codes are numbered per table, so compare what they stand for
+        for name in ('conferences', 'divisions'):
+            changed.update(row for row, (mine, theirs)
+                           in enumerate(zip(getattr(self, name), getattr(other, name)))
+                           if mine != IRREGULAR and theirs != IRREGULAR
+                           and self.categories[mine] != other.categories[theirs])
+        return sorted(changed)
+
+    def regroup(self, groups, previous, rows, *keys):
+        """group_rows() of `previous` carried over to this table, moving only `rows`"""
+        rows_by_key = {group_key: teams.rows for group_key, teams in groups.items()}
+        for row in rows:
+            before = self._group_key(previous, row, keys)
+            after = self._group_key(self, row, keys)
+            if before == after:
+                continue
+            remaining = array('L', (other for other in rows_by_key[before] if other != row))
+            if remaining:
+                rows_by_key[before] = remaining
+            else:
+                del rows_by_key[before]
+            moved = array('L', rows_by_key.get(after, ()))
+            bisect.insort(moved, row)
+            rows_by_key[after] = moved
+        return {group_key: TeamList(self, rows) for group_key, rows in rows_by_key.items()}
+
+    @staticmethod
+    def _group_key(table, row, keys):
+        """The group_rows() key of one row"""
+        values = tuple(table.value(row, key).lower() for key in keys)
+        return values[0] if len(keys) == 1 else values
+
+class TeamIndex(Mapping):
+    """Teams by id, answered from the table without a record per team"""
+    __slots__ = ('table',)
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, team_id):
+        row = self.table.row_for_id(team_id)
+        if row is None:
+            raise KeyError(team_id)
+        return TeamRecord(self.table, row)
+
+    def __iter__(self):
+        return self.table.team_ids()
+
+    def __len__(self):
+        return sum(1 for _ in self.table.team_ids())